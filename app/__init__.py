@@ -3,7 +3,8 @@ Initializes the Flask application and its components.
 """
 
 import os
-from typing import Type
+import time
+from typing import Optional, Type
 
 from flask import Flask, flash, redirect, url_for
 from flask_login import LoginManager
@@ -11,17 +12,37 @@ from flask_login import LoginManager
 from config import Config
 
 
-def create_app(config_class: Type[Config] = Config) -> Flask:
+def create_app(
+    config_class: Type[Config] = Config, instance_path: Optional[str] = None
+) -> Flask:
     """
     Creates and configures the Flask application.
     Args:
         config_class (Type[Config]): The configuration class to use.
+        instance_path (Optional[str]): The absolute path of the instance
+                                       folder; Flask's default when omitted.
     Returns:
         Flask: The configured Flask application instance.
     """
-    app = Flask(__name__, instance_relative_config=True)
+    started = time.perf_counter()
+    app = Flask(
+        __name__, instance_path=instance_path, instance_relative_config=True
+    )
     app.config.from_object(config_class)
 
+    # Stream uploaded files to disk instead of buffering them in memory
+    from app.services.upload_service import StreamingUploadRequest
+
+    app.request_class = StreamingUploadRequest
+
+    # Keep session data server-side unless cookie sessions are configured
+    if app.config.get("SESSION_STORE", "cookie") != "cookie":
+        from app.services.session_store import ServerSideSessionInterface
+
+        app.session_interface = ServerSideSessionInterface(
+            app.config["SESSION_STORE"]
+        )
+
     # Ensure the instance folder exists
     os.makedirs(app.instance_path, exist_ok=True)
 
@@ -43,7 +64,7 @@ def create_app(config_class: Type[Config] = Config) -> Flask:
     @login_manager.user_loader
     def load_user(user_id: str):
         """
-        Loads a user from the in-memory store.
+        Loads a user from the user store.
         """
         return get_user(user_id)
 
@@ -52,6 +73,10 @@ def create_app(config_class: Type[Config] = Config) -> Flask:
 
     app.register_blueprint(auth_bp)
 
+    from app.auth.cli import users_cli
+
+    app.cli.add_command(users_cli)
+
     from app.main import main_bp
 
     app.register_blueprint(main_bp)
@@ -62,10 +87,36 @@ def create_app(config_class: Type[Config] = Config) -> Flask:
     with app.app_context():
         setup_event_logger()
 
-    # Run cleanup on startup
-    from app.services.cleanup_service import cleanup_expired_sessions
+    # Configure the shared DataFrame cache
+    from app.services.cache_service import setup_dataframe_cache
 
     with app.app_context():
-        cleanup_expired_sessions()
+        setup_dataframe_cache()
+
+    # Configure the chart render pool
+    from app.services.render_service import setup_render_pool
+
+    setup_render_pool(
+        app.config["CHART_RENDER_WORKERS"],
+        app.config["CHART_RENDER_MAX_TASKS_PER_WORKER"],
+    )
+
+    # Track session activity and expire idle uploads and charts in the
+    # background
+    from app.services.cleanup_service import (
+        record_session_access,
+        start_cleanup_scheduler,
+    )
+
+    app.before_request(record_session_access)
+    start_cleanup_scheduler(app)
+
+    # Measure startup and warm up pandas, Matplotlib and the render pool
+    # once the application can already serve requests
+    from app.services.startup_service import start_prewarm, track_startup
+
+    track_startup(app, started)
+    if app.config["STARTUP_PREWARM"]:
+        start_prewarm(app)
 
     return app
@@ -0,0 +1,38 @@
+"""
+Defines command-line commands for managing users.
+"""
+
+import click
+from flask.cli import AppGroup
+
+from app.auth.models import create_user, get_user_by_username, set_password
+
+users_cli = AppGroup("users", help="Manage user accounts.")
+
+
+@users_cli.command("create")
+@click.argument("username")
+@click.password_option()
+def create_user_command(username: str, password: str) -> None:
+    """
+    Adds a user with the given username.
+    """
+    try:
+        create_user(username, password)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Created user '{username}'.")
+
+
+@users_cli.command("set-password")
+@click.argument("username")
+@click.password_option()
+def set_password_command(username: str, password: str) -> None:
+    """
+    Replaces the password of an existing user.
+    """
+    user = get_user_by_username(username)
+    if user is None:
+        raise click.ClickException(f"No user named '{username}'.")
+    set_password(user, password)
+    click.echo(f"Updated the password of '{username}'.")
@@ -1,28 +1,61 @@
 """
-Defines the User model for authentication.
+Defines the User model for authentication and the SQLite store that keeps
+users with their password hashes.
 """
 
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from app.services.sqlite_service import Transaction, connect
+
+DEFAULT_PASSWORD_HASH_METHOD = "scrypt"
+DEFAULT_USER_CACHE_SIZE = 256
+DEFAULT_USER_CACHE_SECONDS = 60
+
+# Demo account added to a new, empty user store. The hash is precomputed
+# so that creating the store does not pay for hashing.
+_DEMO_USER = (
+    "1",
+    "testuser",
+    "scrypt:32768:8:1$dpVY1ePOYSHPr6TG$ff6dfff1c73ac3a8f4fe8420b5264cce361d9"
+    "fdcaf0d7a1889300e3bbc05f4f02eee6676f0047543ff93c7e6ecd2ebf05c9ee6159b48"
+    "52c9fd7a8fc91016131d",
+)
+
+# Users loaded by ID, keyed by (database path, user ID), with load times
+_user_cache: "OrderedDict[Tuple[str, str], Tuple[Optional[User], float]]" = (
+    OrderedDict()
+)
+_user_cache_lock = threading.Lock()
+
 
 class User(UserMixin):
     """
     Represents a user of the application.
     """
 
-    def __init__(self, id: str, username: str, password: str) -> None:
+    def __init__(self, id: str, username: str, password_hash: str) -> None:
         """
         Initializes a User object.
 
         Args:
             id (str): The unique identifier for the user.
             username (str): The user's username.
-            password (str): The user's plain-text password.
+            password_hash (str): The hash of the user's password.
         """
         self.id = id
         self.username = username
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hash
 
     def check_password(self, password: str) -> bool:
         """
@@ -36,20 +69,26 @@ class User(UserMixin):
         """
         return check_password_hash(self.password_hash, password)
 
+    def needs_rehash(self, method: str) -> bool:
+        """
+        Checks whether the stored hash was made with other settings than
+        the given hash method.
 
-# In-memory user store (temporary solution)
-_users = [
-    User(id="1", username="testuser", password="password123"),
-]
+        Args:
+            method (str): The configured hash method.
 
-_user_by_id = {user.id: user for user in _users}
-_user_by_username = {user.username: user for user in _users}
+        Returns:
+            bool: True if the password should be hashed again.
+        """
+        return self.password_hash.split("$", 1)[0] != _method_prefix(method)
 
 
 def get_user(user_id: str) -> User | None:
     """
     Retrieves a user by their ID.
-    This function is required by Flask-Login's user_loader.
+    This function is required by Flask-Login's user_loader, which runs on
+    every request, so users are kept in a small in-process cache for up to
+    USER_CACHE_SECONDS.
 
     Args:
         user_id (str): The ID of the user to retrieve.
@@ -57,7 +96,29 @@ def get_user(user_id: str) -> User | None:
     Returns:
         User | None: The User object if found, otherwise None.
     """
-    return _user_by_id.get(user_id)
+    db_path = _get_db_path()
+    cache_key = (str(db_path), user_id)
+    max_size = current_app.config.get(
+        "USER_CACHE_SIZE", DEFAULT_USER_CACHE_SIZE
+    )
+    max_age = current_app.config.get(
+        "USER_CACHE_SECONDS", DEFAULT_USER_CACHE_SECONDS
+    )
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(cache_key)
+        if cached is not None and now - cached[1] < max_age:
+            _user_cache.move_to_end(cache_key)
+            return cached[0]
+
+    user = _fetch_user(db_path, "id", user_id)
+    if max_size > 0:
+        with _user_cache_lock:
+            _user_cache[cache_key] = (user, now)
+            _user_cache.move_to_end(cache_key)
+            while len(_user_cache) > max_size:
+                _user_cache.popitem(last=False)
+    return user
 
 
 def get_user_by_username(username: str) -> User | None:
@@ -70,4 +131,158 @@ def get_user_by_username(username: str) -> User | None:
     Returns:
         User | None: The User object if found, otherwise None.
     """
-    return _user_by_username.get(username)
+    return _fetch_user(_get_db_path(), "username", username)
+
+
+def create_user(username: str, password: str) -> User:
+    """
+    Adds a user, hashing the password with the configured method.
+
+    Args:
+        username (str): The username, which must not be taken.
+        password (str): The plain-text password.
+
+    Returns:
+        User: The new user.
+
+    Raises:
+        ValueError: If the username is already taken.
+    """
+    user = User(uuid.uuid4().hex, username, _hash_password(password))
+    try:
+        with _connect(_get_db_path()) as conn:
+            conn.execute(
+                "INSERT INTO users (id, username, password_hash, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                (user.id, user.username, user.password_hash, time.time()),
+            )
+    except sqlite3.IntegrityError:
+        raise ValueError(f"The username '{username}' is already taken.")
+    return user
+
+
+def set_password(user: User, password: str) -> None:
+    """
+    Replaces a user's password hash, using the configured method.
+
+    Args:
+        user (User): The user to update.
+        password (str): The new plain-text password.
+    """
+    user.password_hash = _hash_password(password)
+    db_path = _get_db_path()
+    with _connect(db_path) as conn:
+        conn.execute(
+            "UPDATE users SET password_hash = ? WHERE id = ?",
+            (user.password_hash, user.id),
+        )
+    with _user_cache_lock:
+        _user_cache.pop((str(db_path), user.id), None)
+
+
+def get_password_hash_method() -> str:
+    """
+    Returns the method used to hash new passwords.
+
+    Returns:
+        str: A werkzeug hash method such as 'scrypt' or
+             'pbkdf2:sha256:600000'.
+    """
+    return current_app.config.get(
+        "PASSWORD_HASH_METHOD", DEFAULT_PASSWORD_HASH_METHOD
+    )
+
+
+def _hash_password(password: str) -> str:
+    """
+    Hashes a password with the configured method.
+
+    Args:
+        password (str): The plain-text password.
+
+    Returns:
+        str: The password hash.
+    """
+    return generate_password_hash(password, get_password_hash_method())
+
+
+@lru_cache(maxsize=None)
+def _method_prefix(method: str) -> str:
+    """
+    Returns the prefix, with all parameters filled in, that a hash method
+    writes in front of its hashes.
+
+    Args:
+        method (str): The hash method.
+
+    Returns:
+        str: The method and its parameters, e.g. 'scrypt:32768:8:1'.
+    """
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+def _fetch_user(db_path: Path, column: str, value: str) -> User | None:
+    """
+    Loads a user by an indexed column.
+
+    Args:
+        db_path (Path): The path to the user database.
+        column (str): 'id' or 'username'.
+        value (str): The value to look up.
+
+    Returns:
+        User | None: The user, or None if not found.
+    """
+    with _connect(db_path) as conn:
+        row = conn.execute(
+            f"SELECT id, username, password_hash FROM users"
+            f" WHERE {column} = ?",
+            (value,),
+        ).fetchone()
+    return User(*row) if row else None
+
+
+def _get_db_path() -> Path:
+    """
+    Returns the path of the user database of the current application.
+
+    Returns:
+        Path: The path to the user database.
+    """
+    return Path(current_app.instance_path) / "users.db"
+
+
+def _connect(db_path: Path) -> Transaction:
+    """
+    Opens the user database in a transaction, creating its table and the
+    demo account the first time it is used.
+
+    Args:
+        db_path (Path): The path to the user database.
+
+    Returns:
+        Transaction: A context manager yielding the connection.
+    """
+    return connect(db_path, _create_schema)
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Creates the users table and adds the demo account to an empty store.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS users ("
+        " id TEXT PRIMARY KEY,"
+        " username TEXT NOT NULL UNIQUE,"
+        " password_hash TEXT NOT NULL,"
+        " created_at REAL NOT NULL)"
+    )
+    if not conn.execute("SELECT 1 FROM users").fetchone():
+        conn.execute(
+            "INSERT INTO users (id, username, password_hash, created_at)"
+            " VALUES (?, ?, ?, ?)",
+            (*_DEMO_USER, time.time()),
+        )
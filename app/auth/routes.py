@@ -9,6 +9,7 @@ from werkzeug.wrappers.response import Response
 from app.auth import auth_bp
 from app.auth.services import authenticate_user
 from app.services.file_service import clear_session_dir
+from app.services.session_store import regenerate_session
 
 
 @auth_bp.route("/login", methods=["GET", "POST"])
@@ -27,6 +28,7 @@ def login() -> Response | str:
         user = authenticate_user(username, password)
 
         if user:
+            regenerate_session()
             login_user(user)
             return redirect(url_for("main.dashboard"))
         else:
@@ -44,5 +46,6 @@ def logout() -> Response:
     """
     clear_session_dir()
     logout_user()
+    regenerate_session()
     flash("You have been successfully logged out.")
     return redirect(url_for("auth.login"))
@@ -2,12 +2,19 @@
 Contains the business logic for authentication.
 """
 
-from app.auth.models import User, get_user_by_username
+from app.auth.models import (
+    User,
+    get_password_hash_method,
+    get_user_by_username,
+    set_password,
+)
 
 
 def authenticate_user(username: str, password: str) -> User | None:
     """
-    Authenticates a user by username and password.
+    Authenticates a user by username and password. Passwords hashed with
+    other settings than the configured hash method are hashed again once
+    they have been verified.
 
     Args:
         username (str): The user's username.
@@ -19,5 +26,7 @@ def authenticate_user(username: str, password: str) -> User | None:
     """
     user = get_user_by_username(username)
     if user and user.check_password(password):
+        if user.needs_rehash(get_password_hash_method()):
+            set_password(user, password)
         return user
     return None
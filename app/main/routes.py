@@ -3,13 +3,16 @@ Defines the main routes of the application.
 """
 
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 from flask import (
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
     current_app,
 )
@@ -22,9 +25,43 @@ from app.services.file_service import (
     MAX_FILES_PER_SESSION,
     add_file_to_session,
     get_csv_headers,
+    get_session_file,
+    get_session_files,
     is_valid_csv,
     remove_file_from_session,
 )
+from app.services.metrics_service import stage_timer
+
+# Endpoints that are called from scripts and answer errors with JSON
+JSON_ENDPOINTS = (
+    "main.submit_chart_job",
+    "main.cancel_chart_job",
+    "main.create_chart_batch",
+)
+
+# Request bodies sent by the forms of the pages
+FORM_MIMETYPES = ("multipart/form-data", "application/x-www-form-urlencoded")
+
+
+@main_bp.app_errorhandler(413)
+def file_too_large(error: Exception) -> Response | tuple[Response, int]:
+    """
+    Rejects uploads larger than the configured limit. The limit is enforced
+    while the body is streamed, so oversized files are never fully stored.
+    Form posts are redirected to the dashboard with a message; API and
+    script requests receive a JSON error.
+    """
+    message = (
+        f"File size exceeds {current_app.config['MAX_FILE_SIZE_MB']}MB limit."
+    )
+    if (
+        request.endpoint in JSON_ENDPOINTS
+        or request.headers.get("X-Requested-With") == "XMLHttpRequest"
+        or request.mimetype not in FORM_MIMETYPES
+    ):
+        return jsonify(error=message), 413
+    flash(message)
+    return redirect(url_for("main.dashboard"))
 
 
 @main_bp.route("/")
@@ -45,29 +82,53 @@ def dashboard() -> str:
     Renders the main dashboard page, displaying uploaded files and chart
     configuration.
     """
-    files = session.get("files", [])
+    files = get_session_files()
     active_file_id = request.args.get("file_id")
     active_file = None
     columns = []
+    y_columns = []
 
     if not active_file_id and files:
         active_file_id = files[0]["id"]
 
     if active_file_id:
-        active_file = next(
-            (f for f in files if f["id"] == active_file_id), None
-        )
+        active_file = get_session_file(active_file_id)
         if active_file:
-            columns = get_csv_headers(active_file["server_path"])
+            from app.services.profile_service import read_profile
+
+            # The upload profile lists the columns and which of them are
+            # numeric without opening the CSV file
+            profile = read_profile(active_file["server_path"])
+            if profile is not None:
+                columns = [c["name"] for c in profile["columns"]]
+                y_columns = [
+                    c["name"] for c in profile["columns"] if c["numeric"]
+                ]
+            else:
+                columns = get_csv_headers(active_file["server_path"])
+                y_columns = columns
+
+    # Preselect the first Y-axis candidate that differs from the X-axis
+    default_y = next(
+        (c for c in y_columns if columns and c != columns[0]), None
+    )
 
     chart_filename = session.get("chart_filename")
+    chart_info = None
+    if chart_filename:
+        from app.services.chart_service import get_chart_info
+
+        chart_info = get_chart_info(chart_filename)
 
     return render_template(
         "dashboard.html",
         files=files,
         active_file=active_file,
         columns=columns,
+        y_columns=y_columns,
+        default_y=default_y,
         chart_filename=chart_filename,
+        chart_info=chart_info,
     )
 
 
@@ -77,11 +138,14 @@ def upload_file() -> Response:
     """
     Handles file uploads, validates them, and adds them to the user's session.
     """
-    if "csv_file" not in request.files:
+    # Accessing the files parses the body, streaming uploads to disk
+    with stage_timer("upload_receive"):
+        uploaded_files = request.files
+    if "csv_file" not in uploaded_files:
         flash("No file part in the request.")
         return redirect(url_for("main.dashboard"))
 
-    file: FileStorage = request.files["csv_file"]
+    file: FileStorage = uploaded_files["csv_file"]
 
     if file.filename == "":
         flash("No file selected for uploading.")
@@ -91,23 +155,16 @@ def upload_file() -> Response:
         flash("Invalid file type. Please upload a CSV file.")
         return redirect(url_for("main.dashboard"))
 
-    # Check file size (1MB = 1048576 bytes)
-    file.seek(0, 2)  # Seek to end of file
-    file_size = file.tell()
-    file.seek(0)  # Reset to beginning
-    if file_size > 1048576:
-        flash("File size exceeds 1MB limit.")
-        return redirect(url_for("main.dashboard"))
-
-    if not is_valid_csv(file):
+    with stage_timer("upload_validate"):
+        valid = is_valid_csv(file)
+    if not valid:
         flash(
             "Invalid CSV file. Ensure it is UTF-8 encoded and "
             "has a header row."
         )
         return redirect(url_for("main.dashboard"))
 
-    files = session.get("files", [])
-    if len(files) >= MAX_FILES_PER_SESSION:
+    if len(get_session_files()) >= MAX_FILES_PER_SESSION:
         flash(f"You can only upload up to " f"{MAX_FILES_PER_SESSION} files.")
         return redirect(url_for("main.dashboard"))
 
@@ -127,8 +184,9 @@ def delete_file(file_id: str) -> Response:
     Deletes a file from the user's session.
     """
     # Check if we're deleting the currently active file
+    files = get_session_files()
     active_file_id = request.args.get("file_id") or (
-        session.get("files", [])[0]["id"] if session.get("files") else None
+        files[0]["id"] if files else None
     )
 
     if remove_file_from_session(file_id):
@@ -148,11 +206,14 @@ def update_file(file_id: str) -> Response:
     """
     Updates a file in the user's session by replacing it with a new one.
     """
-    if "csv_file" not in request.files:
+    # Accessing the files parses the body, streaming uploads to disk
+    with stage_timer("upload_receive"):
+        uploaded_files = request.files
+    if "csv_file" not in uploaded_files:
         flash("No file part in the request.")
         return redirect(url_for("main.dashboard"))
 
-    file: FileStorage = request.files["csv_file"]
+    file: FileStorage = uploaded_files["csv_file"]
 
     if file.filename == "":
         flash("No file selected for updating.")
@@ -162,15 +223,9 @@ def update_file(file_id: str) -> Response:
         flash("Invalid file type. Please upload a CSV file.")
         return redirect(url_for("main.dashboard"))
 
-    # Check file size (1MB = 1048576 bytes)
-    file.seek(0, 2)  # Seek to end of file
-    file_size = file.tell()
-    file.seek(0)  # Reset to beginning
-    if file_size > 1048576:
-        flash("File size exceeds 1MB limit.")
-        return redirect(url_for("main.dashboard"))
-
-    if not is_valid_csv(file):
+    with stage_timer("upload_validate"):
+        valid = is_valid_csv(file)
+    if not valid:
         flash(
             "Invalid CSV file. Ensure it is UTF-8 encoded and "
             "has a header row."
@@ -197,15 +252,19 @@ def generate_chart() -> Response:
     """
     file_id = request.form.get("file_id")
     x_axis = request.form.get("x_axis")
-    y_axis = request.form.get("y_axis")
+    # Several Y columns are drawn as series of one chart
+    y_axes = request.form.getlist("y_axis")
     chart_type = request.form.get("chart_type")
+    output_format = request.form.get("output_format") or "png"
+    dpi = request.form.get("dpi", type=int)
+    aggregation = request.form.get("aggregation") or "none"
+    time_bucket = request.form.get("time_bucket") or "none"
 
-    if not all([file_id, x_axis, y_axis, chart_type]):
+    if not all([file_id, x_axis, y_axes, chart_type]):
         flash("Missing required parameters for chart generation.")
         return redirect(url_for("main.dashboard"))
 
-    files = session.get("files", [])
-    active_file = next((f for f in files if f["id"] == file_id), None)
+    active_file = get_session_file(file_id)
 
     if not active_file:
         flash("Selected file not found.")
@@ -216,16 +275,28 @@ def generate_chart() -> Response:
 
     # Type guards to satisfy mypy
     assert x_axis is not None
-    assert y_axis is not None
     assert chart_type is not None
 
     chart_filename, error_message = create_chart(
-        active_file["server_path"], x_axis, y_axis, chart_type
+        active_file["server_path"],
+        x_axis,
+        y_axes,
+        chart_type,
+        active_file["original_filename"],
+        output_format,
+        dpi,
+        aggregation,
+        time_bucket,
     )
 
     if chart_filename:
         session["chart_filename"] = chart_filename
-        log_event("chart_generated")
+        log_event(
+            "chart_generated",
+            session_id=session.get("session_dir_id"),
+            file_id=file_id,
+            chart=chart_filename,
+        )
         flash("Chart generated successfully.")
     else:
         flash(error_message or "Could not generate the chart.")
@@ -233,18 +304,440 @@ def generate_chart() -> Response:
     return redirect(url_for("main.dashboard", file_id=file_id))
 
 
+@main_bp.route("/series")
+@login_required
+def get_series() -> Response | tuple[Response, int]:
+    """
+    Returns the cleaned and downsampled points of a chart so that the
+    browser can draw it without a server-side render. The 'format' query
+    argument selects 'json' or the compact 'binary' encoding.
+    """
+    from app.services.aggregation_service import (
+        aggregated_label,
+        resolve_aggregation,
+    )
+    from app.services.chart_service import (
+        describe_chart_error,
+        prepare_series,
+    )
+    from app.services.datetime_service import bucketed_label
+    from app.services.metrics_service import StageClock, inc
+    from app.services.series_service import (
+        SERIES_MIMETYPE,
+        encode_series_binary,
+        encode_series_json,
+        series_key,
+    )
+
+    clock = StageClock()
+    file_id = request.args.get("file_id")
+    x_axis = request.args.get("x_axis")
+    y_axes = request.args.getlist("y_axis")
+    chart_type = request.args.get("chart_type")
+    series_format = request.args.get("format", "json")
+    aggregation = request.args.get("aggregation") or "none"
+    time_bucket = request.args.get("time_bucket") or "none"
+
+    if not file_id or not x_axis or not y_axes or not chart_type:
+        return (
+            jsonify(error="Missing required parameters for chart generation."),
+            400,
+        )
+    if series_format not in ("json", "binary"):
+        return jsonify(error=f"Invalid series format: {series_format}"), 400
+
+    active_file = get_session_file(file_id)
+    if not active_file:
+        return jsonify(error="Selected file not found."), 404
+
+    # Repeat requests for unchanged data are answered without loading it
+    key = series_key(
+        active_file["server_path"],
+        x_axis,
+        y_axes,
+        chart_type,
+        aggregation,
+        time_bucket,
+    )
+    etag = f"{key}-{series_format}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            series, error = prepare_series(
+                active_file["server_path"],
+                x_axis,
+                y_axes,
+                chart_type,
+                aggregation,
+                time_bucket,
+                clock,
+            )
+        except Exception as e:
+            series, error = None, describe_chart_error(e)
+        if series is None:
+            return jsonify(error=error), 400
+
+        x_label = bucketed_label(x_axis, time_bucket)
+        aggregation = resolve_aggregation(aggregation, time_bucket)
+        y_labels = [
+            aggregated_label(column, aggregation)
+            for column in dict.fromkeys(y_axes)
+        ]
+        if series_format == "binary":
+            response = Response(
+                encode_series_binary(series, x_label, y_labels, chart_type),
+                mimetype=SERIES_MIMETYPE,
+            )
+        else:
+            response = jsonify(
+                encode_series_json(series, x_label, y_labels, chart_type)
+            )
+        clock.total("series_total")
+        inc("csvviz_series_requests_total", format=series_format)
+
+    # The URL names a session file whose contents may be replaced, so
+    # caches must revalidate
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@main_bp.route("/chart_jobs", methods=["POST"])
+@login_required
+def submit_chart_job() -> tuple[Response, int]:
+    """
+    Starts generating a chart in the background and returns the job id
+    without waiting for the chart.
+    """
+    file_id = request.form.get("file_id")
+    x_axis = request.form.get("x_axis")
+    # Several Y columns are drawn as series of one chart
+    y_axes = request.form.getlist("y_axis")
+    chart_type = request.form.get("chart_type")
+    output_format = request.form.get("output_format") or "png"
+    dpi = request.form.get("dpi", type=int)
+    aggregation = request.form.get("aggregation") or "none"
+    time_bucket = request.form.get("time_bucket") or "none"
+
+    if not file_id or not x_axis or not y_axes or not chart_type:
+        return (
+            jsonify(error="Missing required parameters for chart generation."),
+            400,
+        )
+
+    active_file = get_session_file(file_id)
+
+    if not active_file:
+        return jsonify(error="Selected file not found."), 404
+
+    from app.services.job_service import submit_chart_job as submit_job
+
+    job = submit_job(
+        current_app._get_current_object(),  # type: ignore[attr-defined]
+        _job_owner(),
+        file_id,
+        active_file["server_path"],
+        x_axis,
+        y_axes,
+        chart_type,
+        active_file["original_filename"],
+        output_format,
+        dpi,
+        aggregation,
+        time_bucket,
+    )
+    return (
+        jsonify(
+            {
+                **job.to_dict(),
+                "status_url": url_for("main.chart_job_status", job_id=job.id),
+                "events_url": url_for("main.chart_job_events", job_id=job.id),
+            }
+        ),
+        202,
+    )
+
+
+@main_bp.route("/chart_jobs/<string:job_id>")
+@login_required
+def chart_job_status(job_id: str) -> tuple[Response, int]:
+    """
+    Reports the status and current stage of a chart job. Once the job has
+    finished, its chart becomes the session's current chart.
+    """
+    from app.services.job_service import (
+        JOB_DONE,
+        get_chart_job,
+        mark_job_delivered,
+    )
+
+    job = get_chart_job(job_id, _job_owner())
+    if job is None:
+        return jsonify(error="Chart job not found."), 404
+
+    if job.finished and not job.delivered and mark_job_delivered(job):
+        if job.status == JOB_DONE:
+            session["chart_filename"] = job.chart_filename
+            flash("Chart generated successfully.")
+        else:
+            flash(job.error or "Could not generate the chart.")
+
+    return jsonify(job.to_dict()), 200
+
+
+@main_bp.route("/chart_jobs/<string:job_id>/events")
+@login_required
+def chart_job_events(job_id: str) -> Response | tuple[Response, int]:
+    """
+    Streams the progress of a chart job as server-sent events.
+    """
+    import json
+
+    from app.services.job_service import get_chart_job, wait_for_job_change
+
+    job = get_chart_job(job_id, _job_owner())
+    if job is None:
+        return jsonify(error="Chart job not found."), 404
+
+    def stream():
+        current = job
+        yield f"event: progress\ndata: {json.dumps(current.to_dict())}\n\n"
+        while not current.finished:
+            changed = wait_for_job_change(current, timeout=15)
+            if changed.version == current.version:
+                # Keep the connection open through idle proxies
+                yield ": keep-alive\n\n"
+                continue
+            current = changed
+            yield f"event: progress\ndata: {json.dumps(current.to_dict())}\n\n"
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@main_bp.route("/chart_jobs/<string:job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_chart_job(job_id: str) -> tuple[Response, int]:
+    """
+    Cancels a chart job.
+    """
+    from app.services.job_service import cancel_chart_job as cancel_job
+    from app.services.job_service import get_chart_job
+
+    job = get_chart_job(job_id, _job_owner())
+    if job is None:
+        return jsonify(error="Chart job not found."), 404
+
+    job = cancel_job(job)
+    return jsonify(job.to_dict()), 200
+
+
+@main_bp.route("/chart_batches", methods=["POST"])
+@login_required
+def create_chart_batch() -> tuple[Response, int]:
+    """
+    Generates several charts from the session files, given as a JSON body
+    {"charts": [spec, ...]}, and returns the batch manifest with a link to
+    each chart and to a ZIP archive of all of them. Charts that cannot be
+    generated are reported in the manifest.
+    """
+    from app.services.batch_service import (
+        DEFAULT_CHART_BATCH_MAX_CHARTS,
+        remember_batch,
+        run_chart_batch,
+        save_batch_manifest,
+    )
+
+    body = request.get_json(silent=True)
+    specs = body.get("charts") if isinstance(body, dict) else None
+    if not isinstance(specs, list) or not specs:
+        return jsonify(error="The request must list the charts to build."), 400
+    max_charts = current_app.config.get(
+        "CHART_BATCH_MAX_CHARTS", DEFAULT_CHART_BATCH_MAX_CHARTS
+    )
+    if len(specs) > max_charts:
+        return (
+            jsonify(error=f"A batch may contain at most {max_charts} charts."),
+            400,
+        )
+
+    files = {file["id"]: file for file in get_session_files()}
+    manifest = run_chart_batch(specs, files)
+    save_batch_manifest(manifest)
+    session["chart_batches"] = remember_batch(
+        session.get("chart_batches") or [], manifest["batch_id"]
+    )
+    return jsonify(_describe_batch(manifest)), 200
+
+
+@main_bp.route("/chart_batches/<string:batch_id>")
+@login_required
+def chart_batch_manifest(batch_id: str) -> tuple[Response, int]:
+    """
+    Returns the manifest of a recent batch of the session.
+    """
+    manifest = _get_session_batch(batch_id)
+    if manifest is None:
+        return jsonify(error="Chart batch not found."), 404
+    return jsonify(_describe_batch(manifest)), 200
+
+
+@main_bp.route("/chart_batches/<string:batch_id>/archive")
+@login_required
+def download_chart_batch(batch_id: str) -> Response | tuple[Response, int]:
+    """
+    Downloads the charts of a recent batch of the session as a ZIP archive
+    that includes the manifest.
+    """
+    from flask import send_file
+
+    from app.services.batch_service import open_batch_archive
+
+    manifest = _get_session_batch(batch_id)
+    if manifest is None:
+        return jsonify(error="Chart batch not found."), 404
+    return send_file(
+        open_batch_archive(manifest),
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=f"charts_{batch_id[:8]}.zip",
+    )
+
+
+def _get_session_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads the manifest of one of the session's recent batches.
+
+    Args:
+        batch_id (str): The batch id.
+
+    Returns:
+        Optional[Dict[str, Any]]: The manifest, or None if the batch does
+                                  not belong to the session or has expired.
+    """
+    from app.services.batch_service import load_batch_manifest
+
+    if batch_id not in (session.get("chart_batches") or []):
+        return None
+    return load_batch_manifest(batch_id)
+
+
+def _describe_batch(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds the URLs of a batch's charts and archive to its manifest.
+
+    Args:
+        manifest (Dict[str, Any]): The batch manifest.
+
+    Returns:
+        Dict[str, Any]: The manifest with 'url' set on each generated
+                        chart and 'archive_url' on the batch.
+    """
+    charts = [
+        {
+            **entry,
+            "url": (
+                url_for("main.get_chart", filename=entry["chart"])
+                if entry["chart"]
+                else None
+            ),
+        }
+        for entry in manifest["charts"]
+    ]
+    return {
+        **manifest,
+        "charts": charts,
+        "archive_url": url_for(
+            "main.download_chart_batch", batch_id=manifest["batch_id"]
+        ),
+    }
+
+
+def _job_owner() -> tuple[str, str]:
+    """
+    Identifies the current user and session for chart job ownership.
+
+    Returns:
+        tuple[str, str]: The user id and session directory id.
+    """
+    return str(current_user.get_id()), str(session.get("session_dir_id", ""))
+
+
 @main_bp.route("/charts/<string:filename>")
 @login_required
 def get_chart(filename: str) -> Response:
     """
-    Serves a generated chart image.
+    Serves a generated chart image. Chart filenames are derived from the
+    chart's contents, so a URL always refers to the same bytes: responses
+    may be cached indefinitely, the filename serves as a strong ETag, and
+    conditional and range requests are answered by send_from_directory.
     """
     from flask import send_from_directory
 
+    from app.services.cleanup_service import KIND_CHART, record_access
+
     charts_dir = Path(current_app.instance_path) / "charts"
+    if (charts_dir / filename).is_file():
+        # A chart and its thumbnail share the access record of their key
+        record_access(KIND_CHART, filename.split(".", 1)[0])
+    cache_options = {
+        "etag": filename,
+        "max_age": current_app.config.get("CHART_HTTP_MAX_AGE", 31536000),
+        "conditional": True,
+    }
     if request.args.get("download"):
         from app.services.logging_service import log_event
 
-        log_event("chart_downloaded")
-        return send_from_directory(charts_dir, filename, as_attachment=True)
-    return send_from_directory(charts_dir, filename)
+        from app.services.chart_service import get_chart_info
+
+        log_event(
+            "chart_downloaded",
+            session_id=session.get("session_dir_id"),
+            chart=filename,
+        )
+        chart_info = get_chart_info(filename) or {}
+        response = send_from_directory(
+            charts_dir,
+            filename,
+            as_attachment=True,
+            download_name=chart_info.get("download_name", filename),
+            **cache_options,
+        )
+    else:
+        response = send_from_directory(charts_dir, filename, **cache_options)
+
+    # Charts are only served to logged-in users, so shared caches must not
+    # keep them
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+@main_bp.route("/metrics")
+def metrics() -> Response:
+    """
+    Exposes timing histograms and counters of all worker processes in the
+    Prometheus text format. Scrapers authenticate with the METRICS_TOKEN
+    bearer token; logged-in users may view the page as well.
+    """
+    import hmac
+
+    from app.services.metrics_service import render_metrics
+
+    token = current_app.config.get("METRICS_TOKEN")
+    authorization = request.headers.get("Authorization", "")
+    token_ok = bool(token) and hmac.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    )
+    if not token_ok and not current_user.is_authenticated:
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+
+    return Response(
+        render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,99 @@
+"""
+Groups chart rows by their X value so that repeated categories are drawn
+once.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Aggregations offered for charts; "none" keeps one point per row
+AGGREGATIONS = ("none", "sum", "mean", "count", "min", "max")
+
+
+def aggregate(
+    x: np.ndarray, y: np.ndarray, how: str, sort: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Combines the Y values of rows sharing an X value. Keys are factorized
+    once and reduced with bincount, or with a single sorted reduceat pass
+    for the minimum and maximum, instead of grouping row by row.
+
+    Args:
+        x (np.ndarray): The X values.
+        y (np.ndarray): The numeric Y values, without missing values, with
+                        one column per series when there are several.
+        how (str): One of AGGREGATIONS other than "none".
+        sort (bool): Whether to order the distinct X values by value
+                     rather than by first appearance.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The distinct X values and their
+                                       aggregated Y values.
+
+    Raises:
+        ValueError: If the aggregation is unknown.
+    """
+    codes, uniques = pd.factorize(x, sort=sort)
+    groups = len(uniques)
+    keys = np.asarray(uniques)
+    if how not in AGGREGATIONS[1:]:
+        raise ValueError(f"Invalid aggregation: {how}")
+
+    # Series are reduced as columns and restored to the shape of y
+    columns = y.astype(np.float64, copy=False).reshape(len(y), -1)
+    counts = np.bincount(codes, minlength=groups)
+    values: np.ndarray
+    if how == "count":
+        values = np.repeat(counts[:, None], columns.shape[1], axis=1)
+    elif how in ("min", "max"):
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+        reducer = np.minimum if how == "min" else np.maximum
+        values = reducer.reduceat(columns[order], starts, axis=0)
+    else:
+        # bincount takes one column of weights at a time
+        values = np.column_stack(
+            [
+                np.bincount(codes, weights=column, minlength=groups)
+                for column in columns.T
+            ]
+        )
+        if how == "mean":
+            values = values / counts[:, None]
+    return keys, values.astype(np.float64).reshape((groups,) + y.shape[1:])
+
+
+def resolve_aggregation(how: Optional[str], time_bucket: Optional[str]) -> str:
+    """
+    Returns the aggregation a chart uses. Rows grouped into time buckets
+    must be combined, so they are averaged unless told otherwise.
+
+    Args:
+        how (Optional[str]): The requested aggregation, if any.
+        time_bucket (Optional[str]): The requested time bucket, if any.
+
+    Returns:
+        str: The aggregation, "none" when rows are plotted as they are.
+    """
+    how = how or "none"
+    if how == "none" and time_bucket and time_bucket != "none":
+        return "mean"
+    return how
+
+
+def aggregated_label(y_axis: str, how: Optional[str]) -> str:
+    """
+    Labels the Y-axis of a chart whose values may be aggregated.
+
+    Args:
+        y_axis (str): The column used for the Y-axis.
+        how (Optional[str]): The aggregation, if any.
+
+    Returns:
+        str: The column name, wrapped in the aggregation when there is one.
+    """
+    if not how or how == "none":
+        return y_axis
+    return f"{how}({y_axis})"
@@ -0,0 +1,402 @@
+"""
+Generates batches of charts in parallel and packages their images.
+"""
+
+import atexit
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional
+
+from flask import Flask, current_app
+
+from app.services.cache_service import load_columns
+from app.services.chart_service import create_chart, get_chart_info
+from app.services.cleanup_service import KIND_BATCH, record_access
+from app.services.file_service import get_csv_headers
+from app.services.logging_service import log_event
+from app.services.metrics_service import StageClock, inc
+
+DEFAULT_CHART_BATCH_MAX_CHARTS = 50
+DEFAULT_CHART_BATCH_WORKERS = 4
+
+# Number of recent batch ids kept in each session for downloads
+SESSION_BATCH_HISTORY = 3
+
+# Batch manifests are stored in this directory of the instance folder,
+# next to the chart cache, and expire with the charts they list
+BATCHES_DIRNAME = "chart_batches"
+
+_BATCH_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Spec fields copied into the manifest, in order
+SPEC_FIELDS = (
+    "file_id",
+    "x_axis",
+    "y_axis",
+    "chart_type",
+    "output_format",
+    "dpi",
+    "aggregation",
+    "time_bucket",
+)
+
+# Formats that are already compressed are stored in archives as they are
+_COMPRESSED_EXTENSIONS = (".png", ".webp")
+
+_executor_lock = threading.Lock()
+
+
+def run_chart_batch(
+    specs: List[Any], files: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Generates the charts of a batch. The columns the batch needs from each
+    file are loaded once and shared by its charts, which are rendered in
+    parallel. A chart that cannot be generated is reported in its manifest
+    entry without affecting the others.
+
+    Args:
+        specs (List[Any]): The chart specs, each a dictionary with the keys
+            'file_id', 'x_axis', 'y_axis' (a column or a list of columns)
+            and 'chart_type', and optionally 'output_format', 'dpi',
+            'aggregation' and 'time_bucket'.
+        files (Dict[str, Dict[str, Any]]): The session files by id.
+
+    Returns:
+        Dict[str, Any]: The manifest: the batch id, one entry per spec in
+                        order with its chart filename or error, and the
+                        number of charts generated and failed.
+    """
+    clock = StageClock()
+    entries = [
+        _validate_spec(index, spec, files) for index, spec in enumerate(specs)
+    ]
+    valid = [entry for entry in entries if entry["error"] is None]
+
+    frames: Dict[str, Any] = {}
+    for file_id in dict.fromkeys(entry["file_id"] for entry in valid):
+        frames[file_id] = _load_batch_columns(
+            files[file_id]["server_path"],
+            [entry for entry in valid if entry["file_id"] == file_id],
+        )
+    clock.lap("batch_parse")
+
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    futures = [
+        (
+            entry,
+            _get_executor(app).submit(
+                _run_spec, app, entry, files[entry["file_id"]], frames
+            ),
+        )
+        for entry in valid
+    ]
+    for entry, future in futures:
+        entry["chart"], entry["error"] = future.result()
+        if entry["chart"]:
+            info = get_chart_info(entry["chart"]) or {}
+            entry["download_name"] = info.get("download_name")
+    clock.lap("batch_render")
+    clock.total("batch_total")
+
+    succeeded = sum(1 for entry in entries if entry["chart"])
+    inc("csvviz_chart_batches_total")
+    inc("csvviz_chart_batch_charts_total", succeeded, status="done")
+    inc(
+        "csvviz_chart_batch_charts_total",
+        len(entries) - succeeded,
+        status="failed",
+    )
+    manifest = {
+        "batch_id": uuid.uuid4().hex,
+        "created_at": time.time(),
+        "charts": entries,
+        "succeeded": succeeded,
+        "failed": len(entries) - succeeded,
+    }
+    log_event(
+        "chart_batch_generated",
+        batch_id=manifest["batch_id"],
+        charts=len(entries),
+        failed=manifest["failed"],
+    )
+    return manifest
+
+
+def remember_batch(batch_ids: List[str], batch_id: str) -> List[str]:
+    """
+    Adds a batch to the ids kept in a session, dropping the oldest beyond
+    SESSION_BATCH_HISTORY.
+
+    Args:
+        batch_ids (List[str]): The kept batch ids, oldest first.
+        batch_id (str): The id of the new batch.
+
+    Returns:
+        List[str]: The batch ids to keep.
+    """
+    return [*batch_ids, batch_id][-SESSION_BATCH_HISTORY:]
+
+
+def save_batch_manifest(manifest: Dict[str, Any]) -> None:
+    """
+    Stores a batch manifest in the instance folder.
+
+    Args:
+        manifest (Dict[str, Any]): The batch manifest.
+    """
+    path = _get_manifest_path(manifest["batch_id"])
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    record_access(KIND_BATCH, manifest["batch_id"])
+
+
+def load_batch_manifest(batch_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads a stored batch manifest.
+
+    Args:
+        batch_id (str): The batch id.
+
+    Returns:
+        Optional[Dict[str, Any]]: The manifest, or None if the id is invalid
+                                  or the manifest has expired.
+    """
+    if not _BATCH_ID_PATTERN.fullmatch(batch_id):
+        return None
+    try:
+        with open(_get_manifest_path(batch_id), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    record_access(KIND_BATCH, batch_id)
+    return manifest
+
+
+def remove_batch_manifest(batch_id: str) -> None:
+    """
+    Deletes a stored batch manifest if it exists.
+
+    Args:
+        batch_id (str): The batch id.
+    """
+    if not _BATCH_ID_PATTERN.fullmatch(batch_id):
+        return
+    try:
+        os.remove(_get_manifest_path(batch_id))
+    except OSError:
+        pass
+
+
+def write_batch_archive(manifest: Dict[str, Any], output: IO[bytes]) -> None:
+    """
+    Writes the images of a batch and its manifest as a ZIP archive. Images
+    are named after their position in the batch and their download name;
+    charts that were evicted from the chart cache since are reported as
+    errors in the archived manifest.
+
+    Args:
+        manifest (Dict[str, Any]): The batch manifest.
+        output (IO[bytes]): The binary stream to write to.
+    """
+    charts_dir = Path(current_app.instance_path) / "charts"
+    archived = {**manifest, "charts": []}
+    with zipfile.ZipFile(output, "w") as archive:
+        for entry in manifest["charts"]:
+            entry = dict(entry)
+            chart_path = charts_dir / (entry["chart"] or "")
+            if entry["chart"] and chart_path.is_file():
+                name = (
+                    f"{entry['index'] + 1:02d}_"
+                    f"{entry['download_name'] or entry['chart']}"
+                )
+                compression = (
+                    zipfile.ZIP_STORED
+                    if chart_path.suffix in _COMPRESSED_EXTENSIONS
+                    else zipfile.ZIP_DEFLATED
+                )
+                archive.write(chart_path, name, compress_type=compression)
+                entry["archive_name"] = name
+            elif entry["chart"]:
+                entry["chart"] = None
+                entry["error"] = (
+                    "The chart is no longer available; run the batch again."
+                )
+            archived["charts"].append(entry)
+        archive.writestr(
+            "manifest.json",
+            json.dumps(archived, indent=2),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+
+
+def open_batch_archive(manifest: Dict[str, Any]) -> IO[bytes]:
+    """
+    Builds the ZIP archive of a batch in a temporary file, which stays in
+    memory while small.
+
+    Args:
+        manifest (Dict[str, Any]): The batch manifest.
+
+    Returns:
+        IO[bytes]: The archive, positioned at its start.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write_batch_archive(manifest, output)
+    output.seek(0)
+    return output  # type: ignore[return-value]
+
+
+def _validate_spec(
+    index: int, spec: Any, files: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Builds the manifest entry of a spec, recording why it cannot be
+    generated if it is incomplete.
+
+    Args:
+        index (int): The position of the spec in the batch.
+        spec (Any): The chart spec, as received.
+        files (Dict[str, Dict[str, Any]]): The session files by id.
+
+    Returns:
+        Dict[str, Any]: The entry, with 'chart' unset and 'error' set when
+                        the spec is invalid.
+    """
+    spec = spec if isinstance(spec, dict) else {}
+    entry: Dict[str, Any] = {"index": index}
+    entry.update((field, spec.get(field)) for field in SPEC_FIELDS)
+    entry.update(chart=None, download_name=None, error=None)
+    if isinstance(entry["y_axis"], str):
+        entry["y_axis"] = [entry["y_axis"]]
+
+    strings = ("file_id", "x_axis", "chart_type")
+    if (
+        not all(isinstance(entry[field], str) for field in strings)
+        or not isinstance(entry["y_axis"], list)
+        or not all(isinstance(column, str) for column in entry["y_axis"])
+        or not all(entry[field] for field in (*strings, "y_axis"))
+    ):
+        entry["error"] = "Missing required parameters for chart generation."
+    elif entry["file_id"] not in files:
+        entry["error"] = "Selected file not found."
+    elif entry["dpi"] is not None and not isinstance(entry["dpi"], int):
+        entry["error"] = "DPI must be a whole number."
+    return entry
+
+
+def _load_batch_columns(
+    file_path: str, entries: List[Dict[str, Any]]
+) -> Optional[Any]:
+    """
+    Loads, in one pass, every existing column that the charts of a file
+    use. Charts naming missing columns find out when they are generated.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        entries (List[Dict[str, Any]]): The valid entries for the file.
+
+    Returns:
+        Optional[pd.DataFrame]: The columns, or None if they could not be
+                                loaded, in which case each chart loads its
+                                own.
+    """
+    headers = set(get_csv_headers(file_path))
+    columns = [
+        column
+        for entry in entries
+        for column in (entry["x_axis"], *entry["y_axis"])
+        if column in headers
+    ]
+    if not columns:
+        return None
+    try:
+        return load_columns(file_path, list(dict.fromkeys(columns)))
+    except Exception:
+        return None
+
+
+def _run_spec(
+    app: Flask,
+    entry: Dict[str, Any],
+    active_file: Dict[str, Any],
+    frames: Dict[str, Any],
+) -> tuple[str | None, str | None]:
+    """
+    Generates the chart of one batch entry in a worker thread.
+
+    Args:
+        app (Flask): The application whose configuration the batch uses.
+        entry (Dict[str, Any]): The manifest entry.
+        active_file (Dict[str, Any]): The session file it charts.
+        frames (Dict[str, Any]): The columns loaded for each file id.
+
+    Returns:
+        tuple[str | None, str | None]: The chart filename and error message,
+                                       as returned by create_chart.
+    """
+    with app.app_context():
+        return create_chart(
+            active_file["server_path"],
+            entry["x_axis"],
+            entry["y_axis"],
+            entry["chart_type"],
+            active_file["original_filename"],
+            entry["output_format"] or "png",
+            entry["dpi"],
+            entry["aggregation"],
+            entry["time_bucket"],
+            frame=frames.get(entry["file_id"]),
+        )
+
+
+def _get_manifest_path(batch_id: str) -> Path:
+    """
+    Returns the path of a stored batch manifest.
+
+    Args:
+        batch_id (str): The batch id.
+
+    Returns:
+        Path: The path to the manifest file.
+    """
+    return (
+        Path(current_app.instance_path) / BATCHES_DIRNAME / f"{batch_id}.json"
+    )
+
+
+def _get_executor(app: Flask) -> ThreadPoolExecutor:
+    """
+    Returns the thread pool shared by the batches of an application,
+    creating it on first use. Queued charts are cancelled when the process
+    exits.
+
+    Args:
+        app (Flask): The application whose configuration sizes the pool.
+
+    Returns:
+        ThreadPoolExecutor: The pool.
+    """
+    with _executor_lock:
+        executor = app.extensions.get("chart_batch_executor")
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=app.config.get(
+                    "CHART_BATCH_WORKERS", DEFAULT_CHART_BATCH_WORKERS
+                ),
+                thread_name_prefix="chart-batch",
+            )
+            app.extensions["chart_batch_executor"] = executor
+            atexit.register(executor.shutdown, cancel_futures=True)
+        return executor
@@ -0,0 +1,261 @@
+"""
+Stores uploaded files once per content hash and tracks which sessions
+reference them.
+"""
+
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from app.services.cache_service import get_dataframe_cache
+from app.services.sqlite_service import Transaction, connect
+from app.services.upload_service import store_upload
+
+BLOBS_DIR_NAME = "blobs"
+BLOB_SUFFIX = ".csv"
+
+
+def get_blobs_dir() -> Path:
+    """
+    Returns the directory holding the stored uploads.
+
+    Returns:
+        Path: The blobs directory inside the instance folder.
+    """
+    return Path(current_app.instance_path) / BLOBS_DIR_NAME
+
+
+def get_blob_path(sha256: str) -> Path:
+    """
+    Returns the location of the blob with the given content hash.
+
+    Args:
+        sha256 (str): The hexadecimal SHA-256 digest of the contents.
+
+    Returns:
+        Path: The path to the blob.
+    """
+    return get_blobs_dir() / sha256[:2] / f"{sha256}{BLOB_SUFFIX}"
+
+
+def store_blob(
+    session_id: str, file_id: str, file: FileStorage
+) -> Tuple[Path, str, bool]:
+    """
+    Stores an uploaded file by its content hash and records that a session
+    file refers to it. Contents that are already stored are not written
+    again. If the session file referred to other contents before, they are
+    released.
+
+    Args:
+        session_id (str): The id of the session owning the file.
+        file_id (str): The id of the file within the session.
+        file (FileStorage): The uploaded file.
+
+    Returns:
+        Tuple[Path, str, bool]: The blob path, its SHA-256 digest and
+                                whether the contents were new.
+    """
+    blobs_dir = get_blobs_dir()
+    os.makedirs(blobs_dir, exist_ok=True)
+    tmp_path = blobs_dir / f".{uuid.uuid4().hex}.tmp"
+    try:
+        sha256 = store_upload(file, tmp_path)
+        blob_path = get_blob_path(sha256)
+
+        # The database lock serializes placing blobs with releasing them,
+        # so a blob cannot be deleted between being found and referenced
+        with _connect() as conn:
+            created = not blob_path.exists()
+            if created:
+                os.makedirs(blob_path.parent, exist_ok=True)
+                os.replace(tmp_path, blob_path)
+            previous = _get_reference(conn, session_id, file_id)
+            conn.execute(
+                "INSERT INTO refs (session_id, file_id, sha256, created_at)"
+                " VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(session_id, file_id) DO UPDATE SET"
+                " sha256 = excluded.sha256, created_at = excluded.created_at",
+                (session_id, file_id, sha256, time.time()),
+            )
+            if previous is not None and previous != sha256:
+                _delete_if_unreferenced(conn, previous)
+    finally:
+        _remove_path(tmp_path)
+    return blob_path, sha256, created
+
+
+def release_blob(session_id: str, file_id: str) -> bool:
+    """
+    Drops a session file's reference to its blob, deleting the blob when no
+    other reference remains.
+
+    Args:
+        session_id (str): The id of the session owning the file.
+        file_id (str): The id of the file within the session.
+
+    Returns:
+        bool: True if the reference existed, False otherwise.
+    """
+    with _connect() as conn:
+        sha256 = _get_reference(conn, session_id, file_id)
+        if sha256 is None:
+            return False
+        conn.execute(
+            "DELETE FROM refs WHERE session_id = ? AND file_id = ?",
+            (session_id, file_id),
+        )
+        _delete_if_unreferenced(conn, sha256)
+    return True
+
+
+def release_session_blobs(session_id: str) -> int:
+    """
+    Drops every reference held by a session, deleting blobs that are no
+    longer referenced.
+
+    Args:
+        session_id (str): The id of the session.
+
+    Returns:
+        int: The number of references dropped.
+    """
+    with _connect() as conn:
+        hashes = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT sha256 FROM refs WHERE session_id = ?",
+                (session_id,),
+            )
+        ]
+        released = conn.execute(
+            "DELETE FROM refs WHERE session_id = ?", (session_id,)
+        ).rowcount
+        for sha256 in hashes:
+            _delete_if_unreferenced(conn, sha256)
+    return released
+
+
+def count_references(sha256: str) -> int:
+    """
+    Counts the session files referring to a blob.
+
+    Args:
+        sha256 (str): The hexadecimal SHA-256 digest of the contents.
+
+    Returns:
+        int: The number of references.
+    """
+    with _connect() as conn:
+        return _count_references(conn, sha256)
+
+
+def _get_reference(
+    conn: sqlite3.Connection, session_id: str, file_id: str
+) -> Optional[str]:
+    """
+    Looks up the blob referenced by a session file.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+        session_id (str): The id of the session owning the file.
+        file_id (str): The id of the file within the session.
+
+    Returns:
+        Optional[str]: The blob's content hash, or None without a reference.
+    """
+    row = conn.execute(
+        "SELECT sha256 FROM refs WHERE session_id = ? AND file_id = ?",
+        (session_id, file_id),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _count_references(conn: sqlite3.Connection, sha256: str) -> int:
+    """
+    Counts the references to a blob.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+        sha256 (str): The blob's content hash.
+
+    Returns:
+        int: The number of references.
+    """
+    row = conn.execute(
+        "SELECT COUNT(*) FROM refs WHERE sha256 = ?", (sha256,)
+    ).fetchone()
+    return int(row[0])
+
+
+def _delete_if_unreferenced(conn: sqlite3.Connection, sha256: str) -> None:
+    """
+    Deletes a blob and its derived files if nothing refers to it any more.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+        sha256 (str): The blob's content hash.
+    """
+    if _count_references(conn, sha256) > 0:
+        return
+    # Imported here because both pull in pandas, which is kept off the
+    # startup path
+    from app.services.columnar_service import remove_columnar_sidecar
+    from app.services.profile_service import remove_profile
+
+    blob_path = str(get_blob_path(sha256))
+    get_dataframe_cache().invalidate(blob_path)
+    remove_columnar_sidecar(blob_path)
+    remove_profile(blob_path)
+    _remove_path(Path(blob_path))
+
+
+def _remove_path(path: Path) -> None:
+    """
+    Deletes a file if it exists.
+
+    Args:
+        path (Path): The file to delete.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _connect() -> Transaction:
+    """
+    Opens the reference database in an immediate transaction, so that
+    concurrent writers in any process are serialized, creating its table
+    the first time it is used.
+
+    Returns:
+        Transaction: A context manager yielding the connection.
+    """
+    return connect(
+        get_blobs_dir() / "refs.db", _create_schema, timeout=30, immediate=True
+    )
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Creates the reference table and its index.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS refs ("
+        " session_id TEXT NOT NULL,"
+        " file_id TEXT NOT NULL,"
+        " sha256 TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " PRIMARY KEY (session_id, file_id))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS refs_sha256 ON refs (sha256)")
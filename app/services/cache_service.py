@@ -0,0 +1,387 @@
+"""
+Provides a process-wide cache of parsed CSV files.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.services.metrics_service import inc, set_gauge
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_DATAFRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+CacheKey = Tuple[str, int, int]
+
+# Parses the given columns of a file, or every column when given None.
+# Returns None when only some columns cannot be read on their own.
+Loader = Callable[[str, Optional[List[str]]], "Optional[pd.DataFrame]"]
+
+
+class DataFrameCache:
+    """
+    Least-recently-used cache of parsed DataFrames bounded by memory usage.
+    Each version of a file has one entry, holding either the whole file or
+    the columns requested from it so far.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_DATAFRAME_CACHE_MAX_BYTES,
+        export_metrics: bool = False,
+    ) -> None:
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_bytes (int): The memory budget for cached frames in bytes.
+            export_metrics (bool): Whether the cache's counters and memory
+                                   usage are exported on /metrics.
+        """
+        self.max_bytes = max_bytes
+        self.export_metrics = export_metrics
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: (
+            "OrderedDict[CacheKey, Tuple[pd.DataFrame, int, bool]]"
+        ) = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        file_path: str,
+        loader: Loader,
+        columns: Optional[List[str]] = None,
+    ) -> "pd.DataFrame":
+        """
+        Returns the parsed frame for a file, loading it on a cache miss.
+        Columns missing from the cached entry are loaded and added to it;
+        when the loader cannot read them on their own, the whole file is
+        loaded instead, so later selections are served from the cache.
+
+        Args:
+            file_path (str): The path to the CSV file.
+            loader (Loader): The function used to parse the file, or some
+                             of its columns, when they are not cached.
+            columns (Optional[List[str]]): The columns needed, or None for
+                                           the whole file.
+
+        Returns:
+            pd.DataFrame: A frame holding at least the requested columns.
+                          Callers must not modify it.
+        """
+        key = _make_key(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            missing = _missing_columns(entry, columns)
+            if entry is not None and missing == []:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                hit = entry[0]
+            else:
+                hit = None
+                self.misses += 1
+        if hit is not None:
+            self._export(hits=1)
+            return hit
+
+        part = loader(file_path, missing) if missing is not None else None
+        complete = part is None
+        if part is None:
+            part = loader(file_path, None)
+            assert part is not None
+
+        evicted = 0
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not complete:
+                df = _merge(entry[0], part)
+                complete = entry[2]
+            else:
+                df = part
+            size = int(df.memory_usage(deep=True).sum())
+            if size <= self.max_bytes:
+                # Drop frames of older versions of the same file
+                self._discard(lambda k: k[0] == key[0])
+                self._entries[key] = (df, size, complete)
+                self.current_bytes += size
+                evicted = self._evict()
+        self._export(misses=1, evictions=evicted)
+        return df
+
+    def peek(self, file_path: str) -> "Optional[pd.DataFrame]":
+        """
+        Returns the cached whole-file frame of a file without loading or
+        counting it.
+
+        Args:
+            file_path (str): The path to the CSV file.
+
+        Returns:
+            Optional[pd.DataFrame]: The cached frame, or None if the file is
+                                    absent or only some of its columns are
+                                    cached.
+        """
+        try:
+            key = _make_key(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None and entry[2] else None
+
+    def invalidate(self, file_path: str) -> None:
+        """
+        Removes every cached version of a file.
+
+        Args:
+            file_path (str): The path to the CSV file.
+        """
+        path = _normalize(file_path)
+        with self._lock:
+            self._discard(lambda k: k[0] == path)
+        self._export()
+
+    def invalidate_dir(self, dir_path: str) -> None:
+        """
+        Removes all cached files located under a directory.
+
+        Args:
+            dir_path (str): The directory whose files should be dropped.
+        """
+        prefix = _normalize(dir_path) + os.sep
+        with self._lock:
+            self._discard(lambda k: k[0].startswith(prefix))
+        self._export()
+
+    def clear(self) -> None:
+        """
+        Removes all entries and resets the counters. Exported counters keep
+        their totals.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+        self._export()
+
+    def resize(self, max_bytes: int) -> None:
+        """
+        Changes the memory budget, evicting frames that no longer fit.
+
+        Args:
+            max_bytes (int): The memory budget for cached frames in bytes.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            evicted = self._evict()
+        self._export(evictions=evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            Dict[str, Any]: Hits, misses, evictions, entry count and memory
+                            usage.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _discard(self, predicate: Callable[[CacheKey], bool]) -> None:
+        """
+        Removes the entries whose keys match a predicate. The lock must be
+        held by the caller.
+
+        Args:
+            predicate (Callable[[CacheKey], bool]): Selects keys to drop.
+        """
+        for key in [k for k in self._entries if predicate(k)]:
+            _, size, _ = self._entries.pop(key)
+            self.current_bytes -= size
+
+    def _evict(self) -> int:
+        """
+        Drops least recently used entries until the budget is respected.
+        The lock must be held by the caller.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        evicted = 0
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def _export(
+        self, hits: int = 0, misses: int = 0, evictions: int = 0
+    ) -> None:
+        """
+        Adds to the exported counters and, unless only hits changed,
+        updates the exported memory usage. The lock must not be held.
+
+        Args:
+            hits (int): The number of new hits.
+            misses (int): The number of new misses.
+            evictions (int): The number of new evictions.
+        """
+        if not self.export_metrics:
+            return
+        for name, count in (
+            ("hits", hits),
+            ("misses", misses),
+            ("evictions", evictions),
+        ):
+            if count:
+                inc(f"csvviz_dataframe_cache_{name}_total", count)
+        if hits and not (misses or evictions):
+            return
+        with self._lock:
+            entries, current_bytes = len(self._entries), self.current_bytes
+        set_gauge("csvviz_dataframe_cache_bytes", current_bytes)
+        set_gauge("csvviz_dataframe_cache_entries", entries)
+
+
+def _normalize(file_path: str) -> str:
+    """
+    Normalizes a path so that equivalent paths share a cache key.
+
+    Args:
+        file_path (str): The path to normalize.
+
+    Returns:
+        str: The absolute, normalized path.
+    """
+    return os.path.normpath(os.path.abspath(file_path))
+
+
+def _make_key(file_path: str) -> CacheKey:
+    """
+    Builds the cache key of a file from its path, mtime and size.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        CacheKey: The (path, mtime_ns, size) tuple.
+    """
+    stat = Path(file_path).stat()
+    return _normalize(file_path), stat.st_mtime_ns, stat.st_size
+
+
+def _missing_columns(
+    entry: "Optional[Tuple[pd.DataFrame, int, bool]]",
+    columns: Optional[List[str]],
+) -> Optional[List[str]]:
+    """
+    Lists the requested columns that a cache entry lacks.
+
+    Args:
+        entry (Optional[Tuple[pd.DataFrame, int, bool]]): The cached frame,
+            its size and whether it holds the whole file, if any.
+        columns (Optional[List[str]]): The requested columns, or None for
+                                       the whole file.
+
+    Returns:
+        Optional[List[str]]: The missing columns, empty if the entry has
+                             them all, or None if the whole file is needed.
+    """
+    if entry is not None and entry[2]:
+        return []
+    if columns is None:
+        return None
+    if entry is None:
+        return list(dict.fromkeys(columns))
+    cached = set(entry[0].columns)
+    return [
+        column for column in dict.fromkeys(columns) if column not in cached
+    ]
+
+
+def _merge(cached: "pd.DataFrame", part: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Adds newly loaded columns of a file to its cached columns.
+
+    Args:
+        cached (pd.DataFrame): The columns already cached.
+        part (pd.DataFrame): The newly loaded columns, with the same rows.
+
+    Returns:
+        pd.DataFrame: A frame holding the columns of both.
+    """
+    import pandas as pd
+
+    new_columns = [column for column in part.columns if column not in cached]
+    if not new_columns:
+        return cached
+    return pd.concat([cached, part[new_columns]], axis=1)
+
+
+_dataframe_cache = DataFrameCache(export_metrics=True)
+
+
+def setup_dataframe_cache() -> None:
+    """
+    Applies the configured memory budget to the process-wide cache.
+    """
+    budget = current_app.config.get(
+        "DATAFRAME_CACHE_MAX_BYTES", DEFAULT_DATAFRAME_CACHE_MAX_BYTES
+    )
+    _dataframe_cache.resize(int(budget))
+
+
+def get_dataframe_cache() -> DataFrameCache:
+    """
+    Returns the process-wide DataFrame cache.
+
+    Returns:
+        DataFrameCache: The shared cache instance.
+    """
+    return _dataframe_cache
+
+
+def load_columns(file_path: str, columns: List[str]) -> "pd.DataFrame":
+    """
+    Returns selected columns of a CSV file, using the shared cache. Columns
+    are read from the columnar sidecar when available; otherwise the whole
+    file is parsed once and every later selection is served from it.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        columns (List[str]): The names of the columns to load.
+
+    Returns:
+        pd.DataFrame: A frame holding at least the requested columns.
+                      Callers must not modify it.
+    """
+
+    import pandas as pd
+
+    from app.services.columnar_service import read_columns
+
+    def loader(
+        path: str, selection: Optional[List[str]]
+    ) -> Optional[pd.DataFrame]:
+        if selection is None:
+            return pd.read_csv(path)
+        return read_columns(path, selection)
+
+    return _dataframe_cache.get(file_path, loader, columns)
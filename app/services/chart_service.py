@@ -2,110 +2,709 @@
 Contains the business logic for chart generation.
 """
 
+import hashlib
+import json
 import os
+import threading
+import uuid
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import matplotlib
+import numpy as np
+import pandas as pd
+from flask import current_app
 
-matplotlib.use("Agg")  # Use non-interactive backend
-import matplotlib.pyplot as plt  # noqa: E402
-import pandas as pd  # noqa: E402
-from flask import current_app  # noqa: E402
+from app.services.aggregation_service import (
+    AGGREGATIONS,
+    aggregate,
+    aggregated_label,
+    resolve_aggregation,
+)
+from app.services.cache_service import load_columns
+from app.services.cleanup_service import KIND_CHART, record_access
+from app.services.datetime_service import (
+    TIME_BUCKETS,
+    bucket_times,
+    bucketed_label,
+    detect_datetime_format,
+    parse_datetimes,
+)
+from app.services.downsampling_service import (
+    DEFAULT_BAR_LIMIT,
+    DEFAULT_POINT_BUDGET,
+    DownsampledSeries,
+    downsample,
+)
+from app.services.file_service import get_csv_headers, get_file_hash
+from app.services.logging_service import log_event
+from app.services.metrics_service import (
+    StageClock,
+    inc,
+    observe,
+    observe_stage,
+)
+from app.services.profile_service import get_column_profile, read_profile
+from app.services.render_service import (
+    DEFAULT_DPI,
+    DEFAULT_RENDER_TIMEOUT,
+    RenderCancelledError,
+    RenderTimeoutError,
+    get_render_pool,
+    render_chart,
+)
+
+# Bump whenever a change alters the rendered output for the same inputs
+RENDERER_VERSION = "4"
+DEFAULT_CHART_MAX_DPI = 300
+MIN_DPI = 50
+
+# File extension of each output format; 'png8' is a palette PNG
+OUTPUT_FORMATS = {"png": "png", "png8": "png", "svg": "svg", "webp": "webp"}
+THUMBNAIL_SUFFIX = ".thumb.png"
 
 
 def create_chart(
-    file_path: str, x_axis: str, y_axis: str, chart_type: str
+    file_path: str,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+    display_name: Optional[str] = None,
+    output_format: str = "png",
+    dpi: Optional[int] = None,
+    aggregation: Optional[str] = None,
+    time_bucket: Optional[str] = None,
+    progress: Optional[Callable[[str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    frame: Optional[pd.DataFrame] = None,
 ) -> tuple[str | None, str | None]:
     """
-    Generates a chart from a CSV file and saves it as a PNG image.
+    Generates a chart from a CSV file and saves it as an image, along with
+    a small PNG thumbnail for previews. Only the selected columns are
+    loaded when the columnar sidecar is present, and large series are
+    downsampled to the configured point budget. Several Y columns are drawn
+    as series of one chart, with a legend.
+
+    Charts are content-addressed: the filename is derived from the file's
+    contents and the chart settings, so an identical request made from any
+    session reuses the already rendered image.
 
     Args:
         file_path (str): The path to the CSV file.
         x_axis (str): The column to use for the X-axis.
-        y_axis (str): The column to use for the Y-axis.
+        y_axis (str | List[str]): The column, or columns, to use for the
+                                  Y-axis.
         chart_type (str): The type of chart to generate ('bar', 'line',
                           'scatter').
+        display_name (Optional[str]): The file name shown in the title and
+            used for downloads; defaults to the name of the file on disk.
+        output_format (str): The image format, one of OUTPUT_FORMATS.
+        dpi (Optional[int]): The image resolution; defaults to
+                             CHART_DEFAULT_DPI.
+        aggregation (Optional[str]): How rows sharing an X value are
+            combined, one of AGGREGATIONS; 'none' or None plots every row.
+        time_bucket (Optional[str]): The period dates on the X-axis are
+            grouped by, one of TIME_BUCKETS; rows in a period are averaged
+            unless another aggregation is given.
+        progress (Optional[Callable[[str], None]]): Called with the name of
+            each stage ('parsing', 'cleaning', 'plotting', 'encoding') as it
+            starts.
+        cancel_event (Optional[threading.Event]): When set, generation
+                                                  stops at the next stage.
+        frame (Optional[pd.DataFrame]): Already loaded columns of the file,
+            including the selected ones, used instead of loading them.
 
     Returns:
         tuple[str | None, str | None]: A tuple of (filename,
             error_message). Returns (filename, None) on success,
             (None, error_message) on failure.
     """
+    clock = StageClock()
     try:
-        df = pd.read_csv(file_path)
+        if output_format not in OUTPUT_FORMATS:
+            return None, f"Invalid output format: {output_format}"
+        dpi = dpi or current_app.config.get("CHART_DEFAULT_DPI", DEFAULT_DPI)
+        max_dpi = current_app.config.get(
+            "CHART_MAX_DPI", DEFAULT_CHART_MAX_DPI
+        )
+        if not MIN_DPI <= dpi <= max_dpi:
+            return None, f"DPI must be between {MIN_DPI} and {max_dpi}."
+        time_bucket = time_bucket or "none"
+        if time_bucket not in TIME_BUCKETS:
+            return None, f"Invalid time bucket: {time_bucket}"
+        aggregation = resolve_aggregation(aggregation, time_bucket)
+        if aggregation not in AGGREGATIONS:
+            return None, f"Invalid aggregation: {aggregation}"
 
-        # Check if file is empty
-        if df.empty:
-            return None, "The CSV file is empty."
+        y_axes = _as_columns(y_axis)
+        if not y_axes:
+            return None, "Select at least one column for the Y-axis."
 
-        # Ensure the selected columns exist
-        if x_axis not in df.columns:
-            return (
-                None,
-                f"Column '{x_axis}' not found in the CSV file.",
-            )
-        if y_axis not in df.columns:
+        display_name = display_name or os.path.basename(file_path)
+        title = f"Chart from {display_name}"
+        charts_dir = Path(current_app.instance_path) / "charts"
+        chart_key = _chart_key(
+            file_path,
+            x_axis,
+            y_axes,
+            chart_type,
+            title,
+            output_format,
+            dpi,
+            aggregation,
+            time_bucket,
+        )
+        extension = OUTPUT_FORMATS[output_format]
+        chart_filename = f"{chart_key}.{extension}"
+        chart_path = charts_dir / chart_filename
+        clock.lap("chart_key")
+
+        if chart_path.exists():
+            record_access(KIND_CHART, chart_key)
+            inc("csvviz_chart_cache_hits_total", chart_type=chart_type)
+            log_event("chart_cache_hit", chart=chart_filename)
+            return chart_filename, None
+        inc("csvviz_chart_cache_misses_total", chart_type=chart_type)
+        log_event("chart_cache_miss", chart=chart_filename)
+
+        series, error = prepare_series(
+            file_path,
+            x_axis,
+            y_axes,
+            chart_type,
+            aggregation,
+            time_bucket,
+            clock,
+            progress,
+            cancel_event,
+            frame,
+        )
+        if series is None:
+            return None, error
+
+        # Save the chart to the instance/charts directory. The image is
+        # written under a temporary name so that concurrent requests never
+        # serve a partially written file.
+        os.makedirs(charts_dir, exist_ok=True)
+        tmp_id = uuid.uuid4().hex
+        tmp_path = charts_dir / f"{chart_key}.{tmp_id}.tmp"
+        tmp_thumbnail_path = charts_dir / f"{chart_key}.{tmp_id}.thumb.tmp"
+        series_labels = [
+            aggregated_label(column, aggregation) for column in y_axes
+        ]
+        spec = {
+            "x": series.x,
+            "y": series.y,
+            "max_pos": series.max_pos,
+            "chart_type": chart_type,
+            "x_label": bucketed_label(x_axis, time_bucket),
+            "y_label": ", ".join(series_labels),
+            "series_labels": series_labels if len(y_axes) > 1 else None,
+            "title": title,
+            "output_path": str(tmp_path),
+            "format": output_format,
+            "dpi": dpi,
+            "thumbnail_path": str(tmp_thumbnail_path),
+        }
+        try:
+            _report_stage("plotting", progress, cancel_event)
+            render_timings = _render(spec, progress, cancel_event)
+        except (RenderTimeoutError, RenderCancelledError) as e:
+            _remove_file(tmp_path)
+            _remove_file(tmp_thumbnail_path)
+            return None, f"Could not generate chart: {str(e)}"
+        except Exception:
+            _remove_file(tmp_path)
+            _remove_file(tmp_thumbnail_path)
+            raise
+        for stage, seconds in render_timings.items():
+            observe_stage(stage, seconds)
+        render_seconds = clock.lap("render")
+
+        output_bytes = os.path.getsize(tmp_path)
+        observe(
+            "csvviz_chart_encode_seconds",
+            render_timings["encode"],
+            format=output_format,
+        )
+        inc(
+            "csvviz_chart_output_bytes_total",
+            output_bytes,
+            format=output_format,
+        )
+        thumbnail_filename = f"{chart_key}{THUMBNAIL_SUFFIX}"
+        thumbnail_bytes = os.path.getsize(tmp_thumbnail_path)
+        _write_chart_info(
+            chart_key,
+            {
+                "decimated": series.decimated,
+                "method": series.method,
+                "original_points": series.original_points,
+                "plotted_points": len(series.y),
+                "format": output_format,
+                "dpi": dpi,
+                "aggregation": aggregation,
+                "time_bucket": time_bucket,
+                "bytes": output_bytes,
+                "encode_seconds": round(render_timings["encode"], 4),
+                "thumbnail": thumbnail_filename,
+                "thumbnail_bytes": thumbnail_bytes,
+                "download_name": (
+                    f"{Path(display_name).stem}_{chart_type}.{extension}"
+                ),
+            },
+        )
+        # The thumbnail is put in place first so that it exists whenever
+        # the chart does
+        os.replace(tmp_thumbnail_path, charts_dir / thumbnail_filename)
+        os.replace(tmp_path, chart_path)
+        record_access(KIND_CHART, chart_key, output_bytes + thumbnail_bytes)
+        clock.total("chart_total")
+        inc("csvviz_chart_renders_total", chart_type=chart_type)
+        inc(
+            "csvviz_chart_rows_plotted_total",
+            len(series.y),
+            chart_type=chart_type,
+        )
+        log_event(
+            "chart_rendered",
+            chart=chart_filename,
+            chart_type=chart_type,
+            format=output_format,
+            dpi=dpi,
+            bytes=output_bytes,
+            file_size=os.path.getsize(file_path),
+            original_points=series.original_points,
+            plotted_points=len(series.y),
+            render_seconds=round(render_seconds, 4),
+        )
+        return chart_filename, None
+    except Exception as e:
+        return None, describe_chart_error(e)
+
+
+def prepare_series(
+    file_path: str,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+    aggregation: Optional[str] = None,
+    time_bucket: Optional[str] = None,
+    clock: Optional[StageClock] = None,
+    progress: Optional[Callable[[str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    frame: Optional[pd.DataFrame] = None,
+) -> Tuple[Optional[DownsampledSeries], Optional[str]]:
+    """
+    Loads, validates, cleans, aggregates and downsamples the selected
+    columns of a CSV file, producing the points a chart of the given type
+    shows. X columns holding dates, according to the upload profile or a
+    check of their first values, are parsed into datetimes. Several Y
+    columns are read in the same pass and kept aligned, as the columns of
+    a 2D y.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        x_axis (str): The column to use for the X-axis.
+        y_axis (str | List[str]): The column, or columns, to use for the
+                                  Y-axis.
+        chart_type (str): The type of chart ('bar', 'line', 'scatter').
+        aggregation (Optional[str]): How rows sharing an X value are
+            combined, one of AGGREGATIONS; 'none' or None keeps every row.
+        time_bucket (Optional[str]): The period dates on the X-axis are
+            grouped by, one of TIME_BUCKETS.
+        clock (Optional[StageClock]): Records the parse, clean, aggregate
+                                      and downsample stages when given.
+        progress (Optional[Callable[[str], None]]): Called with the name of
+            each stage ('parsing', 'cleaning') as it starts.
+        cancel_event (Optional[threading.Event]): When set, preparation
+                                                  stops at the next stage.
+        frame (Optional[pd.DataFrame]): Already loaded columns of the file,
+            including the selected ones, used instead of loading them.
+
+    Returns:
+        Tuple[Optional[DownsampledSeries], Optional[str]]: The series and
+            None on success, or None and an error message.
+
+    Raises:
+        Exception: Errors reading the file are passed on; see
+                   describe_chart_error.
+    """
+    if chart_type not in ("bar", "line", "scatter"):
+        return None, f"Invalid chart type: {chart_type}"
+    time_bucket = time_bucket or "none"
+    if time_bucket not in TIME_BUCKETS:
+        return None, f"Invalid time bucket: {time_bucket}"
+    aggregation = resolve_aggregation(aggregation, time_bucket)
+    if aggregation not in AGGREGATIONS:
+        return None, f"Invalid aggregation: {aggregation}"
+    y_axes = _as_columns(y_axis)
+    if not y_axes:
+        return None, "Select at least one column for the Y-axis."
+    clock = clock or StageClock()
+    _report_stage("parsing", progress, cancel_event)
+
+    # Validate the request against the upload profile when available,
+    # so that bad selections are rejected without reading any data
+    profile = read_profile(file_path)
+    x_profile: Optional[Dict[str, Any]] = None
+    if profile is not None:
+        error = _validate_with_profile(profile, x_axis, y_axes)
+        if error:
+            return None, error
+        x_profile = get_column_profile(profile, x_axis)
+
+    # Ensure the selected columns exist
+    headers = get_csv_headers(file_path) if profile is None else []
+    if headers:
+        for column in [x_axis, *y_axes]:
+            if column not in headers:
+                return (
+                    None,
+                    f"Column '{column}' not found in the CSV file.",
+                )
+
+    df = (
+        frame
+        if frame is not None
+        else load_columns(file_path, [x_axis, *y_axes])
+    )
+    clock.lap("parse")
+
+    # Check if file is empty
+    if df.empty:
+        return None, "The CSV file is empty."
+
+    # Check if the Y-axis columns contain numeric data
+    for column in y_axes:
+        if not pd.api.types.is_numeric_dtype(df[column]):
             return (
                 None,
-                f"Column '{y_axis}' not found in the CSV file.",
+                f"Column '{column}' must contain numeric data for charting.",
             )
 
-        # Check if Y-axis contains numeric data
-        if not pd.api.types.is_numeric_dtype(df[y_axis]):
+    _report_stage("cleaning", progress, cancel_event)
+
+    # Remove rows with missing or infinite values in selected columns;
+    # infinities cannot be drawn and are not valid JSON
+    numeric = [
+        column
+        for column in dict.fromkeys([x_axis, *y_axes])
+        if pd.api.types.is_numeric_dtype(df[column])
+    ]
+    finite = np.isfinite(
+        df[numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+    ).all(axis=1)
+    df_clean = df.loc[finite, [x_axis, *y_axes]].dropna()
+    clock.lap("clean")
+    if df_clean.empty:
+        return None, "No valid data found after removing missing values."
+
+    x = df_clean[x_axis].to_numpy()
+    y = df_clean[y_axes[0] if len(y_axes) == 1 else y_axes].to_numpy()
+
+    # Profiles written before date detection existed lack the format
+    if x_profile is not None and "datetime_format" in x_profile:
+        datetime_format = x_profile["datetime_format"]
+    else:
+        datetime_format = detect_datetime_format(df_clean[x_axis])
+    if datetime_format is not None:
+        # Dates drawn as text get one tick label per distinct value, which
+        # is slow and unreadable
+        x = parse_datetimes(df_clean[x_axis], datetime_format)
+        valid = ~np.isnat(x)
+        x, y = x[valid], y[valid]
+        clock.lap("parse_dates")
+        if len(y) == 0:
+            return None, "No valid data found after removing missing values."
+
+    is_datetime = np.issubdtype(x.dtype, np.datetime64)
+    if time_bucket != "none":
+        if not is_datetime:
             return (
                 None,
-                f"Column '{y_axis}' must contain numeric data for charting.",
+                f"Column '{x_axis}' must contain dates to group it by "
+                f"{time_bucket}.",
             )
+        x = bucket_times(x, time_bucket)
+    if aggregation != "none":
+        # Repeated categories become one point each, so the number of bars
+        # follows the number of categories rather than rows; periods are
+        # kept in time order
+        x, y = aggregate(x, y, aggregation, sort=is_datetime)
+        clock.lap("aggregate")
 
-        # Remove rows with NaN values in selected columns
-        df_clean = df[[x_axis, y_axis]].dropna()
-        if df_clean.empty:
-            return None, "No valid data found after removing missing values."
+    series = downsample(
+        x,
+        y,
+        chart_type,
+        point_budget=current_app.config.get(
+            "CHART_POINT_BUDGET", DEFAULT_POINT_BUDGET
+        ),
+        bar_limit=current_app.config.get("CHART_BAR_LIMIT", DEFAULT_BAR_LIMIT),
+        # Sums and counts fold into "Other" as a total; the other
+        # aggregations combine the same way they were computed
+        other=aggregation if aggregation in ("mean", "min", "max") else "sum",
+    )
 
-        plt.figure(figsize=(10, 6))
-
-        # Highlight the max value
-        max_val_index = df_clean[y_axis].idxmax()
-        colors = ["grey"] * len(df_clean)
-        colors[list(df_clean.index).index(max_val_index)] = "red"
-
-        if chart_type == "bar":
-            plt.bar(df_clean[x_axis], df_clean[y_axis], color=colors)
-        elif chart_type == "line":
-            plt.plot(df_clean[x_axis], df_clean[y_axis], color="grey")
-            plt.scatter(
-                df_clean[x_axis].iloc[
-                    list(df_clean.index).index(max_val_index)
-                ],
-                df_clean[y_axis].iloc[
-                    list(df_clean.index).index(max_val_index)
-                ],
-                color="red",
-                zorder=5,
-            )
-        elif chart_type == "scatter":
-            plt.scatter(df_clean[x_axis], df_clean[y_axis], color=colors)
-        else:
-            return None, f"Invalid chart type: {chart_type}"
-
-        plt.xlabel(x_axis)
-        plt.ylabel(y_axis)
-        plt.title(f"Chart from {os.path.basename(file_path)}")
-        plt.grid(True)
-        plt.tight_layout()
-
-        # Save the chart to the instance/charts directory
+    clock.lap("downsample")
+    return series, None
+
+
+def describe_chart_error(error: Exception) -> str:
+    """
+    Turns an error raised while preparing or rendering a chart into a
+    message for the user.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        str: The message.
+    """
+    if isinstance(error, pd.errors.EmptyDataError):
+        return "The CSV file is empty or invalid."
+    if isinstance(error, ValueError):
+        return f"Data error: {str(error)}"
+    return f"Could not generate chart: {str(error)}"
+
+
+def get_chart_info(chart_filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads the metadata recorded alongside a generated chart.
+
+    Args:
+        chart_filename (str): The filename of the chart image or of its
+                              thumbnail.
+
+    Returns:
+        Optional[Dict[str, Any]]: The chart metadata, or None if it is
+                                  unavailable.
+    """
+    charts_dir = Path(current_app.instance_path) / "charts"
+    info_path = charts_dir / f"{get_chart_key(chart_filename)}.json"
+    try:
+        with open(info_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_chart_key(chart_filename: str) -> str:
+    """
+    Returns the key shared by a chart's image, thumbnail and metadata
+    files.
+
+    Args:
+        chart_filename (str): The filename of any of the chart's files.
+
+    Returns:
+        str: The chart key.
+    """
+    return os.path.basename(chart_filename).split(".", 1)[0]
+
+
+def _write_chart_info(chart_key: str, info: Dict[str, Any]) -> None:
+    """
+    Stores metadata about a generated chart in a JSON file next to it.
+
+    Args:
+        chart_key (str): The chart key.
+        info (Dict[str, Any]): The metadata to store.
+    """
+    charts_dir = Path(current_app.instance_path) / "charts"
+    try:
+        with open(
+            charts_dir / f"{chart_key}.json", "w", encoding="utf-8"
+        ) as f:
+            json.dump(info, f)
+    except OSError:
+        pass
+
+
+def _chart_key(
+    file_path: str,
+    x_axis: str,
+    y_axes: List[str],
+    chart_type: str,
+    title: str,
+    output_format: str,
+    dpi: int,
+    aggregation: str,
+    time_bucket: str,
+) -> str:
+    """
+    Derives the content address of a chart from everything that affects
+    its rendered output.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        x_axis (str): The column used for the X-axis.
+        y_axes (List[str]): The columns used for the Y-axis.
+        chart_type (str): The type of chart.
+        title (str): The chart title.
+        output_format (str): The image format.
+        dpi (int): The image resolution.
+        aggregation (str): How rows sharing an X value are combined.
+        time_bucket (str): The period dates on the X-axis are grouped by.
+
+    Returns:
+        str: The hexadecimal chart key.
+    """
+    parts = [
+        RENDERER_VERSION,
+        get_file_hash(file_path),
+        x_axis,
+        y_axes,
+        chart_type,
+        title,
+        output_format,
+        str(dpi),
+        aggregation,
+        time_bucket,
+        str(
+            current_app.config.get("CHART_POINT_BUDGET", DEFAULT_POINT_BUDGET)
+        ),
+        str(current_app.config.get("CHART_BAR_LIMIT", DEFAULT_BAR_LIMIT)),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def _validate_with_profile(
+    profile: Dict[str, Any], x_axis: str, y_axes: List[str]
+) -> Optional[str]:
+    """
+    Checks a chart request against the column profile of its file.
+
+    Args:
+        profile (Dict[str, Any]): The file profile.
+        x_axis (str): The column to use for the X-axis.
+        y_axes (List[str]): The columns to use for the Y-axis.
+
+    Returns:
+        Optional[str]: An error message, or None if the request is valid.
+    """
+    if profile["row_count"] == 0:
+        return "The CSV file is empty."
+    if get_column_profile(profile, x_axis) is None:
+        return f"Column '{x_axis}' not found in the CSV file."
+    for y_axis in y_axes:
+        y_profile = get_column_profile(profile, y_axis)
+        if y_profile is None:
+            return f"Column '{y_axis}' not found in the CSV file."
+        if not y_profile["numeric"]:
+            return f"Column '{y_axis}' must contain numeric data for charting."
+        if y_profile["null_count"] == profile["row_count"]:
+            return "No valid data found after removing missing values."
+    return None
+
+
+def _as_columns(y_axis: str | List[str]) -> List[str]:
+    """
+    Normalizes a Y-axis selection to a list of distinct columns.
+
+    Args:
+        y_axis (str | List[str]): One column or several.
+
+    Returns:
+        List[str]: The columns in the order given.
+    """
+    columns = [y_axis] if isinstance(y_axis, str) else y_axis
+    return list(dict.fromkeys(column for column in columns if column))
+
+
+def _report_stage(
+    stage: str,
+    progress: Optional[Callable[[str], None]],
+    cancel_event: Optional[threading.Event],
+) -> None:
+    """
+    Reports the start of a generation stage and honours cancellation.
+
+    Args:
+        stage (str): The name of the stage that is starting.
+        progress (Optional[Callable[[str], None]]): The progress callback.
+        cancel_event (Optional[threading.Event]): The cancellation flag.
+
+    Raises:
+        RenderCancelledError: If generation has been cancelled.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise RenderCancelledError("The render was cancelled.")
+    if progress is not None:
+        progress(stage)
+
+
+def _render(
+    spec: Dict[str, Any],
+    progress: Optional[Callable[[str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, float]:
+    """
+    Renders a chart in the worker pool, or in the current thread when the
+    pool is disabled. Pool workers cannot report progress, so the encoding
+    stage is only reported for in-process renders.
+
+    Args:
+        spec (Dict[str, Any]): The chart description passed to render_chart.
+        progress (Optional[Callable[[str], None]]): The progress callback.
+        cancel_event (Optional[threading.Event]): The cancellation flag.
+
+    Returns:
+        Dict[str, float]: The drawing, layout and encoding times.
+    """
+    pool = get_render_pool()
+    if pool is None:
+        return render_chart(
+            spec,
+            on_encode=lambda: _report_stage(
+                "encoding", progress, cancel_event
+            ),
+        )
+    return pool.render(
+        spec,
+        timeout=current_app.config.get(
+            "CHART_RENDER_TIMEOUT", DEFAULT_RENDER_TIMEOUT
+        ),
+        cancel_event=cancel_event,
+    )
+
+
+def remove_chart(chart_filename: str) -> None:
+    """
+    Deletes a cached chart with its thumbnail and metadata file.
+
+    Args:
+        chart_filename (str): The chart key or the filename of any of the
+                              chart's files.
+    """
+    chart_key = get_chart_key(chart_filename)
+    if chart_key:
         charts_dir = Path(current_app.instance_path) / "charts"
-        os.makedirs(charts_dir, exist_ok=True)
-        chart_filename = f"{Path(file_path).stem}_{chart_type}.png"
-        chart_path = charts_dir / chart_filename
-        plt.savefig(chart_path)
-        plt.close()
+        _remove_chart(charts_dir, chart_key)
 
-        return chart_filename, None
-    except pd.errors.EmptyDataError:
-        return None, "The CSV file is empty or invalid."
-    except ValueError as e:
-        return None, f"Data error: {str(e)}"
-    except Exception as e:
-        return None, f"Could not generate chart: {str(e)}"
+
+def _remove_chart(charts_dir: Path, chart_key: str) -> None:
+    """
+    Deletes a cached chart with its thumbnail and metadata file. Files of
+    renders still in progress are left alone.
+
+    Args:
+        charts_dir (Path): The chart cache directory.
+        chart_key (str): The chart key.
+    """
+    for path in charts_dir.glob(f"{chart_key}.*"):
+        if path.suffix != ".tmp":
+            _remove_file(path)
+
+
+def _remove_file(path: Path) -> None:
+    """
+    Deletes a file, ignoring files that no longer exist.
+
+    Args:
+        path (Path): The path to the file.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,48 +1,514 @@
 """
-Handles cleanup of orphaned session directories and charts.
+Expires idle sessions and charts in the background using an index of
+their last access times, and keeps the chart cache within its size budget.
 """
 
-import os
+import atexit
+import multiprocessing
+import sqlite3
+import threading
 import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-from flask import current_app
+from flask import Flask, current_app, session
 
+from app.services.blob_service import release_session_blobs
+from app.services.metrics_service import inc, set_gauge
+from app.services.sqlite_service import Transaction, connect
+from app.services.upload_service import sweep_incoming_uploads
 
-def cleanup_expired_sessions(max_age_hours: int = 24) -> None:
+KIND_SESSION = "session"
+KIND_CHART = "chart"
+KIND_BATCH = "batch"
+
+DEFAULT_SESSION_MAX_AGE_HOURS = 24
+DEFAULT_CHART_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CHART_CACHE_MAX_AGE_HOURS = 24
+DEFAULT_CLEANUP_INTERVAL_SECONDS = 300
+DEFAULT_CLEANUP_BATCH_SIZE = 100
+
+# Upper bound on the batches deleted by one pass, so that a large backlog
+# is worked off over several passes
+MAX_BATCHES_PER_PASS = 50
+
+# Minimum time between index updates for the same item, in seconds
+ACCESS_RECORD_INTERVAL = 60
+
+_recent_access: Dict[Tuple[str, str, str], float] = {}
+_recent_access_lock = threading.Lock()
+
+
+def record_access(kind: str, key: str, size: Optional[int] = None) -> None:
     """
-    Removes session directories and charts that are older than the specified
-    age.
+    Marks an item as used now so that it is not expired. Repeated calls for
+    the same item are only written once per ACCESS_RECORD_INTERVAL, unless
+    they record its size.
 
     Args:
-        max_age_hours (int): Maximum age in hours before a session is
-                             considered expired. Default is 24 hours.
+        kind (str): The kind of item, KIND_SESSION, KIND_CHART or
+                    KIND_BATCH.
+        key (str): The session storage id, chart filename or batch id.
+        size (Optional[int]): The size of the item in bytes, which counts
+                              towards the chart cache budget; the recorded
+                              size is kept when omitted.
+    """
+    db_path = _get_db_path()
+    now = time.time()
+    cache_key = (str(db_path), kind, key)
+    with _recent_access_lock:
+        recently = now - _recent_access.get(cache_key, 0)
+        if size is None and recently < ACCESS_RECORD_INTERVAL:
+            return
+        _recent_access[cache_key] = now
+        if len(_recent_access) > 10000:
+            cutoff = now - ACCESS_RECORD_INTERVAL
+            for stale in [k for k, t in _recent_access.items() if t < cutoff]:
+                del _recent_access[stale]
+
+    with _connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO expiry (kind, key, accessed_at, size)"
+            " VALUES (?, ?, ?, COALESCE(?, 0))"
+            " ON CONFLICT(kind, key) DO UPDATE SET"
+            " accessed_at = excluded.accessed_at,"
+            " size = COALESCE(?, expiry.size)",
+            (kind, key, now, size, size),
+        )
+
+
+def record_session_access() -> None:
+    """
+    Marks the current user's uploads as used. Registered to run before each
+    request.
+    """
+    session_dir_id = session.get("session_dir_id")
+    if session_dir_id:
+        record_access(KIND_SESSION, str(session_dir_id))
+
+
+def run_cleanup_pass(
+    batch_size: int = DEFAULT_CLEANUP_BATCH_SIZE,
+) -> Dict[str, int]:
     """
-    max_age_seconds = max_age_hours * 3600
-    current_time = time.time()
+    Deletes expired sessions, charts and chart batch manifests in batches,
+    oldest first, then the least recently used charts until the chart cache
+    fits within its size budget. Expired sessions release their uploads,
+    which are deleted once no other session refers to them. Temporary files
+    left by interrupted uploads are deleted too.
+
+    Args:
+        batch_size (int): The number of items deleted per batch.
+
+    Returns:
+        Dict[str, int]: The number of items reclaimed per kind.
+    """
+    now = time.time()
+    session_max_age = (
+        current_app.config.get(
+            "SESSION_MAX_AGE_HOURS", DEFAULT_SESSION_MAX_AGE_HOURS
+        )
+        * 3600
+    )
+    chart_max_age = (
+        current_app.config.get(
+            "CHART_CACHE_MAX_AGE_HOURS", DEFAULT_CHART_CACHE_MAX_AGE_HOURS
+        )
+        * 3600
+    )
+    cutoffs = {
+        KIND_SESSION: now - session_max_age,
+        KIND_CHART: now - chart_max_age,
+        KIND_BATCH: now - chart_max_age,
+    }
+
+    reclaimed = {
+        KIND_SESSION: 0,
+        KIND_CHART: 0,
+        KIND_BATCH: 0,
+        "stored_sessions": 0,
+        "incoming_uploads": 0,
+    }
+    db_path = _get_db_path()
+    for kind, cutoff in cutoffs.items():
+        for _ in range(MAX_BATCHES_PER_PASS):
+            keys = _expired_keys(db_path, kind, cutoff, batch_size)
+            for key in keys:
+                _expire(kind, key)
+            _forget(db_path, kind, keys, cutoff)
+            reclaimed[kind] += len(keys)
+            if len(keys) < batch_size:
+                break
+    reclaimed[KIND_CHART] += _evict_charts_over_budget(
+        db_path,
+        current_app.config.get(
+            "CHART_CACHE_MAX_BYTES", DEFAULT_CHART_CACHE_MAX_BYTES
+        ),
+        batch_size,
+    )
+
+    reclaimed["stored_sessions"] = _expire_stored_sessions(
+        now - session_max_age, batch_size
+    )
+    reclaimed["incoming_uploads"] = sweep_incoming_uploads()
+    return reclaimed
+
+
+class CleanupScheduler:
+    """
+    Background thread that runs cleanup passes on a fixed interval.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        interval: float = DEFAULT_CLEANUP_INTERVAL_SECONDS,
+        batch_size: int = DEFAULT_CLEANUP_BATCH_SIZE,
+    ) -> None:
+        """
+        Initializes the scheduler without starting it.
+
+        Args:
+            app (Flask): The application whose instance folder is cleaned.
+            interval (float): The time between passes, in seconds.
+            batch_size (int): The number of items deleted per batch.
+        """
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.passes = 0
+        self.reclaimed: Dict[str, int] = {}
+        self.last_pass_reclaimed: Dict[str, int] = {}
+        self.last_pass_seconds = 0.0
+        self.last_pass_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts the background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="cleanup-scheduler", daemon=True
+        )
+        self._thread.start()
 
-    # Clean up expired upload directories
-    uploads_dir = Path(current_app.instance_path) / "uploads"
-    if uploads_dir.exists():
-        for session_dir in uploads_dir.iterdir():
-            if session_dir.is_dir():
-                dir_age = current_time - session_dir.stat().st_mtime
-                if dir_age > max_age_seconds:
-                    try:
-                        import shutil
+    def stop(self) -> None:
+        """
+        Stops the background thread after its current pass.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
 
-                        shutil.rmtree(session_dir)
-                    except OSError:
-                        pass
+    def run_pass(self) -> Dict[str, int]:
+        """
+        Runs one cleanup pass and records its statistics, which are also
+        exported on /metrics.
+
+        Returns:
+            Dict[str, int]: The number of items reclaimed per kind.
+        """
+        started = time.perf_counter()
+        with self.app.app_context():
+            reclaimed = run_cleanup_pass(self.batch_size)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.passes += 1
+            for kind, count in reclaimed.items():
+                self.reclaimed[kind] = self.reclaimed.get(kind, 0) + count
+            self.last_pass_reclaimed = reclaimed
+            self.last_pass_seconds = elapsed
+            self.last_pass_at = time.time()
+        with self.app.app_context():
+            self._export(reclaimed)
+        self.app.logger.info(
+            "Cleanup pass reclaimed %s in %.3fs", reclaimed, elapsed
+        )
+        return reclaimed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the scheduler's statistics.
+
+        Returns:
+            Dict[str, Any]: The number of passes, the items reclaimed in
+                            total and by the last pass, and when the last
+                            pass ran and how long it took.
+        """
+        with self._lock:
+            return {
+                "passes": self.passes,
+                "reclaimed": dict(self.reclaimed),
+                "last_pass_reclaimed": dict(self.last_pass_reclaimed),
+                "last_pass_seconds": self.last_pass_seconds,
+                "last_pass_at": self.last_pass_at,
+            }
+
+    def _export(self, reclaimed: Dict[str, int]) -> None:
+        """
+        Exports the statistics of the last pass as metrics: running totals
+        as counters and the last pass as gauges.
+
+        Args:
+            reclaimed (Dict[str, int]): The number of items reclaimed per
+                                        kind by the last pass.
+        """
+        stats = self.stats()
+        inc("csvviz_cleanup_passes_total")
+        for kind, count in reclaimed.items():
+            inc("csvviz_cleanup_reclaimed_total", count, kind=kind)
+            set_gauge("csvviz_cleanup_last_pass_reclaimed", count, kind=kind)
+        set_gauge(
+            "csvviz_cleanup_last_pass_seconds", stats["last_pass_seconds"]
+        )
+        set_gauge(
+            "csvviz_cleanup_last_pass_timestamp_seconds", stats["last_pass_at"]
+        )
+
+    def _run(self) -> None:
+        """
+        Runs cleanup passes until the scheduler is stopped. The first pass
+        runs after one interval so that startup is not delayed.
+        """
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_pass()
+            except Exception:
+                self.app.logger.exception("Cleanup pass failed")
+
+
+_scheduler: Optional[CleanupScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def start_cleanup_scheduler(app: Flask) -> Optional[CleanupScheduler]:
+    """
+    Starts the process-wide cleanup scheduler. Nothing is started when the
+    interval is zero or in worker processes spawned by the render pool.
+
+    Args:
+        app (Flask): The application whose instance folder is cleaned.
+
+    Returns:
+        Optional[CleanupScheduler]: The running scheduler, if any.
+    """
+    global _scheduler
+
+    interval = app.config.get(
+        "CLEANUP_INTERVAL_SECONDS", DEFAULT_CLEANUP_INTERVAL_SECONDS
+    )
+    if interval <= 0 or multiprocessing.parent_process() is not None:
+        return None
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CleanupScheduler(
+                app,
+                interval,
+                app.config.get(
+                    "CLEANUP_BATCH_SIZE", DEFAULT_CLEANUP_BATCH_SIZE
+                ),
+            )
+            _scheduler.start()
+            atexit.register(_scheduler.stop)
+        return _scheduler
+
+
+def get_cleanup_scheduler() -> Optional[CleanupScheduler]:
+    """
+    Returns the process-wide cleanup scheduler.
+
+    Returns:
+        Optional[CleanupScheduler]: The scheduler, or None if not running.
+    """
+    return _scheduler
+
+
+def _expired_keys(
+    db_path: Path, kind: str, cutoff: float, limit: int
+) -> List[str]:
+    """
+    Finds the items of a kind that were last used before the cutoff.
 
-    # Clean up expired charts
-    charts_dir = Path(current_app.instance_path) / "charts"
-    if charts_dir.exists():
-        for chart_file in charts_dir.iterdir():
-            if chart_file.is_file():
-                file_age = current_time - chart_file.stat().st_mtime
-                if file_age > max_age_seconds:
-                    try:
-                        os.remove(chart_file)
-                    except OSError:
-                        pass
+    Args:
+        db_path (Path): The path to the index database.
+        kind (str): The kind of item.
+        cutoff (float): The expiry time.
+        limit (int): The maximum number of items returned.
+
+    Returns:
+        List[str]: The keys of the oldest expired items.
+    """
+    with _connect(db_path) as conn:
+        return [
+            row[0]
+            for row in conn.execute(
+                "SELECT key FROM expiry WHERE kind = ? AND accessed_at < ?"
+                " ORDER BY accessed_at LIMIT ?",
+                (kind, cutoff, limit),
+            )
+        ]
+
+
+def _forget(db_path: Path, kind: str, keys: List[str], cutoff: float) -> None:
+    """
+    Removes expired items from the index. Items used again while they were
+    being expired are kept.
+
+    Args:
+        db_path (Path): The path to the index database.
+        kind (str): The kind of item.
+        keys (List[str]): The keys of the expired items.
+        cutoff (float): The expiry time.
+    """
+    with _connect(db_path) as conn:
+        conn.executemany(
+            "DELETE FROM expiry"
+            " WHERE kind = ? AND key = ? AND accessed_at < ?",
+            [(kind, key, cutoff) for key in keys],
+        )
+
+
+def _evict_charts_over_budget(
+    db_path: Path, max_bytes: int, batch_size: int
+) -> int:
+    """
+    Deletes the least recently used charts, in batches, until the chart
+    sizes recorded in the index add up to no more than the budget.
+
+    Args:
+        db_path (Path): The path to the index database.
+        max_bytes (int): The size budget of the chart cache.
+        batch_size (int): The number of charts considered per batch.
+
+    Returns:
+        int: The number of charts deleted.
+    """
+    evicted = 0
+    for _ in range(MAX_BATCHES_PER_PASS):
+        with _connect(db_path) as conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM expiry WHERE kind = ?",
+                (KIND_CHART,),
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT key, size, accessed_at FROM expiry WHERE kind = ?"
+                " ORDER BY accessed_at LIMIT ?",
+                (KIND_CHART, batch_size),
+            ).fetchall()
+
+        victims = []
+        for key, size, accessed_at in rows:
+            if total <= max_bytes:
+                break
+            victims.append((KIND_CHART, key, accessed_at))
+            total -= size
+        if not victims:
+            break
+        for _, key, _ in victims:
+            _expire(KIND_CHART, key)
+        # Charts used again while they were being deleted stay indexed
+        with _connect(db_path) as conn:
+            conn.executemany(
+                "DELETE FROM expiry"
+                " WHERE kind = ? AND key = ? AND accessed_at <= ?",
+                victims,
+            )
+        evicted += len(victims)
+    return evicted
+
+
+def _expire(kind: str, key: str) -> None:
+    """
+    Deletes the data of an expired item.
+
+    Args:
+        kind (str): The kind of item.
+        key (str): The session storage id, chart filename or batch id.
+    """
+    if kind == KIND_SESSION:
+        release_session_blobs(key)
+    elif kind == KIND_CHART:
+        from app.services.chart_service import remove_chart
+
+        remove_chart(key)
+    elif kind == KIND_BATCH:
+        from app.services.batch_service import remove_batch_manifest
+
+        remove_batch_manifest(key)
+
+
+def _expire_stored_sessions(cutoff: float, batch_size: int) -> int:
+    """
+    Deletes server-side session records that were last used before the
+    cutoff.
+
+    Args:
+        cutoff (float): The expiry time.
+        batch_size (int): The number of records deleted per batch.
+
+    Returns:
+        int: The number of records deleted.
+    """
+    from app.services.session_store import ServerSideSessionInterface
+
+    interface = current_app.session_interface
+    if not isinstance(interface, ServerSideSessionInterface):
+        return 0
+
+    store = interface.get_store(current_app)
+    deleted = 0
+    for _ in range(MAX_BATCHES_PER_PASS):
+        count = store.delete_expired(cutoff, batch_size)
+        deleted += count
+        if count < batch_size:
+            break
+    return deleted
+
+
+def _get_db_path() -> Path:
+    """
+    Returns the path of the expiry index of the current application.
+
+    Returns:
+        Path: The path to the index database.
+    """
+    return Path(current_app.instance_path) / "expiry.db"
+
+
+def _connect(db_path: Path) -> Transaction:
+    """
+    Opens the index database in a transaction, creating its table the
+    first time it is used.
+
+    Args:
+        db_path (Path): The path to the index database.
+
+    Returns:
+        Transaction: A context manager yielding the connection.
+    """
+    return connect(db_path, _create_schema)
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Creates the expiry table and its index.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS expiry ("
+        " kind TEXT NOT NULL,"
+        " key TEXT NOT NULL,"
+        " accessed_at REAL NOT NULL,"
+        " size INTEGER NOT NULL DEFAULT 0,"
+        " PRIMARY KEY (kind, key))"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS expiry_accessed_at"
+        " ON expiry (kind, accessed_at)"
+    )
@@ -0,0 +1,207 @@
+"""
+Stores uploaded CSV files as per-column NumPy arrays for fast column reads.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+COLUMNAR_DIR_SUFFIX = ".columns"
+MANIFEST_FILENAME = "manifest.json"
+
+# Version of the sidecar layout; sidecars of other versions are ignored
+SIDECAR_VERSION = 2
+
+
+def get_columnar_dir(csv_path: str) -> Path:
+    """
+    Returns the sidecar directory that holds the columns of a CSV file.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+
+    Returns:
+        Path: The path to the sidecar directory.
+    """
+    path = Path(csv_path)
+    return path.with_name(path.name + COLUMNAR_DIR_SUFFIX)
+
+
+def write_columnar_sidecar(
+    csv_path: str, df: Optional[pd.DataFrame] = None
+) -> bool:
+    """
+    Converts a CSV file into one .npy file per column plus a manifest.
+
+    Numeric and boolean columns are stored as-is. Other columns are stored
+    as their UTF-8 encoded values concatenated in one byte buffer, with the
+    offset of each value and a separate missing-value mask, so that they
+    take as much space as the text itself and can be memory-mapped as well.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+        df (Optional[pd.DataFrame]): The already parsed file, if available.
+
+    Returns:
+        bool: True if the sidecar was written, False otherwise.
+    """
+    target_dir = get_columnar_dir(csv_path)
+    tmp_dir = target_dir.with_name(target_dir.name + ".tmp")
+    try:
+        stat = os.stat(csv_path)
+        if df is None:
+            df = pd.read_csv(csv_path)
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        columns: List[Dict[str, Any]] = []
+        for position, name in enumerate(df.columns):
+            series = df.iloc[:, position]
+            filename = f"col_{position}.npy"
+            entry: Dict[str, Any] = {"name": str(name), "file": filename}
+            if pd.api.types.is_numeric_dtype(
+                series
+            ) or pd.api.types.is_bool_dtype(series):
+                np.save(tmp_dir / filename, series.to_numpy())
+                entry["kind"] = "numeric"
+            else:
+                mask = series.isna().to_numpy()
+                encoded = [
+                    str(value).encode("utf-8")
+                    for value in series.where(~mask, "")
+                ]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum([len(value) for value in encoded], out=offsets[1:])
+                np.save(
+                    tmp_dir / filename,
+                    np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                )
+                np.save(tmp_dir / f"col_{position}.offsets.npy", offsets)
+                np.save(tmp_dir / f"col_{position}.mask.npy", mask)
+                entry["kind"] = "text"
+                entry["offsets"] = f"col_{position}.offsets.npy"
+                entry["mask"] = f"col_{position}.mask.npy"
+            columns.append(entry)
+
+        manifest = {
+            "version": SIDECAR_VERSION,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "source_size": stat.st_size,
+            "row_count": len(df),
+            "columns": columns,
+        }
+        with open(tmp_dir / MANIFEST_FILENAME, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.replace(tmp_dir, target_dir)
+        return True
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
+
+def remove_columnar_sidecar(csv_path: str) -> None:
+    """
+    Deletes the columnar sidecar of a CSV file if it exists.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+    """
+    shutil.rmtree(get_columnar_dir(csv_path), ignore_errors=True)
+
+
+def read_manifest(csv_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads the sidecar manifest if it is present and matches the CSV file.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The manifest, or None if it is missing,
+                                  stale or written in another layout.
+    """
+    manifest_path = get_columnar_dir(csv_path) / MANIFEST_FILENAME
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        stat = os.stat(csv_path)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        manifest.get("version") != SIDECAR_VERSION
+        or manifest.get("source_mtime_ns") != stat.st_mtime_ns
+        or manifest.get("source_size") != stat.st_size
+    ):
+        return None
+    return manifest
+
+
+def read_columns(csv_path: str, columns: List[str]) -> Optional[pd.DataFrame]:
+    """
+    Reads selected columns from the sidecar using memory-mapped arrays.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+        columns (List[str]): The names of the columns to read.
+
+    Returns:
+        Optional[pd.DataFrame]: A frame with the requested columns, or None
+                                if the sidecar cannot serve the request.
+    """
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        return None
+
+    entries = {entry["name"]: entry for entry in manifest["columns"]}
+
+    sidecar_dir = get_columnar_dir(csv_path)
+    data: Dict[str, Any] = {}
+    try:
+        for name in dict.fromkeys(columns):
+            entry = entries.get(name)
+            if entry is None:
+                return None
+            values = np.load(sidecar_dir / entry["file"], mmap_mode="r")
+            if entry["kind"] == "text":
+                offsets = np.load(sidecar_dir / entry["offsets"])
+                mask = np.load(sidecar_dir / entry["mask"], mmap_mode="r")
+                values = _decode_text(values, offsets)
+                values[mask] = np.nan
+            data[name] = values
+    except (OSError, ValueError):
+        return None
+
+    return pd.DataFrame(data, copy=False)
+
+
+def _decode_text(buffer: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Splits a text column's byte buffer back into its values.
+
+    Args:
+        buffer (np.ndarray): The concatenated UTF-8 encoded values.
+        offsets (np.ndarray): The start of each value in the buffer,
+                              followed by the end of the last one.
+
+    Returns:
+        np.ndarray: The values as an object array of strings.
+    """
+    raw = buffer.tobytes()
+    text = raw.decode("utf-8")
+    bounds = zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    values = np.empty(len(offsets) - 1, dtype=object)
+    if len(text) == len(raw):
+        # Pure ASCII: byte offsets are also character offsets
+        values[:] = [text[start:end] for start, end in bounds]
+    else:
+        values[:] = [raw[start:end].decode("utf-8") for start, end in bounds]
+    return values
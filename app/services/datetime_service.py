@@ -0,0 +1,121 @@
+"""
+Detects date and time columns, parses them and groups their values into
+time buckets.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Time buckets offered for charts, with the NumPy unit each one floors to;
+# weeks start on Monday and are handled separately
+TIME_BUCKETS = {
+    "none": None,
+    "minute": "m",
+    "hour": "h",
+    "day": "D",
+    "week": "W",
+}
+
+# Number of values checked when detecting a date format
+_SAMPLE_SIZE = 100
+
+
+def detect_datetime_format(values: pd.Series) -> Optional[str]:
+    """
+    Guesses the date format of a text column from its first value and
+    checks it against a sample of the column. Only formats with a year and
+    a day are accepted, so that month names or bare numbers stay
+    categories.
+
+    Args:
+        values (pd.Series): The column to examine.
+
+    Returns:
+        Optional[str]: A strftime format, or None if the column does not
+                       hold dates.
+    """
+    if not (
+        pd.api.types.is_object_dtype(values.dtype)
+        or pd.api.types.is_string_dtype(values.dtype)
+    ):
+        return None
+    sample = values.dropna().head(_SAMPLE_SIZE).astype(str)
+    if sample.empty:
+        return None
+
+    datetime_format = guess_datetime_format(sample.iloc[0])
+    if (
+        datetime_format is None
+        or "%d" not in datetime_format
+        or ("%Y" not in datetime_format and "%y" not in datetime_format)
+    ):
+        return None
+    parsed = pd.to_datetime(
+        sample, format=datetime_format, errors="coerce", utc=True
+    )
+    return datetime_format if parsed.notna().all() else None
+
+
+def parse_datetimes(values: pd.Series, datetime_format: str) -> np.ndarray:
+    """
+    Parses a text column in one vectorized pass with a known format.
+    Times with an offset are converted to UTC.
+
+    Args:
+        values (pd.Series): The column to parse.
+        datetime_format (str): The strftime format of its values.
+
+    Returns:
+        np.ndarray: The values as datetime64[ns], with NaT where a value
+                    could not be parsed.
+    """
+    parsed = pd.to_datetime(
+        values, format=datetime_format, errors="coerce", utc=True
+    )
+    return parsed.dt.tz_localize(None).to_numpy()
+
+
+def bucket_times(x: np.ndarray, bucket: str) -> np.ndarray:
+    """
+    Floors times to the start of their bucket.
+
+    Args:
+        x (np.ndarray): The datetime64 values.
+        bucket (str): One of TIME_BUCKETS other than "none".
+
+    Returns:
+        np.ndarray: The start of each value's bucket, as datetime64[ns].
+
+    Raises:
+        ValueError: If the bucket is unknown.
+    """
+    unit = TIME_BUCKETS.get(bucket)
+    if unit is None:
+        raise ValueError(f"Invalid time bucket: {bucket}")
+    if unit == "W":
+        days = x.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday, three days after the week began
+        offsets = (days.astype(np.int64) + 3) % 7
+        floored = days - offsets.astype("timedelta64[D]")
+    else:
+        floored = x.astype(f"datetime64[{unit}]")
+    return floored.astype("datetime64[ns]")
+
+
+def bucketed_label(x_axis: str, bucket: Optional[str]) -> str:
+    """
+    Labels the X-axis of a chart whose dates may be grouped into buckets.
+
+    Args:
+        x_axis (str): The column used for the X-axis.
+        bucket (Optional[str]): The time bucket, if any.
+
+    Returns:
+        str: The column name, followed by the bucket when there is one.
+    """
+    if not bucket or bucket == "none":
+        return x_axis
+    return f"{x_axis} (per {bucket})"
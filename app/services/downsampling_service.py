@@ -0,0 +1,238 @@
+"""
+Reduces chart series to a bounded number of points before plotting.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_POINT_BUDGET = 2000
+DEFAULT_BAR_LIMIT = 50
+OTHER_LABEL = "Other"
+
+
+@dataclass
+class DownsampledSeries:
+    """
+    Represents the points that remain to be plotted after downsampling.
+    Charts of several columns have a 2D y with one column per series, and
+    max_pos refers to the first of them.
+    """
+
+    x: np.ndarray
+    y: np.ndarray
+    max_pos: int
+    original_points: int
+    decimated: bool
+    method: str | None = None
+
+
+def downsample(
+    x: np.ndarray,
+    y: np.ndarray,
+    chart_type: str,
+    point_budget: int = DEFAULT_POINT_BUDGET,
+    bar_limit: int = DEFAULT_BAR_LIMIT,
+    other: str = "sum",
+) -> DownsampledSeries:
+    """
+    Selects the points to plot for a chart type within a point budget. The
+    point with the maximum Y value is always kept. Several series sharing
+    the X values are downsampled together, each getting a share of the
+    budget, so that they keep the same points.
+
+    Args:
+        x (np.ndarray): The X-axis values.
+        y (np.ndarray): The numeric Y-axis values, with one column per
+                        series when there are several.
+        chart_type (str): The type of chart ('bar', 'line', 'scatter').
+        point_budget (int): The maximum number of line or scatter points.
+        bar_limit (int): The maximum number of bars, including the "Other"
+                         bucket.
+        other (str): How the bars folded into "Other" are combined: 'sum',
+                     'mean', 'min' or 'max'.
+
+    Returns:
+        DownsampledSeries: The selected points and the position of the
+                           maximum among them.
+    """
+    n = len(y)
+    columns = y.reshape(n, -1)
+    max_pos = int(np.argmax(columns[:, 0]))
+
+    if chart_type == "bar":
+        if n <= bar_limit:
+            return DownsampledSeries(x, y, max_pos, n, False)
+        return _top_n_with_other(x, y, bar_limit, other)
+
+    if n <= point_budget:
+        return DownsampledSeries(x, y, max_pos, n, False)
+
+    coordinates = _as_coordinates(x)
+    share = max(point_budget // columns.shape[1], 3)
+    select: Callable[[np.ndarray, np.ndarray, int], np.ndarray]
+    if chart_type == "line":
+        select = lttb_indices
+        method = "lttb"
+    else:
+        select = density_indices
+        method = "density"
+    indices = np.unique(
+        np.concatenate(
+            [select(coordinates, column, share) for column in columns.T]
+        )
+    )
+
+    # Always keep the maximum of every series
+    indices = np.union1d(indices, np.argmax(columns, axis=0))
+    return DownsampledSeries(
+        x=x[indices],
+        y=y[indices],
+        max_pos=int(np.searchsorted(indices, max_pos)),
+        original_points=n,
+        decimated=True,
+        method=method,
+    )
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Selects points with the Largest-Triangle-Three-Buckets algorithm.
+
+    Args:
+        x (np.ndarray): Numeric X coordinates in plotting order.
+        y (np.ndarray): Numeric Y coordinates.
+        threshold (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The sorted indices of the selected points.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64, copy=False)
+    y = y.astype(np.float64, copy=False)
+
+    # The first and last points are kept; the rest is split into buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (avg_y - y[anchor])
+        )
+        anchor = int(start + np.argmax(area))
+        selected[bucket + 1] = anchor
+
+    return selected
+
+
+def density_indices(x: np.ndarray, y: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Keeps one representative point per occupied cell of a 2D grid.
+
+    Args:
+        x (np.ndarray): Numeric X coordinates.
+        y (np.ndarray): Numeric Y coordinates.
+        budget (int): The maximum number of grid cells.
+
+    Returns:
+        np.ndarray: The sorted indices of the selected points.
+    """
+    grid = max(int(np.sqrt(budget)), 1)
+    cells = _bin(x, grid) * grid + _bin(y, grid)
+    _, first = np.unique(cells, return_index=True)
+    return np.sort(first)
+
+
+def _top_n_with_other(
+    x: np.ndarray, y: np.ndarray, bar_limit: int, other: str = "sum"
+) -> DownsampledSeries:
+    """
+    Keeps the largest bars in their original order and combines the
+    remaining ones into a single "Other" bar.
+
+    Args:
+        x (np.ndarray): The bar labels.
+        y (np.ndarray): The bar heights, with one column per series when
+                        there are several; bars are ranked by the first.
+        bar_limit (int): The maximum number of bars, including "Other".
+        other (str): How the remaining bars are combined: 'sum', 'mean',
+                     'min' or 'max'.
+
+    Returns:
+        DownsampledSeries: The remaining bars.
+    """
+    n = len(y)
+    keep_count = max(bar_limit - 1, 1)
+    heights = y.astype(np.float64, copy=False)
+    ranking = heights.reshape(n, -1)[:, 0]
+    keep = np.sort(np.argpartition(-ranking, keep_count - 1)[:keep_count])
+    rest = np.ones(n, dtype=bool)
+    rest[keep] = False
+
+    labels = np.append(
+        x[keep].astype(str), f"{OTHER_LABEL} ({int(rest.sum())})"
+    )
+    return DownsampledSeries(
+        x=labels,
+        y=np.concatenate(
+            [heights[keep], [getattr(np, other)(heights[rest], axis=0)]]
+        ),
+        max_pos=int(np.argmax(ranking[keep])),
+        original_points=n,
+        decimated=True,
+        method="top_n",
+    )
+
+
+def _as_coordinates(values: np.ndarray) -> np.ndarray:
+    """
+    Returns numeric coordinates for X values, using nanoseconds for dates
+    and row positions for other non-numeric data.
+
+    Args:
+        values (np.ndarray): The X-axis values.
+
+    Returns:
+        np.ndarray: Numeric coordinates.
+    """
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.float64)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype(np.float64, copy=False)
+    return np.arange(len(values), dtype=np.float64)
+
+
+def _bin(values: np.ndarray, bins: int) -> np.ndarray:
+    """
+    Maps values onto equal-width bin numbers.
+
+    Args:
+        values (np.ndarray): Numeric values.
+        bins (int): The number of bins.
+
+    Returns:
+        np.ndarray: The bin number of each value.
+    """
+    values = values.astype(np.float64, copy=False)
+    low, high = values.min(), values.max()
+    if not np.isfinite(high - low) or high == low:
+        return np.zeros(len(values), dtype=np.int64)
+    scaled = (values - low) / (high - low) * bins
+    return np.minimum(scaled.astype(np.int64), bins - 1)
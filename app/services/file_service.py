@@ -2,64 +2,86 @@
 Contains the business logic for file management.
 """
 
+import hashlib
 import os
-import shutil
+import threading
+import time
 import uuid
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-import pandas as pd
-from flask import current_app, session
+from flask import session
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
+from app.services.blob_service import (
+    release_blob,
+    release_session_blobs,
+    store_blob,
+)
+from app.services.cache_service import get_dataframe_cache
+from app.services.cleanup_service import KIND_SESSION, record_access
+from app.services.metrics_service import inc, stage_timer
+from app.services.upload_service import is_utf8_upload
+
 MAX_FILES_PER_SESSION = 5
-MAX_FILE_SIZE_MB = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Content hashes of files keyed by (path, mtime_ns, size)
+_file_hashes: Dict[tuple, str] = {}
+_file_hashes_lock = threading.Lock()
 
 
-def get_session_dir() -> Path:
+def get_session_dir_id() -> str:
     """
-    Retrieves the path to the user's session directory, creating it if it
-    doesn't exist.
+    Retrieves the id under which the user's uploads are referenced,
+    creating it if it doesn't exist.
 
     Returns:
-        Path: The path to the session directory.
+        str: The session's storage id.
     """
     if "session_dir_id" not in session:
         session["session_dir_id"] = uuid.uuid4().hex
+    return str(session["session_dir_id"])
 
-    session_dir_id = session["session_dir_id"]
-    # The `uploads` directory is created within the instance folder
-    session_dir = (
-        Path(current_app.instance_path) / "uploads" / str(session_dir_id)
-    )
-    os.makedirs(session_dir, exist_ok=True)
-    return session_dir
+
+def get_session_files() -> List[Dict[str, Any]]:
+    """
+    Lists the metadata of the files in the user's session in upload order.
+
+    Returns:
+        List[Dict[str, Any]]: The metadata of each file.
+    """
+    files = session.get("files") or {}
+    return sorted(files.values(), key=lambda f: f.get("uploaded_at", 0))
+
+
+def get_session_file(file_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Looks up the metadata of a file in the user's session by its ID.
+
+    Args:
+        file_id (Optional[str]): The ID of the file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The file's metadata, or None if the
+                                  session has no such file.
+    """
+    if not file_id:
+        return None
+    return (session.get("files") or {}).get(file_id)
 
 
 def clear_session_dir() -> None:
     """
-    Deletes the user's session directory and all its contents, including
-    generated charts.
+    Releases the user's uploaded files; stored contents are deleted once no
+    other session refers to them.
     """
     if "session_dir_id" in session:
-        session_dir_id = session["session_dir_id"]
-        session_dir = (
-            Path(current_app.instance_path) / "uploads" / str(session_dir_id)
-        )
-        if os.path.isdir(session_dir):
-            shutil.rmtree(session_dir)
-
-    # Clean up generated charts
-    if "chart_filename" in session:
-        charts_dir = Path(current_app.instance_path) / "charts"
-        chart_path = charts_dir / session["chart_filename"]
-        if chart_path.exists():
-            try:
-                os.remove(chart_path)
-            except OSError:
-                pass
+        release_session_blobs(str(session["session_dir_id"]))
 
+    # Generated charts are shared through the render cache and are evicted
+    # by age and size rather than deleted on logout
     session.pop("session_dir_id", None)
     session.pop("files", None)
     session.pop("chart_filename", None)
@@ -68,7 +90,8 @@ def clear_session_dir() -> None:
 def is_valid_csv(file_stream: Any) -> bool:
     """
     Checks if the uploaded file is a valid CSV with UTF-8 encoding and
-    headers.
+    headers. Uploads streamed to disk have already been checked for UTF-8
+    as they were received.
 
     Args:
         file_stream: The file stream to validate.
@@ -76,6 +99,12 @@ def is_valid_csv(file_stream: Any) -> bool:
     Returns:
         bool: True if the file is a valid CSV, False otherwise.
     """
+    if isinstance(file_stream, FileStorage) and not is_utf8_upload(
+        file_stream
+    ):
+        return False
+    import pandas as pd
+
     try:
         # The first line is read to check for headers
         pd.read_csv(file_stream, nrows=1)
@@ -89,8 +118,9 @@ def add_file_to_session(
     file: FileStorage,
 ) -> Optional[Dict[str, Any]]:
     """
-    Saves an uploaded file to the session directory and adds its metadata to
-    the session.
+    Stores an uploaded file and adds its metadata to the session. Contents
+    that are already stored, by this or any other session, are shared
+    rather than written again.
 
     Args:
         file (FileStorage): The file to add.
@@ -99,33 +129,34 @@ def add_file_to_session(
         Optional[Dict[str, Any]]: A dictionary containing the file's metadata
                                   if successful, otherwise None.
     """
+    # Files are keyed by their ID
     if "files" not in session:
-        session["files"] = []
+        session["files"] = {}
 
     if len(session["files"]) >= MAX_FILES_PER_SESSION:
         return None
 
     filename = secure_filename(file.filename or f"file_{uuid.uuid4().hex}.csv")
-    session_dir = get_session_dir()
-    file_path = session_dir / filename
-    file.save(file_path)
-
     file_id = f"file_{uuid.uuid4().hex}"
+    file_path, file_hash = _store_file(file_id, file)
+
     file_metadata = {
         "id": file_id,
         "original_filename": filename,
         "server_path": str(file_path),
+        "sha256": file_hash,
+        "uploaded_at": time.time(),
     }
 
-    session["files"].append(file_metadata)
+    session["files"][file_id] = file_metadata
     session.modified = True
     return file_metadata
 
 
 def remove_file_from_session(file_id: str) -> bool:
     """
-    Removes a file from the session directory and its metadata from the
-    session.
+    Removes a file's metadata from the session and releases its contents,
+    which are deleted once no other session refers to them.
 
     Args:
         file_id (str): The ID of the file to remove.
@@ -133,24 +164,12 @@ def remove_file_from_session(file_id: str) -> bool:
     Returns:
         bool: True if the file was removed successfully, False otherwise.
     """
-    if "files" not in session:
+    if not get_session_file(file_id):
         return False
 
-    file_to_remove = next(
-        (f for f in session["files"] if f["id"] == file_id), None
-    )
-
-    if not file_to_remove:
-        return False
-
-    try:
-        os.remove(file_to_remove["server_path"])
-    except OSError:
-        # The file may not exist, but we should still remove it from the
-        # session
-        pass
+    release_blob(get_session_dir_id(), file_id)
 
-    session["files"] = [f for f in session["files"] if f["id"] != file_id]
+    del session["files"][file_id]
     session.modified = True
     return True
 
@@ -166,40 +185,28 @@ def update_file_in_session(file_id: str, new_file: FileStorage) -> bool:
     Returns:
         bool: True if the file was updated successfully, False otherwise.
     """
-    if "files" not in session:
-        return False
-
-    file_to_update = next(
-        (f for f in session["files"] if f["id"] == file_id), None
-    )
-
+    file_to_update = get_session_file(file_id)
     if not file_to_update:
         return False
 
-    # Delete the old file
-    try:
-        os.remove(file_to_update["server_path"])
-    except OSError:
-        pass
-
-    # Save the new file
+    # Storing the new contents under the same ID releases the old ones
     filename = secure_filename(
         new_file.filename or f"file_{uuid.uuid4().hex}.csv"
     )
-    session_dir = get_session_dir()
-    file_path = session_dir / filename
-    new_file.save(file_path)
+    file_path, file_hash = _store_file(file_id, new_file)
 
     # Update metadata
     file_to_update["original_filename"] = filename
     file_to_update["server_path"] = str(file_path)
+    file_to_update["sha256"] = file_hash
     session.modified = True
     return True
 
 
 def get_csv_headers(file_path: str) -> List[str]:
     """
-    Reads the header row from a CSV file.
+    Reads the header row from a CSV file. The columnar sidecar manifest or
+    an already parsed frame is used when available.
 
     Args:
         file_path (str): The path to the CSV file.
@@ -207,7 +214,112 @@ def get_csv_headers(file_path: str) -> List[str]:
     Returns:
         List[str]: A list of column headers.
     """
+    import pandas as pd
+
+    from app.services.columnar_service import read_manifest
+
+    manifest = read_manifest(file_path)
+    if manifest is not None:
+        return [column["name"] for column in manifest["columns"]]
+
+    cached = get_dataframe_cache().peek(file_path)
+    if cached is not None:
+        return cached.columns.tolist()
     try:
         return pd.read_csv(file_path, nrows=0).columns.tolist()
     except Exception:
         return []
+
+
+def get_file_hash(file_path: str) -> str:
+    """
+    Computes the SHA-256 hash of a file's contents. Hashes are remembered
+    for as long as the file's modification time and size are unchanged.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        str: The hexadecimal content hash.
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _file_hashes_lock:
+        cached = _file_hashes.get(key)
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    file_hash = digest.hexdigest()
+
+    _remember_file_hash(file_path, file_hash)
+    return file_hash
+
+
+def _remember_file_hash(file_path: str, file_hash: str) -> None:
+    """
+    Records the content hash of the current version of a file.
+
+    Args:
+        file_path (str): The path to the file.
+        file_hash (str): The hexadecimal content hash.
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _file_hashes_lock:
+        # Forget hashes of previous versions of the same file
+        for old_key in [k for k in _file_hashes if k[0] == key[0]]:
+            del _file_hashes[old_key]
+        _file_hashes[key] = file_hash
+
+
+def _store_file(file_id: str, file: FileStorage) -> tuple[Path, str]:
+    """
+    Stores an uploaded file as a content-addressed blob referenced by the
+    session, deriving its sidecars the first time the contents are seen.
+
+    Args:
+        file_id (str): The ID of the file within the session.
+        file (FileStorage): The uploaded file.
+
+    Returns:
+        tuple[Path, str]: The blob path and its content hash.
+    """
+    session_dir_id = get_session_dir_id()
+    with stage_timer("upload_store"):
+        file_path, file_hash, created = store_blob(
+            session_dir_id, file_id, file
+        )
+    record_access(KIND_SESSION, session_dir_id)
+    _remember_file_hash(str(file_path), file_hash)
+    inc("csvviz_uploads_total")
+    inc("csvviz_upload_bytes_total", os.path.getsize(file_path))
+    if created:
+        with stage_timer("upload_sidecars"):
+            _write_sidecars(str(file_path))
+    return file_path, file_hash
+
+
+def _write_sidecars(file_path: str) -> None:
+    """
+    Parses an uploaded file once and derives its columnar copy and column
+    profile from the parsed frame.
+
+    Args:
+        file_path (str): The path to the CSV file.
+    """
+    import pandas as pd
+
+    from app.services.columnar_service import write_columnar_sidecar
+    from app.services.profile_service import write_profile
+
+    try:
+        df = pd.read_csv(file_path)
+    except Exception:
+        # Unparseable files are reported when a chart is requested
+        return
+    write_columnar_sidecar(file_path, df)
+    write_profile(file_path, df)
@@ -0,0 +1,546 @@
+"""
+Runs chart generation as background jobs that clients can poll. Job state
+is kept in a SQLite database in the instance folder so that any worker
+process can report on or cancel a job, whichever process runs it.
+"""
+
+import atexit
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app.services.chart_service import create_chart
+from app.services.logging_service import log_event
+from app.services.sqlite_service import Transaction, connect
+
+DEFAULT_CHART_JOB_WORKERS = 4
+DEFAULT_CHART_JOB_TTL_SECONDS = 600
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# How often waiting clients and running jobs check the store for changes,
+# in seconds
+POLL_INTERVAL = 0.25
+
+_JOB_COLUMNS = (
+    "id, user_id, session_dir_id, file_id, status, stage, chart_filename,"
+    " error, delivered, cancel_requested, version, updated_at"
+)
+
+_executor_lock = threading.Lock()
+
+
+class ChartJob:
+    """
+    State of a chart generation request running in the background, as last
+    read from the job store.
+    """
+
+    def __init__(self, row: Tuple[Any, ...]) -> None:
+        """
+        Initializes the job from a row of the jobs table.
+
+        Args:
+            row (Tuple[Any, ...]): The values of _JOB_COLUMNS.
+        """
+        (
+            self.id,
+            user_id,
+            session_dir_id,
+            self.file_id,
+            self.status,
+            self.stage,
+            self.chart_filename,
+            self.error,
+            delivered,
+            cancel_requested,
+            self.version,
+            self.updated_at,
+        ) = row
+        self.owner: Tuple[str, str] = (user_id, session_dir_id)
+        self.delivered = bool(delivered)
+        self.cancel_requested = bool(cancel_requested)
+
+    @property
+    def finished(self) -> bool:
+        """
+        Tells whether the job has stopped running.
+
+        Returns:
+            bool: True if the job is done, failed or cancelled.
+        """
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        """
+        Returns the public state of the job.
+
+        Returns:
+            Dict[str, Any]: The job id, status, stage, chart filename and
+                            error message.
+        """
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "chart_filename": self.chart_filename,
+            "error": self.error,
+        }
+
+
+class JobCancelEvent(threading.Event):
+    """
+    Cancellation flag of a running job that is also set when another
+    process requests cancellation through the job store.
+    """
+
+    def __init__(self, db_path: Path, job_id: str) -> None:
+        """
+        Initializes the flag.
+
+        Args:
+            db_path (Path): The path to the job store.
+            job_id (str): The id of the job.
+        """
+        super().__init__()
+        self.db_path = db_path
+        self.job_id = job_id
+        self._checked_at = 0.0
+
+    def is_set(self) -> bool:
+        """
+        Tells whether cancellation was requested, reading the job store at
+        most once per POLL_INTERVAL.
+
+        Returns:
+            bool: True if the job should stop.
+        """
+        if super().is_set():
+            return True
+        now = time.monotonic()
+        if now - self._checked_at >= POLL_INTERVAL:
+            self._checked_at = now
+            with _connect(self.db_path) as conn:
+                row = conn.execute(
+                    "SELECT cancel_requested FROM jobs WHERE id = ?",
+                    (self.job_id,),
+                ).fetchone()
+            if row is None or row[0]:
+                self.set()
+        return super().is_set()
+
+
+def submit_chart_job(
+    app: Flask,
+    owner: Tuple[str, str],
+    file_id: str,
+    file_path: str,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+    display_name: Optional[str] = None,
+    output_format: str = "png",
+    dpi: Optional[int] = None,
+    aggregation: Optional[str] = None,
+    time_bucket: Optional[str] = None,
+) -> ChartJob:
+    """
+    Queues a chart for generation in a background thread of the current
+    process.
+
+    Args:
+        app (Flask): The application whose configuration the job uses.
+        owner (Tuple[str, str]): The user id and session directory id of the
+                                 submitting user.
+        file_id (str): The id of the session file being charted.
+        file_path (str): The path to the CSV file.
+        x_axis (str): The column to use for the X-axis.
+        y_axis (str | List[str]): The column, or columns, to use for the
+                                  Y-axis.
+        chart_type (str): The type of chart to generate.
+        display_name (Optional[str]): The file name shown on the chart.
+        output_format (str): The image format.
+        dpi (Optional[int]): The image resolution.
+        aggregation (Optional[str]): How rows sharing an X value are
+                                     combined.
+        time_bucket (Optional[str]): The period dates are grouped by.
+
+    Returns:
+        ChartJob: The queued job.
+    """
+    db_path = _get_db_path(app)
+    job_id = uuid.uuid4().hex
+    with _connect(db_path) as conn:
+        _prune_jobs(
+            conn,
+            app.config.get(
+                "CHART_JOB_TTL_SECONDS", DEFAULT_CHART_JOB_TTL_SECONDS
+            ),
+        )
+        conn.execute(
+            "INSERT INTO jobs (id, user_id, session_dir_id, file_id, status,"
+            " delivered, cancel_requested, version, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 0, 0, 0, ?)",
+            (job_id, owner[0], owner[1], file_id, JOB_QUEUED, time.time()),
+        )
+        job = _load_job(conn, job_id)
+    assert job is not None
+
+    _get_executor(app).submit(
+        _run_chart_job,
+        app,
+        job,
+        file_path,
+        x_axis,
+        y_axis,
+        chart_type,
+        display_name,
+        output_format,
+        dpi,
+        aggregation,
+        time_bucket,
+    )
+    return job
+
+
+def get_chart_job(job_id: str, owner: Tuple[str, str]) -> Optional[ChartJob]:
+    """
+    Retrieves a job submitted by the given owner.
+
+    Args:
+        job_id (str): The id of the job.
+        owner (Tuple[str, str]): The user id and session directory id of the
+                                 requesting user.
+
+    Returns:
+        Optional[ChartJob]: The job, or None if it does not exist or belongs
+                            to someone else.
+    """
+    with _connect(_get_db_path()) as conn:
+        job = _load_job(conn, job_id)
+    if job is None or job.owner != owner:
+        return None
+    return job
+
+
+def wait_for_job_change(job: ChartJob, timeout: float) -> ChartJob:
+    """
+    Blocks until a job changes past the state the caller has seen or the
+    timeout expires.
+
+    Args:
+        job (ChartJob): The job as last seen by the caller.
+        timeout (float): The maximum time to wait, in seconds.
+
+    Returns:
+        ChartJob: The current state of the job, which is the given one if
+                  nothing changed or the job has been forgotten.
+    """
+    db_path = _get_db_path()
+    deadline = time.monotonic() + timeout
+    while True:
+        with _connect(db_path) as conn:
+            current = _load_job(conn, job.id)
+        if current is None:
+            return job
+        if current.version != job.version:
+            return current
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return current
+        time.sleep(min(POLL_INTERVAL, remaining))
+
+
+def mark_job_delivered(job: ChartJob) -> bool:
+    """
+    Records that the outcome of a finished job has been shown to its user.
+    Only the first of several concurrent callers succeeds.
+
+    Args:
+        job (ChartJob): The finished job.
+
+    Returns:
+        bool: True if the caller should deliver the outcome.
+    """
+    with _connect(_get_db_path()) as conn:
+        return (
+            conn.execute(
+                "UPDATE jobs SET delivered = 1"
+                " WHERE id = ? AND delivered = 0 AND status IN (?, ?, ?)",
+                (job.id, *FINISHED_STATUSES),
+            ).rowcount
+            == 1
+        )
+
+
+def cancel_chart_job(job: ChartJob) -> ChartJob:
+    """
+    Requests cancellation of a job. A job that has not started yet is
+    cancelled immediately; a running job stops at its next stage, or while
+    its chart renders.
+
+    Args:
+        job (ChartJob): The job to cancel.
+
+    Returns:
+        ChartJob: The state of the job after the request.
+    """
+    with _connect(_get_db_path()) as conn:
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job.id,)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?,"
+            " version = version + 1, updated_at = ?"
+            " WHERE id = ? AND status = ?",
+            (
+                JOB_CANCELLED,
+                "Chart generation cancelled.",
+                time.time(),
+                job.id,
+                JOB_QUEUED,
+            ),
+        )
+        current = _load_job(conn, job.id)
+    return current or job
+
+
+def _run_chart_job(
+    app: Flask,
+    job: ChartJob,
+    file_path: str,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+    display_name: Optional[str] = None,
+    output_format: str = "png",
+    dpi: Optional[int] = None,
+    aggregation: Optional[str] = None,
+    time_bucket: Optional[str] = None,
+) -> None:
+    """
+    Generates the chart of a job and records the outcome.
+
+    Args:
+        app (Flask): The application whose configuration the job uses.
+        job (ChartJob): The job being run.
+        file_path (str): The path to the CSV file.
+        x_axis (str): The column to use for the X-axis.
+        y_axis (str | List[str]): The column, or columns, to use for the
+                                  Y-axis.
+        chart_type (str): The type of chart to generate.
+        display_name (Optional[str]): The file name shown on the chart.
+        output_format (str): The image format.
+        dpi (Optional[int]): The image resolution.
+        aggregation (Optional[str]): How rows sharing an X value are
+                                     combined.
+        time_bucket (Optional[str]): The period dates are grouped by.
+    """
+    db_path = _get_db_path(app)
+    cancel_event = JobCancelEvent(db_path, job.id)
+    # Cancelled while queued
+    if not _update_job(db_path, job.id, JOB_QUEUED, status=JOB_RUNNING):
+        return
+
+    def report_stage(stage: str) -> None:
+        _update_job(db_path, job.id, JOB_RUNNING, stage=stage)
+
+    with app.app_context():
+        chart_filename, error_message = create_chart(
+            file_path,
+            x_axis,
+            y_axis,
+            chart_type,
+            display_name,
+            output_format,
+            dpi,
+            aggregation,
+            time_bucket,
+            progress=report_stage,
+            cancel_event=cancel_event,
+        )
+        if chart_filename:
+            log_event(
+                "chart_generated",
+                session_id=job.owner[1],
+                file_id=job.file_id,
+                chart=chart_filename,
+                job_id=job.id,
+            )
+
+    if chart_filename:
+        _update_job(
+            db_path,
+            job.id,
+            JOB_RUNNING,
+            status=JOB_DONE,
+            chart_filename=chart_filename,
+        )
+    elif cancel_event.is_set():
+        _update_job(
+            db_path,
+            job.id,
+            JOB_RUNNING,
+            status=JOB_CANCELLED,
+            error="Chart generation cancelled.",
+        )
+    else:
+        _update_job(
+            db_path,
+            job.id,
+            JOB_RUNNING,
+            status=JOB_FAILED,
+            error=error_message or "Could not generate the chart.",
+        )
+
+
+def _update_job(
+    db_path: Path, job_id: str, expected_status: str, **changes: Any
+) -> bool:
+    """
+    Applies changes to a job in the given status and bumps its version so
+    that waiting clients see them.
+
+    Args:
+        db_path (Path): The path to the job store.
+        job_id (str): The id of the job.
+        expected_status (str): The status the job must still be in.
+        **changes (Any): The columns to set.
+
+    Returns:
+        bool: True if the job was updated.
+    """
+    assignments = "".join(f"{name} = ?, " for name in changes)
+    with _connect(db_path) as conn:
+        return (
+            conn.execute(
+                f"UPDATE jobs SET {assignments}"
+                "version = version + 1, updated_at = ?"
+                " WHERE id = ? AND status = ?",
+                (*changes.values(), time.time(), job_id, expected_status),
+            ).rowcount
+            == 1
+        )
+
+
+def _load_job(conn: sqlite3.Connection, job_id: str) -> Optional[ChartJob]:
+    """
+    Reads a job from the store.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+        job_id (str): The id of the job.
+
+    Returns:
+        Optional[ChartJob]: The job, or None if it does not exist.
+    """
+    row = conn.execute(
+        f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    return ChartJob(row) if row else None
+
+
+def _prune_jobs(conn: sqlite3.Connection, ttl_seconds: float) -> None:
+    """
+    Forgets jobs that have not changed for longer than the retention
+    period, including jobs left unfinished by a process that exited.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+        ttl_seconds (float): How long jobs are kept, in seconds.
+    """
+    conn.execute(
+        "DELETE FROM jobs WHERE updated_at < ?", (time.time() - ttl_seconds,)
+    )
+
+
+def _get_executor(app: Flask) -> ThreadPoolExecutor:
+    """
+    Returns the thread pool that runs the jobs of an application in this
+    process, creating it on first use. Queued jobs are cancelled when the
+    process exits.
+
+    Args:
+        app (Flask): The application whose configuration sizes the pool.
+
+    Returns:
+        ThreadPoolExecutor: The pool.
+    """
+    with _executor_lock:
+        executor = app.extensions.get("chart_job_executor")
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=app.config.get(
+                    "CHART_JOB_WORKERS", DEFAULT_CHART_JOB_WORKERS
+                ),
+                thread_name_prefix="chart-job",
+            )
+            app.extensions["chart_job_executor"] = executor
+            atexit.register(executor.shutdown, cancel_futures=True)
+        return executor
+
+
+def _get_db_path(app: Optional[Flask] = None) -> Path:
+    """
+    Returns the path of the job store of an application.
+
+    Args:
+        app (Optional[Flask]): The application; the current one when
+                               omitted.
+
+    Returns:
+        Path: The path to the job database.
+    """
+    return Path((app or current_app).instance_path) / "jobs.db"
+
+
+def _connect(db_path: Path) -> Transaction:
+    """
+    Opens the job store in a transaction, creating its table the first
+    time it is used.
+
+    Args:
+        db_path (Path): The path to the job database.
+
+    Returns:
+        Transaction: A context manager yielding the connection.
+    """
+    return connect(db_path, _create_schema)
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Creates the jobs table.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id TEXT PRIMARY KEY,"
+        " user_id TEXT NOT NULL,"
+        " session_dir_id TEXT NOT NULL,"
+        " file_id TEXT NOT NULL,"
+        " status TEXT NOT NULL,"
+        " stage TEXT,"
+        " chart_filename TEXT,"
+        " error TEXT,"
+        " delivered INTEGER NOT NULL,"
+        " cancel_requested INTEGER NOT NULL,"
+        " version INTEGER NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)"
+    )
@@ -2,43 +2,223 @@
 Handles logging of business events.
 """
 
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler
 from pathlib import Path
+from typing import Any, List, Optional
 
 from flask import current_app
 
+DEFAULT_EVENT_LOG_BATCH_SIZE = 100
+DEFAULT_EVENT_LOG_FLUSH_SECONDS = 1.0
+
+# Keys every event line starts with, which event fields cannot replace
+RESERVED_EVENT_FIELDS = ("timestamp", "event_type", "level")
+
+_listener: Optional["BatchingQueueListener"] = None
+
+
+class JsonEventFormatter(logging.Formatter):
+    """
+    Formats an event record as a single line of JSON with its timestamp,
+    event type, level and any extra fields. Extra fields never replace the
+    reserved keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Serializes an event record.
+
+        Args:
+            record (logging.LogRecord): The record to format.
+
+        Returns:
+            str: The JSON object describing the event.
+        """
+        event = {
+            "timestamp": self.formatTime(record),
+            "event_type": record.getMessage(),
+            "level": record.levelname,
+        }
+        for name, value in getattr(record, "event_fields", {}).items():
+            if name not in RESERVED_EVENT_FIELDS:
+                event[name] = value
+        return json.dumps(event, default=str)
+
+
+class BatchingQueueListener:
+    """
+    Background thread that takes event records off a queue and writes them
+    to a file handler in batches, flushing once a batch is full or the flush
+    interval has passed.
+    """
+
+    def __init__(
+        self,
+        event_queue: "queue.Queue[logging.LogRecord]",
+        handler: logging.StreamHandler,
+        batch_size: int = DEFAULT_EVENT_LOG_BATCH_SIZE,
+        flush_interval: float = DEFAULT_EVENT_LOG_FLUSH_SECONDS,
+    ) -> None:
+        """
+        Initializes the listener without starting it.
+
+        Args:
+            event_queue (queue.Queue[logging.LogRecord]): The queue records
+                                                         are put on.
+            handler (logging.StreamHandler): The handler writing the file.
+            batch_size (int): The number of records that triggers a write.
+            flush_interval (float): The longest a record waits before it is
+                                    written, in seconds.
+        """
+        self.queue = event_queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts the background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="event-log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Writes any queued records and stops the background thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.handler.close()
+
+    def _run(self) -> None:
+        """
+        Collects records into batches until the listener is stopped.
+        """
+        while True:
+            batch = self._collect_batch()
+            if batch:
+                self._write_batch(batch)
+            elif self._stop.is_set():
+                return
+
+    def _collect_batch(self) -> List[logging.LogRecord]:
+        """
+        Waits for records until the batch is full or the flush interval
+        has passed.
+
+        Returns:
+            List[logging.LogRecord]: The collected records, possibly none.
+        """
+        batch: List[logging.LogRecord] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if self._stop.is_set():
+                timeout = 0
+            try:
+                if timeout > 0:
+                    batch.append(self.queue.get(timeout=timeout))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch: List[logging.LogRecord]) -> None:
+        """
+        Writes a batch of records with a single flush, rotating the file
+        when it grows past its size limit.
+
+        Args:
+            batch (List[logging.LogRecord]): The records to write.
+        """
+        handler = self.handler
+        handler.acquire()
+        try:
+            for record in batch:
+                try:
+                    if isinstance(
+                        handler, RotatingFileHandler
+                    ) and handler.shouldRollover(record):
+                        handler.doRollover()
+                    if handler.stream is None:
+                        # The file is opened lazily or was closed; emitting
+                        # the record reopens it
+                        handler.emit(record)
+                        continue
+                    handler.stream.write(
+                        handler.format(record) + handler.terminator
+                    )
+                except Exception:
+                    handler.handleError(record)
+            if handler.stream is not None:
+                handler.stream.flush()
+        finally:
+            handler.release()
+
 
 def setup_event_logger() -> None:
     """
-    Configures the logger for business events.
+    Configures the logger for business events. Events are put on an
+    in-process queue and written to instance/events.log by a background
+    thread, so requests never wait for the disk.
     """
+    global _listener
+
     log_dir = Path(current_app.instance_path)
     log_file = log_dir / "events.log"
 
     # Ensure the directory exists
     log_dir.mkdir(exist_ok=True)
 
+    logger = logging.getLogger("event_logger")
+    if logger.handlers:
+        return
+
     handler = RotatingFileHandler(
         log_file, maxBytes=1024 * 1024, backupCount=5
     )
-    formatter = logging.Formatter(
-        '{"timestamp": "%(asctime)s", "event_type": "%(message)s"}'
+    handler.setFormatter(JsonEventFormatter())
+
+    event_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    _listener = BatchingQueueListener(
+        event_queue,
+        handler,
+        current_app.config.get(
+            "EVENT_LOG_BATCH_SIZE", DEFAULT_EVENT_LOG_BATCH_SIZE
+        ),
+        current_app.config.get(
+            "EVENT_LOG_FLUSH_SECONDS", DEFAULT_EVENT_LOG_FLUSH_SECONDS
+        ),
     )
-    handler.setFormatter(formatter)
+    _listener.start()
+    atexit.register(_listener.stop)
 
-    logger = logging.getLogger("event_logger")
-    if not logger.handlers:
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+    logger.addHandler(QueueHandler(event_queue))
+    logger.setLevel(logging.INFO)
 
 
-def log_event(event_type: str) -> None:
+def log_event(event_type: str, **fields: Any) -> None:
     """
     Logs a business event to the dedicated log file.
 
     Args:
         event_type (str): The type of event to log (e.g., 'chart_generated').
+        **fields (Any): Extra details stored with the event, such as the
+                        session id or a duration. Fields named after one of
+                        RESERVED_EVENT_FIELDS are left out.
     """
     logger = logging.getLogger("event_logger")
-    logger.info(event_type)
+    logger.info(event_type, extra={"event_fields": fields})
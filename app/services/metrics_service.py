@@ -0,0 +1,556 @@
+"""
+Collects timing histograms, counters and gauges and exports them in the
+Prometheus text format, aggregated across worker processes.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# How long updates may wait before the process snapshot is rewritten
+SNAPSHOT_INTERVAL = 1.0
+
+# Help text and type of every exported metric
+METRICS: Dict[str, Tuple[str, str]] = {
+    "csvviz_stage_seconds": (
+        "histogram",
+        "Time spent in each stage of chart generation and uploads.",
+    ),
+    "csvviz_chart_renders_total": ("counter", "Charts rendered."),
+    "csvviz_chart_rows_plotted_total": ("counter", "Data points plotted."),
+    "csvviz_chart_cache_hits_total": (
+        "counter",
+        "Chart requests served from the chart cache.",
+    ),
+    "csvviz_chart_cache_misses_total": (
+        "counter",
+        "Chart requests that had to render.",
+    ),
+    "csvviz_chart_encode_seconds": (
+        "histogram",
+        "Time spent encoding chart images, by output format.",
+    ),
+    "csvviz_chart_output_bytes_total": (
+        "counter",
+        "Size of rendered chart images, by output format.",
+    ),
+    "csvviz_series_requests_total": (
+        "counter",
+        "Chart series served for drawing in the browser, by encoding.",
+    ),
+    "csvviz_chart_batches_total": ("counter", "Chart batches generated."),
+    "csvviz_chart_batch_charts_total": (
+        "counter",
+        "Charts requested in batches, by whether they were generated.",
+    ),
+    "csvviz_uploads_total": ("counter", "Files uploaded."),
+    "csvviz_upload_bytes_total": ("counter", "Bytes uploaded."),
+    "csvviz_dataframe_cache_hits_total": (
+        "counter",
+        "Column loads served from the DataFrame cache.",
+    ),
+    "csvviz_dataframe_cache_misses_total": (
+        "counter",
+        "Column loads that had to read the file.",
+    ),
+    "csvviz_dataframe_cache_evictions_total": (
+        "counter",
+        "Frames evicted from the DataFrame cache to respect its budget.",
+    ),
+    "csvviz_dataframe_cache_bytes": (
+        "gauge",
+        "Memory used by cached frames, by process.",
+    ),
+    "csvviz_dataframe_cache_entries": (
+        "gauge",
+        "Files held in the DataFrame cache, by process.",
+    ),
+    "csvviz_cleanup_passes_total": ("counter", "Cleanup passes run."),
+    "csvviz_cleanup_reclaimed_total": (
+        "counter",
+        "Items reclaimed by cleanup passes, by kind.",
+    ),
+    "csvviz_cleanup_last_pass_reclaimed": (
+        "gauge",
+        "Items reclaimed by the last cleanup pass of a process, by kind.",
+    ),
+    "csvviz_cleanup_last_pass_seconds": (
+        "gauge",
+        "Duration of the last cleanup pass of a process.",
+    ),
+    "csvviz_cleanup_last_pass_timestamp_seconds": (
+        "gauge",
+        "When the last cleanup pass of a process finished, as a Unix time.",
+    ),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Process-local store of counters, gauges and histograms that is
+    periodically saved to a snapshot file so other processes can aggregate
+    it.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Initializes an empty registry.
+
+        Args:
+            buckets (Tuple[float, ...]): The histogram bucket upper bounds.
+        """
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self.snapshot_path: Optional[Path] = None
+        self._token = uuid.uuid4().hex[:8]
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    def bind(self, metrics_dir: Path) -> Path:
+        """
+        Makes the registry save its snapshots under the given directory,
+        where the metrics endpoint of any process finds them.
+
+        Args:
+            metrics_dir (Path): The directory holding per-process snapshots.
+
+        Returns:
+            Path: The snapshot file of the current process.
+        """
+        path = metrics_dir / f"{os.getpid()}-{self._token}.json"
+        with self._lock:
+            self.snapshot_path = path
+        return path
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The metric name.
+            value (float): The amount to add.
+            **labels (str): The label values of the series.
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._schedule_snapshot()
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """
+        Sets a gauge.
+
+        Args:
+            name (str): The metric name.
+            value (float): The current value.
+            **labels (str): The label values of the series.
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            self.gauges[key] = value
+        self._schedule_snapshot()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Records a value in a histogram.
+
+        Args:
+            name (str): The metric name.
+            value (float): The observed value.
+            **labels (str): The label values of the series.
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            # Bucket counts followed by the sum and the count
+            series = self.histograms.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self.histograms[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+        self._schedule_snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns a serializable copy of the registry.
+
+        Returns:
+            Dict[str, Any]: The process id, counters, gauges and
+                            histograms.
+        """
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "buckets": list(self.buckets),
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "gauges": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.gauges.items()
+                ],
+                "histograms": [
+                    [name, list(labels), list(series)]
+                    for (name, labels), series in self.histograms.items()
+                ],
+            }
+
+    def write_snapshot(self) -> None:
+        """
+        Saves the registry to its snapshot file, if one is configured.
+        """
+        with self._lock:
+            self._flush_scheduled = False
+            path = self.snapshot_path
+        if path is None:
+            return
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            os.makedirs(path.parent, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _schedule_snapshot(self) -> None:
+        """
+        Arranges for the snapshot file to be rewritten shortly, so that a
+        burst of updates costs a single write.
+        """
+        if has_app_context():
+            metrics_dir = get_metrics_dir()
+            if (
+                self.snapshot_path is None
+                or self.snapshot_path.parent != metrics_dir
+            ):
+                self.bind(metrics_dir)
+        with self._lock:
+            if self._flush_scheduled or self.snapshot_path is None:
+                return
+            self._flush_scheduled = True
+        timer = threading.Timer(SNAPSHOT_INTERVAL, self.write_snapshot)
+        timer.daemon = True
+        timer.start()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_dir() -> Path:
+    """
+    Returns the directory holding the metric snapshots of the current
+    application's processes.
+
+    Returns:
+        Path: The metrics directory in the instance folder.
+    """
+    return Path(current_app.instance_path) / "metrics"
+
+
+def get_registry() -> MetricsRegistry:
+    """
+    Returns the registry of the current process.
+
+    Returns:
+        MetricsRegistry: The registry.
+    """
+    return _registry
+
+
+def inc(name: str, value: float = 1, **labels: str) -> None:
+    """
+    Adds to a counter of the current process.
+
+    Args:
+        name (str): The metric name.
+        value (float): The amount to add.
+        **labels (str): The label values of the series.
+    """
+    _registry.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    """
+    Sets a gauge of the current process.
+
+    Args:
+        name (str): The metric name.
+        value (float): The current value.
+        **labels (str): The label values of the series.
+    """
+    _registry.set_gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    """
+    Records a value in a histogram of the current process.
+
+    Args:
+        name (str): The metric name.
+        value (float): The observed value.
+        **labels (str): The label values of the series.
+    """
+    _registry.observe(name, value, **labels)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Records the duration of a processing stage.
+
+    Args:
+        stage (str): The stage name.
+        seconds (float): The duration in seconds.
+    """
+    _registry.observe("csvviz_stage_seconds", seconds, stage=stage)
+
+
+class StageClock:
+    """
+    Times consecutive stages of a task, each from the end of the previous
+    one.
+    """
+
+    def __init__(self) -> None:
+        """
+        Starts the clock.
+        """
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def lap(self, stage: str) -> float:
+        """
+        Records the time since the previous lap as a stage.
+
+        Args:
+            stage (str): The name of the stage that just finished.
+
+        Returns:
+            float: The duration of the stage in seconds.
+        """
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        observe_stage(stage, elapsed)
+        return elapsed
+
+    def total(self, stage: str) -> float:
+        """
+        Records the time since the clock was started as a stage.
+
+        Args:
+            stage (str): The name under which the whole task is recorded.
+
+        Returns:
+            float: The total duration in seconds.
+        """
+        elapsed = time.perf_counter() - self.started
+        observe_stage(stage, elapsed)
+        return elapsed
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Times the enclosed block as a processing stage.
+
+    Args:
+        stage (str): The stage name.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def render_metrics() -> str:
+    """
+    Combines the snapshots of all processes and formats them for
+    Prometheus. Counters and histograms are summed; gauges are reported
+    for each process with a 'pid' label.
+
+    Returns:
+        str: The metrics in the Prometheus text exposition format.
+    """
+    own_path = _registry.bind(get_metrics_dir())
+    _registry.write_snapshot()
+    snapshots = [_registry.snapshot()]
+    for path in _live_snapshots(own_path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    counters: Dict[Tuple[str, Labels], float] = {}
+    gauges: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], List[float]] = {}
+    buckets = list(_registry.buckets)
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get("counters", []):
+            key = (name, _labels(dict(labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot.get("gauges", []):
+            pid = {"pid": snapshot.get("pid", "")}
+            gauges[(name, _labels({**dict(labels), **pid}))] = value
+        if snapshot.get("buckets") != buckets:
+            continue
+        for name, labels, series in snapshot.get("histograms", []):
+            key = (name, _labels(dict(labels)))
+            total = histograms.setdefault(key, [0.0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+
+    lines: List[str] = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind in ("counter", "gauge"):
+            values = counters if kind == "counter" else gauges
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name == name:
+                    # Full precision, so that byte totals and timestamps
+                    # are not rounded
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            for bound, count in zip(buckets, series):
+                le = (("le", f"{bound:g}"),)
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels + le)} {count:g}"
+                )
+            inf = (("le", "+Inf"),)
+            lines.append(
+                f"{name}_bucket{_format_labels(labels + inf)} {series[-1]:g}"
+            )
+            lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]}")
+            lines.append(
+                f"{name}_count{_format_labels(labels)} {series[-1]:g}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _live_snapshots(own_path: Path) -> List[Path]:
+    """
+    Lists the snapshots of the other running processes, deleting those left
+    behind by processes that have exited, including unfinished writes.
+    Other files named after the current process come from an earlier
+    process that had the same id and are deleted too.
+
+    Args:
+        own_path (Path): The snapshot file of the current process.
+
+    Returns:
+        List[Path]: The snapshot files of the other live processes.
+    """
+    live = []
+    for path in own_path.parent.glob("*.json*"):
+        pid_text = path.name.split("-", 1)[0]
+        if path == own_path or not pid_text.isdigit():
+            continue
+        pid = int(pid_text)
+        if pid == os.getpid():
+            stale = path.name != own_path.name + ".tmp"
+        else:
+            stale = not _process_alive(pid)
+        if stale:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        elif path.suffix == ".json":
+            live.append(path)
+    return live
+
+
+def _process_alive(pid: int) -> bool:
+    """
+    Checks whether a process with the given id is running.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        bool: True if the process exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    """
+    Normalizes label values into a hashable, ordered tuple.
+
+    Args:
+        labels (Dict[str, str]): The label names and values.
+
+    Returns:
+        Labels: The sorted label pairs.
+    """
+    return tuple(
+        sorted((str(name), str(value)) for name, value in labels.items())
+    )
+
+
+def _format_labels(labels: Labels) -> str:
+    """
+    Formats label pairs for the Prometheus text format.
+
+    Args:
+        labels (Labels): The label pairs.
+
+    Returns:
+        str: The braced label list, or an empty string without labels.
+    """
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
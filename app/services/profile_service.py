@@ -0,0 +1,197 @@
+"""
+Profiles the columns of uploaded CSV files and stores the results.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.datetime_service import detect_datetime_format
+
+PROFILE_SUFFIX = ".profile.json"
+
+# Number of minimum hash values kept by the distinct-count estimator
+_KMV_SIZE = 1024
+
+
+def get_profile_path(csv_path: str) -> Path:
+    """
+    Returns the path of the profile sidecar of a CSV file.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+
+    Returns:
+        Path: The path to the profile sidecar.
+    """
+    path = Path(csv_path)
+    return path.with_name(path.name + PROFILE_SUFFIX)
+
+
+def profile_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Computes per-column statistics of a parsed CSV file.
+
+    Args:
+        df (pd.DataFrame): The parsed file.
+
+    Returns:
+        Dict[str, Any]: The row count and, for each column, its dtype,
+                        numeric flag, null count, min/max, an estimate
+                        of its number of distinct values and, for text
+                        holding dates, their format.
+    """
+    numeric = [
+        name for name in df.columns if pd.api.types.is_numeric_dtype(df[name])
+    ]
+    null_counts = df.isna().sum()
+    minimums = df[numeric].min() if numeric else pd.Series(dtype=float)
+    maximums = df[numeric].max() if numeric else pd.Series(dtype=float)
+
+    columns: List[Dict[str, Any]] = []
+    for name in df.columns:
+        is_numeric = name in minimums.index
+        columns.append(
+            {
+                "name": str(name),
+                "dtype": str(df[name].dtype),
+                "numeric": is_numeric,
+                "null_count": int(null_counts[name]),
+                "min": _to_json(minimums[name]) if is_numeric else None,
+                "max": _to_json(maximums[name]) if is_numeric else None,
+                "distinct_estimate": estimate_distinct(df[name]),
+                "datetime_format": (
+                    None if is_numeric else detect_datetime_format(df[name])
+                ),
+            }
+        )
+    return {"row_count": len(df), "columns": columns}
+
+
+def estimate_distinct(series: pd.Series) -> int:
+    """
+    Estimates the number of distinct non-null values of a column with the
+    k-minimum-values sketch. Small columns are counted exactly.
+
+    Args:
+        series (pd.Series): The column to examine.
+
+    Returns:
+        int: The estimated number of distinct values.
+    """
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False)
+    values = hashes.to_numpy()
+    if len(values) <= _KMV_SIZE:
+        return len(np.unique(values))
+
+    # Look at a few times more candidates than needed to absorb duplicates
+    candidates = min(len(values) - 1, 4 * _KMV_SIZE)
+    threshold = np.partition(values, candidates)[candidates]
+    smallest = np.unique(values[values <= threshold])
+    if len(smallest) < _KMV_SIZE:
+        return len(np.unique(values))
+
+    kth = float(smallest[_KMV_SIZE - 1])
+    return int(round((_KMV_SIZE - 1) * 2.0**64 / kth))
+
+
+def write_profile(csv_path: str, df: pd.DataFrame) -> bool:
+    """
+    Profiles a parsed CSV file and stores the result next to it.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+        df (pd.DataFrame): The parsed file.
+
+    Returns:
+        bool: True if the profile was written, False otherwise.
+    """
+    try:
+        stat = os.stat(csv_path)
+        profile = profile_dataframe(df)
+        profile["source_mtime_ns"] = stat.st_mtime_ns
+        profile["source_size"] = stat.st_size
+
+        profile_path = get_profile_path(csv_path)
+        tmp_path = profile_path.with_name(profile_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f)
+        os.replace(tmp_path, profile_path)
+        return True
+    except (OSError, ValueError, TypeError):
+        return False
+
+
+def read_profile(csv_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads the profile of a CSV file if it is present and up to date.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The profile, or None if it is missing or
+                                  stale.
+    """
+    try:
+        with open(get_profile_path(csv_path), encoding="utf-8") as f:
+            profile = json.load(f)
+        stat = os.stat(csv_path)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        profile.get("source_mtime_ns") != stat.st_mtime_ns
+        or profile.get("source_size") != stat.st_size
+    ):
+        return None
+    return profile
+
+
+def remove_profile(csv_path: str) -> None:
+    """
+    Deletes the profile sidecar of a CSV file if it exists.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+    """
+    try:
+        os.remove(get_profile_path(csv_path))
+    except OSError:
+        pass
+
+
+def get_column_profile(
+    profile: Dict[str, Any], column: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Finds the statistics of one column in a profile.
+
+    Args:
+        profile (Dict[str, Any]): The file profile.
+        column (str): The column name.
+
+    Returns:
+        Optional[Dict[str, Any]]: The column statistics, or None if the
+                                  column does not exist.
+    """
+    return next((c for c in profile["columns"] if c["name"] == column), None)
+
+
+def _to_json(value: Any) -> Any:
+    """
+    Converts a NumPy scalar into a JSON-compatible Python value.
+
+    Args:
+        value (Any): The value to convert.
+
+    Returns:
+        Any: The converted value, with missing values as None.
+    """
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
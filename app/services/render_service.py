@@ -0,0 +1,580 @@
+"""
+Renders chart images, either in-process or in a pool of worker processes.
+"""
+
+import atexit
+import io
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing.pool import AsyncResult, Pool
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_RENDER_TIMEOUT = 30.0
+DEFAULT_MAX_TASKS_PER_WORKER = 100
+DEFAULT_DPI = 100
+
+# Resolution of dashboard thumbnails; charts are 10 inches wide, so
+# thumbnails are 320 pixels wide
+THUMBNAIL_DPI = 32
+
+# How often a waiting request checks for cancellation, in seconds
+_POLL_INTERVAL = 0.05
+
+# Signal that stops a worker stuck in a render
+_KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+# Number of task slots shared with the workers; tasks share a slot only if
+# this many renders are waiting at once
+_TASK_SLOTS = 4096
+
+# In worker processes, the shared slots in which each task records the
+# process running it, and in which abandoned tasks are marked
+_task_slots: Optional[Any] = None
+
+
+class RenderTimeoutError(Exception):
+    """
+    Raised when a render does not finish within its timeout.
+    """
+
+
+class RenderCancelledError(Exception):
+    """
+    Raised when a render is cancelled before it finishes.
+    """
+
+
+def render_chart(
+    spec: Dict[str, Any], on_encode: Optional[Callable[[], None]] = None
+) -> Dict[str, float]:
+    """
+    Draws a chart with the object-oriented Matplotlib API and saves it.
+
+    Args:
+        spec (Dict[str, Any]): The chart description with the keys 'x', 'y',
+            'max_pos', 'chart_type', 'x_label', 'y_label', 'title' and
+            'output_path', and optionally 'format' ('png', 'png8' for a
+            palette PNG, 'svg' or 'webp'), 'dpi', 'thumbnail_path' and,
+            when y has one column per series, 'series_labels'.
+        on_encode (Optional[Callable[[], None]]): Called once drawing is
+                                                 done, before encoding.
+
+    Returns:
+        Dict[str, float]: The time spent drawing, laying out and encoding
+                          the chart, and encoding its thumbnail if one was
+                          requested, in seconds.
+    """
+    # Matplotlib is imported on first use to keep it off the startup path
+    import numpy as np
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+    from matplotlib.figure import Figure
+
+    started = time.perf_counter()
+    x, y, max_pos = spec["x"], spec["y"], spec["max_pos"]
+    max_x, max_y = x[[max_pos]], y[[max_pos]]
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+
+    is_datetime = np.issubdtype(x.dtype, np.datetime64)
+    grouped_bars = spec["chart_type"] == "bar" and y.ndim == 2
+    if is_datetime and not grouped_bars:
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+
+    if y.ndim == 2:
+        _draw_series(ax, x, y, spec["chart_type"], spec["series_labels"])
+    # Highlight the max value by drawing it over the grey series
+    elif spec["chart_type"] == "bar":
+        width = _date_bar_width(x) if is_datetime else 0.8
+        ax.bar(x, y, width=width, color="grey")
+        ax.bar(max_x, max_y, width=width, color="red")
+    elif spec["chart_type"] == "line":
+        ax.plot(x, y, color="grey")
+        ax.scatter(max_x, max_y, color="red", zorder=5)
+    else:
+        ax.scatter(x, y, color="grey")
+        ax.scatter(max_x, max_y, color="red", zorder=5)
+
+    ax.set_xlabel(spec["x_label"])
+    ax.set_ylabel(spec["y_label"])
+    ax.set_title(spec["title"])
+    ax.grid(True)
+    drawn = time.perf_counter()
+    fig.tight_layout()
+    laid_out = time.perf_counter()
+    if on_encode is not None:
+        on_encode()
+    output_format = spec.get("format", "png")
+    dpi = spec.get("dpi") or DEFAULT_DPI
+    if output_format == "png8":
+        _save_palette_png(fig, spec["output_path"], dpi)
+    else:
+        # SVG files otherwise embed their creation date, and the same chart
+        # must always produce the same bytes because it is served with a
+        # strong ETag
+        metadata = {"Date": None} if output_format == "svg" else None
+        fig.savefig(
+            spec["output_path"],
+            format=output_format,
+            dpi=dpi,
+            metadata=metadata,
+        )
+    encoded = time.perf_counter()
+    timings = {
+        "draw": drawn - started,
+        "layout": laid_out - drawn,
+        "encode": encoded - laid_out,
+    }
+    if spec.get("thumbnail_path"):
+        _save_palette_png(fig, spec["thumbnail_path"], THUMBNAIL_DPI)
+        timings["thumbnail"] = time.perf_counter() - encoded
+    return timings
+
+
+def _draw_series(
+    ax: Any,
+    x: "np.ndarray",
+    y: "np.ndarray",
+    chart_type: str,
+    labels: List[str],
+) -> None:
+    """
+    Draws several series sharing their X values in the default color
+    cycle, with a legend, and outlines the maximum of each in black. Bars
+    of the same X value are placed side by side.
+
+    Args:
+        ax (Any): The Matplotlib axes to draw on.
+        x (np.ndarray): The X values.
+        y (np.ndarray): The Y values, with one column per series.
+        chart_type (str): The type of chart ('bar', 'line', 'scatter').
+        labels (List[str]): The name of each series.
+    """
+    import numpy as np
+
+    count = y.shape[1]
+    peaks = np.argmax(y, axis=0)
+    if chart_type == "bar":
+        positions = np.arange(len(x))
+        width = 0.8 / count
+        for i in range(count):
+            offset = (i - (count - 1) / 2) * width
+            bars = ax.bar(positions + offset, y[:, i], width, label=labels[i])
+            bars[peaks[i]].set_edgecolor("black")
+            bars[peaks[i]].set_linewidth(2)
+        if np.issubdtype(x.dtype, np.datetime64):
+            names = np.datetime_as_string(x, unit="m")
+        else:
+            names = x.astype(str)
+        ax.set_xticks(positions, names)
+        if len(x) > 10:
+            ax.tick_params(axis="x", labelrotation=45)
+    else:
+        for i in range(count):
+            if chart_type == "line":
+                color = ax.plot(x, y[:, i], label=labels[i])[0].get_color()
+            else:
+                points = ax.scatter(x, y[:, i], s=12, label=labels[i])
+                color = points.get_facecolor()[0]
+            ax.scatter(
+                x[[peaks[i]]],
+                y[[peaks[i]], i],
+                color=color,
+                edgecolors="black",
+                zorder=5,
+            )
+    ax.legend()
+
+
+def _date_bar_width(x: "np.ndarray") -> float:
+    """
+    Sizes bars placed on a date axis, whose units are days, to leave a gap
+    between neighbouring bars.
+
+    Args:
+        x (np.ndarray): The datetime64 bar positions.
+
+    Returns:
+        float: The bar width in days.
+    """
+    import numpy as np
+
+    gaps = np.diff(np.unique(x)) / np.timedelta64(1, "D")
+    return 0.8 * float(gaps.min()) if len(gaps) else 0.8
+
+
+def _save_palette_png(fig: Any, output_path: str, dpi: int) -> None:
+    """
+    Saves a figure as a PNG with a 256-colour palette, which is several
+    times smaller than a true-colour PNG for flat chart graphics.
+
+    Args:
+        fig (Figure): The figure to save.
+        output_path (str): Where to write the image.
+        dpi (int): The resolution in dots per inch.
+    """
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    buffer.seek(0)
+    with Image.open(buffer) as image:
+        palette = image.convert("RGB").quantize(
+            colors=256, method=Image.Quantize.FASTOCTREE
+        )
+    palette.save(output_path, format="png", optimize=True)
+
+
+def warm_up_renderer() -> None:
+    """
+    Renders a throwaway chart so that fonts and text layout caches are
+    built before the first real request.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(2, 2))
+    ax = fig.subplots()
+    ax.plot([0, 1], [0, 1])
+    ax.set_title("warm-up")
+    fig.savefig(io.BytesIO(), format="png")
+
+
+def _init_worker(task_slots: Any) -> None:
+    """
+    Prepares a worker process of the render pool.
+
+    Args:
+        task_slots (TaskSlots): The slots shared with the pool.
+    """
+    global _task_slots
+
+    _task_slots = task_slots
+    warm_up_renderer()
+
+
+def _render_task(
+    task_id: int, spec: Dict[str, Any]
+) -> Optional[Dict[str, float]]:
+    """
+    Renders a chart in a worker process after recording which process runs
+    it, so that the task can be stopped without affecting the others.
+
+    Args:
+        task_id (int): The id of the task within its pool.
+        spec (Dict[str, Any]): The chart description passed to
+                               render_chart.
+
+    Returns:
+        Optional[Dict[str, float]]: The stage timings reported by
+                                    render_chart, or None if the task was
+                                    abandoned before it started.
+    """
+    if _task_slots is not None:
+        _task_slots.start(task_id, os.getpid())
+        if _task_slots.is_abandoned(task_id):
+            return None
+    return render_chart(spec)
+
+
+class TaskSlots:
+    """
+    Lock-free shared memory in which pool workers record the task they
+    run, so that a stuck render can be stopped by killing its worker alone.
+    Each value is written by a single process, and a task's process id is
+    written before its task id so that readers never pair a task with
+    another task's worker.
+    """
+
+    def __init__(self, context: Any, size: int = _TASK_SLOTS) -> None:
+        """
+        Allocates the slots.
+
+        Args:
+            context (multiprocessing.context.BaseContext): The context the
+                                                           workers use.
+            size (int): The number of slots.
+        """
+        self.size = size
+        self.task_ids = context.RawArray("q", [-1] * size)
+        self.pids = context.RawArray("q", size)
+        self.abandoned = context.RawArray("q", [-1] * size)
+
+    def start(self, task_id: int, pid: int) -> None:
+        """
+        Records that a worker has started a task.
+
+        Args:
+            task_id (int): The task id.
+            pid (int): The process id of the worker.
+        """
+        slot = task_id % self.size
+        self.pids[slot] = pid
+        self.task_ids[slot] = task_id
+
+    def worker_of(self, task_id: int) -> Optional[int]:
+        """
+        Returns the worker running a task.
+
+        Args:
+            task_id (int): The task id.
+
+        Returns:
+            Optional[int]: The process id, or None if the task has not
+                           started.
+        """
+        slot = task_id % self.size
+        pid = self.pids[slot]
+        return pid if self.task_ids[slot] == task_id else None
+
+    def abandon(self, task_id: int) -> None:
+        """
+        Marks a task so that it is skipped if it has not started yet.
+
+        Args:
+            task_id (int): The task id.
+        """
+        self.abandoned[task_id % self.size] = task_id
+
+    def is_abandoned(self, task_id: int) -> bool:
+        """
+        Tells whether a task has been abandoned.
+
+        Args:
+            task_id (int): The task id.
+
+        Returns:
+            bool: True if the task was abandoned.
+        """
+        return self.abandoned[task_id % self.size] == task_id
+
+
+class RenderPool:
+    """
+    Pool of pre-warmed worker processes that render charts with timeouts.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        max_tasks_per_worker: int = DEFAULT_MAX_TASKS_PER_WORKER,
+    ) -> None:
+        """
+        Initializes the pool settings. Worker processes start on first use.
+
+        Args:
+            processes (int): The number of worker processes.
+            max_tasks_per_worker (int): The number of renders after which a
+                worker is replaced to cap Matplotlib memory growth.
+        """
+        self.processes = processes
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._pool: Optional[Pool] = None
+        self._slots: Optional[TaskSlots] = None
+        self._task_ids = itertools.count()
+        self._killed_pids: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the worker processes if they are not running yet.
+        """
+        with self._lock:
+            self._ensure_pool()
+
+    def render(
+        self,
+        spec: Dict[str, Any],
+        timeout: float = DEFAULT_RENDER_TIMEOUT,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Dict[str, float]:
+        """
+        Renders a chart in a worker process and waits for it to finish.
+
+        A render that times out or is cancelled cannot be interrupted inside
+        its worker, so that worker alone is killed and the pool replaces
+        it. A render that had just been handed to the killed worker is
+        submitted again.
+
+        Args:
+            spec (Dict[str, Any]): The chart description passed to
+                                   render_chart.
+            timeout (float): The maximum time to wait, in seconds.
+            cancel_event (Optional[threading.Event]): When set, the render
+                                                      is abandoned.
+
+        Returns:
+            Dict[str, float]: The stage timings reported by render_chart.
+
+        Raises:
+            RenderTimeoutError: If the render exceeds the timeout.
+            RenderCancelledError: If the render is cancelled.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pool = self._ensure_pool()
+                slots = self._slots
+                task_id = next(self._task_ids)
+            assert slots is not None
+            result = pool.apply_async(_render_task, (task_id, spec))
+            if self._wait(
+                slots, task_id, result, deadline, timeout, cancel_event
+            ):
+                # Re-raises any exception raised by the worker
+                timings = result.get()
+                assert timings is not None
+                return timings
+
+    def shutdown(self) -> None:
+        """
+        Stops all worker processes.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+                self._slots = None
+
+    def _wait(
+        self,
+        slots: TaskSlots,
+        task_id: int,
+        result: AsyncResult,
+        deadline: float,
+        timeout: float,
+        cancel_event: Optional[threading.Event],
+    ) -> bool:
+        """
+        Waits for a task, stopping it if it is cancelled or too slow.
+
+        Args:
+            slots (TaskSlots): The slots of the pool running the task.
+            task_id (int): The task id.
+            result (AsyncResult): The pending result of the task.
+            deadline (float): The monotonic time at which the render fails.
+            timeout (float): The timeout of the render, in seconds.
+            cancel_event (Optional[threading.Event]): When set, the render
+                                                      is abandoned.
+
+        Returns:
+            bool: True once the task has finished, False if its worker was
+                  killed to stop another task.
+
+        Raises:
+            RenderTimeoutError: If the deadline passes.
+            RenderCancelledError: If the render is cancelled.
+        """
+        while not result.ready():
+            if cancel_event is not None and cancel_event.is_set():
+                self._abandon(slots, task_id)
+                raise RenderCancelledError("The render was cancelled.")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._abandon(slots, task_id)
+                raise RenderTimeoutError(
+                    f"Rendering took longer than {timeout:g} seconds."
+                )
+            with self._lock:
+                if slots.worker_of(task_id) in self._killed_pids:
+                    return False
+            result.wait(min(_POLL_INTERVAL, remaining))
+        return True
+
+    def _abandon(self, slots: TaskSlots, task_id: int) -> None:
+        """
+        Stops a task: it is skipped if it has not started, and its worker
+        is killed if it has. The pool replaces killed workers.
+
+        Args:
+            slots (TaskSlots): The slots of the pool running the task.
+            task_id (int): The task id.
+        """
+        slots.abandon(task_id)
+        pid = slots.worker_of(task_id)
+        if pid is None:
+            return
+        with self._lock:
+            self._killed_pids.add(pid)
+        try:
+            os.kill(pid, _KILL_SIGNAL)
+        except OSError:
+            pass
+
+    def _ensure_pool(self) -> Pool:
+        """
+        Returns the running pool, starting it if needed. The lock must be
+        held by the caller.
+
+        Returns:
+            Pool: The worker pool.
+        """
+        if self._pool is None:
+            # Workers are spawned rather than forked because the web server
+            # may already be running threads
+            context = multiprocessing.get_context("spawn")
+            self._slots = TaskSlots(context)
+            self._pool = context.Pool(
+                processes=self.processes,
+                initializer=_init_worker,
+                initargs=(self._slots,),
+                maxtasksperchild=self.max_tasks_per_worker,
+            )
+        return self._pool
+
+
+_render_pool: Optional[RenderPool] = None
+_render_pool_lock = threading.Lock()
+
+
+def setup_render_pool(
+    processes: int,
+    max_tasks_per_worker: int = DEFAULT_MAX_TASKS_PER_WORKER,
+) -> None:
+    """
+    Creates the process-wide render pool. A pool size of zero disables the
+    pool so that charts are rendered in the request thread.
+
+    Worker processes are started by the first render rather than here:
+    spawned workers re-import the main module, which may itself call
+    create_app.
+
+    Args:
+        processes (int): The number of worker processes.
+        max_tasks_per_worker (int): The number of renders after which a
+                                    worker is replaced.
+    """
+    global _render_pool
+
+    with _render_pool_lock:
+        if _render_pool is not None or processes <= 0:
+            return
+        _render_pool = RenderPool(processes, max_tasks_per_worker)
+        atexit.register(_render_pool.shutdown)
+
+
+def get_render_pool() -> Optional[RenderPool]:
+    """
+    Returns the process-wide render pool.
+
+    Returns:
+        Optional[RenderPool]: The pool, or None if rendering is in-process.
+    """
+    return _render_pool
@@ -0,0 +1,205 @@
+"""
+Encodes prepared chart series for drawing in the browser, as JSON or as a
+compact binary payload of typed arrays.
+"""
+
+import hashlib
+import json
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from flask import current_app
+
+from app.services.downsampling_service import (
+    DEFAULT_BAR_LIMIT,
+    DEFAULT_POINT_BUDGET,
+    DownsampledSeries,
+)
+from app.services.file_service import get_file_hash
+
+SERIES_FORMAT_VERSION = 2
+SERIES_MAGIC = b"CSVS"
+SERIES_MIMETYPE = "application/vnd.csvviz.series"
+
+
+def series_key(
+    file_path: str,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+    aggregation: str = "none",
+    time_bucket: str = "none",
+) -> str:
+    """
+    Derives a key that changes whenever the series of a chart would.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        x_axis (str): The column used for the X-axis.
+        y_axis (str | List[str]): The column, or columns, used for the
+                                  Y-axis.
+        chart_type (str): The type of chart.
+        aggregation (str): How rows sharing an X value are combined.
+        time_bucket (str): The period dates on the X-axis are grouped by.
+
+    Returns:
+        str: The hexadecimal series key.
+    """
+    parts = [
+        SERIES_FORMAT_VERSION,
+        get_file_hash(file_path),
+        x_axis,
+        y_axis,
+        chart_type,
+        aggregation,
+        time_bucket,
+        current_app.config.get("CHART_POINT_BUDGET", DEFAULT_POINT_BUDGET),
+        current_app.config.get("CHART_BAR_LIMIT", DEFAULT_BAR_LIMIT),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def series_header(
+    series: DownsampledSeries,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+) -> Dict[str, Any]:
+    """
+    Describes a series and how its X values are encoded. Numeric X values
+    are sent as numbers, dates as milliseconds since the epoch and anything
+    else as category labels. 'y_labels' names each series of Y values.
+
+    Args:
+        series (DownsampledSeries): The prepared series.
+        x_axis (str): The column used for the X-axis.
+        y_axis (str | List[str]): The label of the Y-axis, or of each
+                                  series.
+        chart_type (str): The type of chart.
+
+    Returns:
+        Dict[str, Any]: The series metadata.
+    """
+    y_labels = [y_axis] if isinstance(y_axis, str) else list(y_axis)
+    header: Dict[str, Any] = {
+        "version": SERIES_FORMAT_VERSION,
+        "chart_type": chart_type,
+        "x_label": x_axis,
+        "y_label": ", ".join(y_labels),
+        "y_labels": y_labels,
+        "length": len(series.y),
+        "max_index": series.max_pos,
+        "decimated": series.decimated,
+        "method": series.method,
+        "original_points": series.original_points,
+        "x_type": _x_type(series.x),
+    }
+    if header["x_type"] == "category":
+        header["categories"] = [str(value) for value in series.x]
+    return header
+
+
+def encode_series_json(
+    series: DownsampledSeries,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+) -> Dict[str, Any]:
+    """
+    Encodes a series as a JSON-serializable dictionary.
+    With several series, 'y' holds a list of values for each.
+
+    Args:
+        series (DownsampledSeries): The prepared series.
+        x_axis (str): The column used for the X-axis.
+        y_axis (str | List[str]): The label of the Y-axis, or of each
+                                  series.
+        chart_type (str): The type of chart.
+
+    Returns:
+        Dict[str, Any]: The series metadata with 'x' and 'y' value lists.
+    """
+    header = series_header(series, x_axis, y_axis, chart_type)
+    x_values = _x_values(series.x, header["x_type"])
+    return {
+        **header,
+        "x": x_values.tolist() if x_values is not None else None,
+        "y": np.asarray(series.y, dtype=np.float64).T.tolist(),
+    }
+
+
+def encode_series_binary(
+    series: DownsampledSeries,
+    x_axis: str,
+    y_axis: str | List[str],
+    chart_type: str,
+) -> bytes:
+    """
+    Encodes a series as the magic bytes 'CSVS', the length of a JSON header
+    as a little-endian uint32, the header padded with spaces to a multiple
+    of 8 bytes, then the Y values of each series in turn and, unless X is
+    categorical, the X values as little-endian float64 arrays ready for a
+    Float64Array.
+
+    Args:
+        series (DownsampledSeries): The prepared series.
+        x_axis (str): The column used for the X-axis.
+        y_axis (str | List[str]): The label of the Y-axis, or of each
+                                  series.
+        chart_type (str): The type of chart.
+
+    Returns:
+        bytes: The encoded series.
+    """
+    header = series_header(series, x_axis, y_axis, chart_type)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    padding = -(len(SERIES_MAGIC) + 4 + len(header_bytes)) % 8
+    header_bytes += b" " * padding
+
+    parts: List[bytes] = [
+        SERIES_MAGIC,
+        struct.pack("<I", len(header_bytes)),
+        header_bytes,
+        np.asarray(series.y, dtype="<f8").T.tobytes(),
+    ]
+    x_values = _x_values(series.x, header["x_type"])
+    if x_values is not None:
+        parts.append(x_values.astype("<f8").tobytes())
+    return b"".join(parts)
+
+
+def _x_type(x: np.ndarray) -> str:
+    """
+    Classifies X values for encoding.
+
+    Args:
+        x (np.ndarray): The X values.
+
+    Returns:
+        str: 'datetime', 'number' or 'category'.
+    """
+    if np.issubdtype(x.dtype, np.datetime64):
+        return "datetime"
+    if np.issubdtype(x.dtype, np.number) or x.dtype == np.bool_:
+        return "number"
+    return "category"
+
+
+def _x_values(x: np.ndarray, x_type: str) -> Optional[np.ndarray]:
+    """
+    Converts X values to float64 for encoding.
+
+    Args:
+        x (np.ndarray): The X values.
+        x_type (str): Their classification from _x_type.
+
+    Returns:
+        Optional[np.ndarray]: The values, or None for categories, which are
+                              sent as labels in the header.
+    """
+    if x_type == "datetime":
+        return x.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+    if x_type == "number":
+        return x.astype(np.float64)
+    return None
@@ -0,0 +1,510 @@
+"""
+Keeps session data on the server so that the cookie only carries an id.
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Flask, Request, Response, session
+from flask.sessions import (
+    SessionInterface,
+    SessionMixin,
+    session_json_serializer,
+)
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from app.services.sqlite_service import Transaction, connect
+
+# Minimum time between last-access updates of an unmodified session
+TOUCH_INTERVAL_SECONDS = 60
+
+
+class SessionStore(ABC):
+    """
+    Base class for server-side session storage backends.
+    """
+
+    @abstractmethod
+    def load(self, sid: str) -> Optional[Tuple[str, float]]:
+        """
+        Loads a stored session.
+
+        Args:
+            sid (str): The session id.
+
+        Returns:
+            Optional[Tuple[str, float]]: The serialized data and the time of
+                                         last access, or None if absent.
+        """
+
+    @abstractmethod
+    def save(self, sid: str, payload: str) -> None:
+        """
+        Stores a session and marks it as accessed now.
+
+        Args:
+            sid (str): The session id.
+            payload (str): The serialized session data.
+        """
+
+    @abstractmethod
+    def touch(self, sid: str) -> None:
+        """
+        Marks a session as accessed now without changing its data.
+
+        Args:
+            sid (str): The session id.
+        """
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        """
+        Removes a session.
+
+        Args:
+            sid (str): The session id.
+        """
+
+    @abstractmethod
+    def delete_expired(self, cutoff: float, limit: int) -> int:
+        """
+        Removes up to a given number of sessions last accessed before a
+        given time.
+
+        Args:
+            cutoff (float): The expiry time.
+            limit (int): The maximum number of sessions removed.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Stores sessions in a SQLite database indexed by session id.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        """
+        Initializes the store. The sessions table is created when the
+        database is first used.
+
+        Args:
+            db_path (Path): The path to the database file.
+        """
+        self.db_path = db_path
+
+    def load(self, sid: str) -> Optional[Tuple[str, float]]:
+        """
+        Reads a session row.
+
+        Args:
+            sid (str): The session id.
+
+        Returns:
+            Optional[Tuple[str, float]]: The serialized data and the time of
+                                         last access, or None if absent.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, accessed_at FROM sessions WHERE sid = ?", (sid,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save(self, sid: str, payload: str) -> None:
+        """
+        Inserts or replaces a session row, stamped with the current time.
+
+        Args:
+            sid (str): The session id.
+            payload (str): The serialized session data.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (sid, data, accessed_at)"
+                " VALUES (?, ?, ?)"
+                " ON CONFLICT(sid) DO UPDATE SET"
+                " data = excluded.data, accessed_at = excluded.accessed_at",
+                (sid, payload, time.time()),
+            )
+
+    def touch(self, sid: str) -> None:
+        """
+        Updates the last-access time of a session row.
+
+        Args:
+            sid (str): The session id.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sessions SET accessed_at = ? WHERE sid = ?",
+                (time.time(), sid),
+            )
+
+    def delete(self, sid: str) -> None:
+        """
+        Deletes a session row.
+
+        Args:
+            sid (str): The session id.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def delete_expired(self, cutoff: float, limit: int) -> int:
+        """
+        Deletes the oldest session rows last accessed before a given time.
+
+        Args:
+            cutoff (float): The expiry time.
+            limit (int): The maximum number of sessions removed.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM sessions WHERE sid IN ("
+                " SELECT sid FROM sessions WHERE accessed_at < ?"
+                " ORDER BY accessed_at LIMIT ?)",
+                (cutoff, limit),
+            ).rowcount
+
+    def _connect(self) -> Transaction:
+        """
+        Opens a connection for a single transaction. Connections are not
+        shared so that the store can be used from any thread.
+
+        Returns:
+            Transaction: A context manager yielding the connection.
+        """
+        return connect(self.db_path, _create_schema)
+
+
+class FileSessionStore(SessionStore):
+    """
+    Stores each session as a JSON file named after its id.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        """
+        Creates the sessions directory if needed.
+
+        Args:
+            directory (Path): The directory holding the session files.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, sid: str) -> Optional[Tuple[str, float]]:
+        """
+        Reads a session file. Its modification time is the time of last
+        access.
+
+        Args:
+            sid (str): The session id.
+
+        Returns:
+            Optional[Tuple[str, float]]: The serialized data and the time of
+                                         last access, or None if absent.
+        """
+        path = self.directory / sid
+        try:
+            return path.read_text(encoding="utf-8"), path.stat().st_mtime
+        except OSError:
+            return None
+
+    def save(self, sid: str, payload: str) -> None:
+        """
+        Writes a session file through a temporary file, so that readers
+        never see a partial write.
+
+        Args:
+            sid (str): The session id.
+            payload (str): The serialized session data.
+        """
+        path = self.directory / sid
+        tmp_path = path.with_name(f"{sid}.{secrets.token_hex(4)}.tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def touch(self, sid: str) -> None:
+        """
+        Updates the modification time of a session file.
+
+        Args:
+            sid (str): The session id.
+        """
+        try:
+            os.utime(self.directory / sid)
+        except OSError:
+            pass
+
+    def delete(self, sid: str) -> None:
+        """
+        Deletes a session file if it exists.
+
+        Args:
+            sid (str): The session id.
+        """
+        try:
+            os.remove(self.directory / sid)
+        except OSError:
+            pass
+
+    def delete_expired(self, cutoff: float, limit: int) -> int:
+        """
+        Deletes session files last modified before a given time. Files are
+        visited in directory order rather than oldest first.
+
+        Args:
+            cutoff (float): The expiry time.
+            limit (int): The maximum number of sessions removed.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        deleted = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if deleted >= limit:
+                    break
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        deleted += 1
+                except OSError:
+                    continue
+        return deleted
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Creates the sessions table and its index.
+
+    Args:
+        conn (sqlite3.Connection): The open connection.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " sid TEXT PRIMARY KEY,"
+        " data TEXT NOT NULL,"
+        " accessed_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS sessions_accessed_at"
+        " ON sessions (accessed_at)"
+    )
+
+
+# Storage backends by SESSION_STORE name, with the store class and its
+# file or directory name in the instance folder
+SESSION_BACKENDS: Dict[str, Tuple[Callable[[Path], SessionStore], str]] = {
+    "sqlite": (SqliteSessionStore, "sessions.db"),
+    "filesystem": (FileSessionStore, "sessions"),
+}
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    Session whose data is kept in a SessionStore.
+    """
+
+    accessed = False
+
+    def __init__(
+        self,
+        initial: Optional[Dict[str, Any]] = None,
+        sid: Optional[str] = None,
+        accessed_at: float = 0.0,
+    ) -> None:
+        """
+        Initializes the session.
+
+        Args:
+            initial (Optional[Dict[str, Any]]): The stored session data.
+            sid (Optional[str]): The session id; a new one is generated when
+                                 omitted.
+            accessed_at (float): When the stored session was last accessed.
+        """
+
+        def on_update(self: "ServerSideSession") -> None:
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.new = sid is None
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.previous_sid: Optional[str] = None
+        self.accessed_at = accessed_at
+        self.modified = False
+
+    def __getitem__(self, key: str) -> Any:
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def regenerate(self) -> None:
+        """
+        Moves the session data to a new session id. The record under the
+        old id is deleted when the session is saved, so an id captured
+        before a login or logout cannot be used afterwards.
+        """
+        if self.previous_sid is None and not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+        self.accessed = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Session interface that stores session data server-side and puts only
+    a signed session id in the cookie.
+    """
+
+    def __init__(self, backend: str = "sqlite") -> None:
+        """
+        Initializes the interface.
+
+        Args:
+            backend (str): The storage backend, 'sqlite' or 'filesystem'.
+
+        Raises:
+            ValueError: If the backend is not known.
+        """
+        if backend not in SESSION_BACKENDS:
+            raise ValueError(
+                f"Unknown session store {backend!r}; expected one of"
+                f" {', '.join(SESSION_BACKENDS)}."
+            )
+        self.backend = backend
+        self._stores: Dict[str, SessionStore] = {}
+        self._lock = threading.Lock()
+
+    def get_store(self, app: Flask) -> SessionStore:
+        """
+        Returns the store for an application, creating it on first use. The
+        store lives in the instance folder, which tests may change after the
+        application is created.
+
+        Args:
+            app (Flask): The application.
+
+        Returns:
+            SessionStore: The session store.
+        """
+        instance_path = app.instance_path
+        with self._lock:
+            store = self._stores.get(instance_path)
+            if store is None:
+                store_class, name = SESSION_BACKENDS[self.backend]
+                store = store_class(Path(instance_path) / name)
+                self._stores[instance_path] = store
+            return store
+
+    def open_session(
+        self, app: Flask, request: Request
+    ) -> Optional[ServerSideSession]:
+        signer = self._get_signer(app)
+        if signer is None:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = signer.unsign(cookie).decode("utf-8")
+            except BadSignature:
+                sid = None
+            if sid:
+                stored = self.get_store(app).load(sid)
+                if stored is not None:
+                    payload, accessed_at = stored
+                    try:
+                        data = session_json_serializer.loads(payload)
+                    except ValueError:
+                        data = {}
+                    return ServerSideSession(data, sid, accessed_at)
+        return ServerSideSession()
+
+    def save_session(
+        self, app: Flask, session: SessionMixin, response: Response
+    ) -> None:
+        assert isinstance(session, ServerSideSession)
+        store = self.get_store(app)
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.previous_sid is not None:
+            store.delete(session.previous_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.vary.add("Cookie")
+            return
+
+        if session.modified or session.new:
+            store.save(session.sid, session_json_serializer.dumps(session))
+        elif time.time() - session.accessed_at > TOUCH_INTERVAL_SECONDS:
+            store.touch(session.sid)
+
+        if not (session.new or self.should_set_cookie(app, session)):
+            return
+
+        signer = self._get_signer(app)
+        assert signer is not None
+        response.set_cookie(
+            name,
+            signer.sign(session.sid).decode("utf-8"),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            partitioned=self.get_cookie_partitioned(app),
+        )
+
+    def _get_signer(self, app: Flask) -> Optional[Signer]:
+        """
+        Returns the signer used to protect session ids in cookies.
+
+        Args:
+            app (Flask): The application.
+
+        Returns:
+            Optional[Signer]: The signer, or None without a secret key.
+        """
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt="server-side-session")
+
+
+def regenerate_session() -> None:
+    """
+    Gives the current session a new id, keeping its data. Cookie sessions
+    have no server-side record to replace and are left as they are.
+    """
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
@@ -0,0 +1,93 @@
+"""
+Opens the application's SQLite databases, one short transaction per
+connection, creating their schema the first time each is used.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Optional
+
+DEFAULT_TIMEOUT_SECONDS = 10
+
+_initialized_dbs: set = set()
+_initialized_dbs_lock = threading.Lock()
+
+
+class Transaction:
+    """
+    Context manager that opens a connection in a transaction, commits it on
+    success or rolls it back on error, and always closes the connection.
+    Connections are not shared so that databases can be used from any
+    thread.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        immediate: bool = False,
+    ) -> None:
+        """
+        Initializes the transaction without opening it.
+
+        Args:
+            db_path (Path): The path to the database file.
+            timeout (float): How long to wait for a locked database, in
+                             seconds.
+            immediate (bool): Whether to take the write lock when the
+                              transaction begins, so that concurrent
+                              writers in any process are serialized.
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self.immediate = immediate
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn = sqlite3.connect(
+            self.db_path, timeout=self.timeout, isolation_level=None
+        )
+        self.conn.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type: Optional[type], *exc_info: object) -> None:
+        with closing(self.conn):
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def connect(
+    db_path: Path,
+    create_schema: Callable[[sqlite3.Connection], None],
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    immediate: bool = False,
+) -> Transaction:
+    """
+    Opens a database in a transaction. The first time a database is used
+    by the process, its directory is created, it is switched to WAL mode
+    and its schema is created.
+
+    Args:
+        db_path (Path): The path to the database file.
+        create_schema (Callable[[sqlite3.Connection], None]): Creates the
+            tables of the database if they do not exist; it runs in a
+            transaction of its own.
+        timeout (float): How long to wait for a locked database, in
+                         seconds.
+        immediate (bool): Whether to take the write lock when the
+                          transaction begins.
+
+    Returns:
+        Transaction: A context manager yielding the connection.
+    """
+    key = str(db_path)
+    with _initialized_dbs_lock:
+        if key not in _initialized_dbs:
+            os.makedirs(db_path.parent, exist_ok=True)
+            with closing(sqlite3.connect(db_path, timeout=timeout)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    create_schema(conn)
+            _initialized_dbs.add(key)
+    return Transaction(db_path, timeout, immediate)
@@ -0,0 +1,123 @@
+"""
+Measures application startup and warms up slow-to-initialize components
+in the background once the application is ready to serve.
+"""
+
+import multiprocessing
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import Flask, Response
+
+from app.services.metrics_service import observe_stage
+
+# Startup durations of the current process in seconds, by stage
+_startup_timings: Dict[str, float] = {}
+_prewarm_thread: Optional[threading.Thread] = None
+_prewarm_lock = threading.Lock()
+
+
+def track_startup(app: Flask, started: float) -> None:
+    """
+    Records how long the application took to be created and, once, how
+    long it took until its first response was ready.
+
+    Args:
+        app (Flask): The newly created application.
+        started (float): The time.perf_counter() value when creation began.
+    """
+    _record(app, "startup_create_app", time.perf_counter() - started)
+    first_response_recorded = False
+
+    def record_first_response(response: Response) -> Response:
+        nonlocal first_response_recorded
+        if not first_response_recorded:
+            first_response_recorded = True
+            _record(
+                app, "startup_first_response", time.perf_counter() - started
+            )
+        return response
+
+    app.after_request(record_first_response)
+
+
+def start_prewarm(app: Flask) -> Optional[threading.Thread]:
+    """
+    Imports pandas and Matplotlib, builds the font cache and starts the
+    render pool in a background thread, so that neither startup nor the
+    first requests pay for them. Nothing is started in worker processes
+    spawned by the render pool.
+
+    Args:
+        app (Flask): The application to warm up.
+
+    Returns:
+        Optional[threading.Thread]: The warm-up thread, if one was started.
+    """
+    global _prewarm_thread
+
+    if multiprocessing.parent_process() is not None:
+        return None
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(
+                target=_prewarm, args=(app,), name="prewarm", daemon=True
+            )
+            _prewarm_thread.start()
+        return _prewarm_thread
+
+
+def get_startup_timings() -> Dict[str, float]:
+    """
+    Returns the startup durations measured in the current process.
+
+    Returns:
+        Dict[str, float]: The durations in seconds, by stage.
+    """
+    return dict(_startup_timings)
+
+
+def _prewarm(app: Flask) -> None:
+    """
+    Runs the warm-up steps, logging rather than raising failures.
+
+    Args:
+        app (Flask): The application to warm up.
+    """
+    started = time.perf_counter()
+    try:
+        import pandas  # noqa: F401
+
+        from app.services import chart_service, job_service  # noqa: F401
+        from app.services.render_service import (
+            get_render_pool,
+            warm_up_renderer,
+        )
+
+        # Building the font cache here also saves spawned render workers
+        # from doing it, since Matplotlib keeps it on disk
+        warm_up_renderer()
+        pool = get_render_pool()
+        if pool is not None:
+            pool.start()
+    except Exception:
+        # Short-lived processes such as CLI commands may exit mid-warm-up
+        if threading.main_thread().is_alive():
+            app.logger.exception("Startup warm-up failed")
+        return
+    _record(app, "startup_prewarm", time.perf_counter() - started)
+
+
+def _record(app: Flask, stage: str, seconds: float) -> None:
+    """
+    Records a startup duration as a metric and in the application log.
+
+    Args:
+        app (Flask): The application being started.
+        stage (str): The stage name.
+        seconds (float): The duration in seconds.
+    """
+    _startup_timings[stage] = seconds
+    observe_stage(stage, seconds)
+    app.logger.info("%s took %.3f s", stage, seconds)
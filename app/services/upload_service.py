@@ -0,0 +1,252 @@
+"""
+Streams uploaded files to disk while hashing, measuring and checking them.
+"""
+
+import codecs
+import hashlib
+import io
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import IO, Any, Optional
+
+from flask import Request, current_app
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+
+DEFAULT_MAX_FILE_SIZE_MB = 10
+INCOMING_DIR_NAME = ".incoming"
+
+# Age after which a temporary upload file is assumed to be left over from an
+# interrupted request or a crashed worker
+INCOMING_MAX_AGE_SECONDS = 3600
+
+
+class StreamedUpload(io.BufferedRandom):
+    """
+    Temporary upload file that hashes, counts and UTF-8 checks the bytes as
+    they are written by the request parser.
+    """
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        """
+        Creates the temporary file.
+
+        Args:
+            path (Path): The location of the temporary file.
+            max_bytes (int): The maximum accepted file size in bytes.
+        """
+        super().__init__(io.FileIO(path, "w+b"))
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.moved = False
+        self._utf8_valid = True
+        self._utf8_finished = False
+        self._digest = hashlib.sha256()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def write(self, data: Any) -> int:
+        """
+        Writes a chunk of the upload, rejecting it once the size limit is
+        exceeded.
+
+        Args:
+            data (Any): The bytes-like chunk to write.
+
+        Returns:
+            int: The number of bytes written.
+
+        Raises:
+            RequestEntityTooLarge: If the upload exceeds the size limit.
+        """
+        chunk = bytes(data)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        self._digest.update(chunk)
+        if self._utf8_valid:
+            try:
+                self._decoder.decode(chunk)
+            except UnicodeDecodeError:
+                self._utf8_valid = False
+        return super().write(chunk)
+
+    @property
+    def is_utf8(self) -> bool:
+        """
+        Tells whether the complete upload is valid UTF-8.
+
+        Returns:
+            bool: True if every byte written decodes as UTF-8.
+        """
+        if self._utf8_valid and not self._utf8_finished:
+            self._utf8_finished = True
+            try:
+                # Detects a multi-byte sequence cut off at the end
+                self._decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                self._utf8_valid = False
+        return self._utf8_valid
+
+    @property
+    def sha256(self) -> str:
+        """
+        Returns the hash of the bytes written so far.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest.
+        """
+        return self._digest.hexdigest()
+
+    def move_to(self, destination: Path) -> None:
+        """
+        Closes the temporary file and moves it to its final location without
+        copying its contents.
+
+        Args:
+            destination (Path): The final path of the file.
+        """
+        self.flush()
+        self.moved = True
+        super().close()
+        os.replace(self.path, destination)
+
+    def close(self) -> None:
+        """
+        Closes the file and deletes it unless it has been moved.
+        """
+        super().close()
+        if not self.moved:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class StreamingUploadRequest(Request):
+    """
+    Request that spools uploaded files into the instance folder through
+    StreamedUpload instead of an in-memory buffer.
+    """
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None,
+    ) -> IO[bytes]:
+        """
+        Creates the stream that receives an uploaded file.
+
+        Args:
+            total_content_length (Optional[int]): The request body size.
+            content_type (Optional[str]): The file's content type.
+            filename (Optional[str]): The file's name.
+            content_length (Optional[int]): The file's size, if known.
+
+        Returns:
+            IO[bytes]: The stream to write the file into.
+        """
+        incoming_dir = get_incoming_dir()
+        os.makedirs(incoming_dir, exist_ok=True)
+        return StreamedUpload(
+            incoming_dir / uuid.uuid4().hex, get_max_upload_bytes()
+        )
+
+
+def get_incoming_dir() -> Path:
+    """
+    Returns the directory where uploads are spooled while they arrive.
+
+    Returns:
+        Path: The path to the incoming uploads directory.
+    """
+    return Path(current_app.instance_path) / "uploads" / INCOMING_DIR_NAME
+
+
+def sweep_incoming_uploads(
+    max_age_seconds: float = INCOMING_MAX_AGE_SECONDS,
+) -> int:
+    """
+    Deletes temporary upload files that have not been written to for a
+    while. Files are normally removed when their request ends, but survive
+    a worker that is killed mid-upload.
+
+    Args:
+        max_age_seconds (float): The age after which a file is deleted.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    cutoff = time.time() - max_age_seconds
+    deleted = 0
+    try:
+        entries = list(os.scandir(get_incoming_dir()))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                deleted += 1
+        except OSError:
+            continue
+    return deleted
+
+
+def get_max_upload_bytes() -> int:
+    """
+    Returns the configured maximum size of an uploaded file.
+
+    Returns:
+        int: The limit in bytes.
+    """
+    max_mb = current_app.config.get(
+        "MAX_FILE_SIZE_MB", DEFAULT_MAX_FILE_SIZE_MB
+    )
+    return int(max_mb * 1024 * 1024)
+
+
+def is_utf8_upload(file: FileStorage) -> bool:
+    """
+    Tells whether an uploaded file was valid UTF-8 while it was streamed.
+
+    Args:
+        file (FileStorage): The uploaded file.
+
+    Returns:
+        bool: False if invalid UTF-8 was seen, True otherwise.
+    """
+    if isinstance(file.stream, StreamedUpload):
+        return file.stream.is_utf8
+    return True
+
+
+def store_upload(file: FileStorage, destination: Path) -> str:
+    """
+    Stores an uploaded file at its destination and returns its hash. Files
+    streamed by StreamingUploadRequest are moved into place; other streams
+    are copied and hashed in a single pass.
+
+    Args:
+        file (FileStorage): The uploaded file.
+        destination (Path): The final path of the file.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the file.
+    """
+    stream = file.stream
+    if isinstance(stream, StreamedUpload) and not stream.closed:
+        stream.move_to(destination)
+        return stream.sha256
+
+    digest = hashlib.sha256()
+    stream.seek(0)
+    with open(destination, "wb") as f:
+        for chunk in iter(lambda: stream.read(64 * 1024), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,151 @@
+"""
+Generates synthetic CSV files for benchmarks.
+"""
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Rows generated and written at a time, which bounds memory use for the
+# largest files
+CHUNK_ROWS = 500_000
+
+DEFAULT_SIZES = (1_000, 100_000)
+ALL_SIZES = (1_000, 100_000, 1_000_000, 10_000_000)
+
+
+@dataclass(frozen=True)
+class DatasetProfile:
+    """
+    Describes the shape of a synthetic dataset independently of its size.
+    """
+
+    name: str
+    numeric_columns: int
+    text_columns: int
+    nan_density: float
+    # Number of distinct categories; 0 makes every row its own category
+    cardinality: int
+
+
+PROFILES: Dict[str, DatasetProfile] = {
+    profile.name: profile
+    for profile in (
+        DatasetProfile("narrow", 2, 1, 0.0, 50),
+        DatasetProfile("wide", 16, 4, 0.05, 1_000),
+        DatasetProfile("sparse", 4, 1, 0.3, 10),
+        DatasetProfile("high_cardinality", 2, 1, 0.0, 0),
+    )
+}
+
+
+def dataset_path(data_dir: Path, profile: DatasetProfile, rows: int) -> Path:
+    """
+    Returns the file name used for a generated dataset.
+
+    Args:
+        data_dir (Path): The directory holding generated files.
+        profile (DatasetProfile): The dataset shape.
+        rows (int): The number of rows.
+
+    Returns:
+        Path: The path of the CSV file.
+    """
+    return data_dir / f"{profile.name}_{rows}.csv"
+
+
+def generate_csv(
+    path: Path, profile: DatasetProfile, rows: int, seed: int = 0
+) -> Path:
+    """
+    Writes a synthetic CSV file. Every file has a 'category' text column,
+    an increasing integer 'x' column and float 'value_N' columns; wider
+    profiles add 'label_N' text columns. Values are deterministic for a
+    given seed.
+
+    Args:
+        path (Path): Where to write the file.
+        profile (DatasetProfile): The dataset shape.
+        rows (int): The number of data rows.
+        seed (int): The random seed.
+
+    Returns:
+        Path: The path of the written file.
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    cardinality = profile.cardinality or rows
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        for start in range(0, rows, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, rows - start)
+            chunk = _generate_chunk(rng, profile, start, count, cardinality)
+            chunk.to_csv(f, index=False, header=start == 0)
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_dataset(data_dir: Path, profile: DatasetProfile, rows: int) -> Path:
+    """
+    Returns a generated dataset, creating it if it does not exist yet.
+
+    Args:
+        data_dir (Path): The directory holding generated files.
+        profile (DatasetProfile): The dataset shape.
+        rows (int): The number of rows.
+
+    Returns:
+        Path: The path of the CSV file.
+    """
+    path = dataset_path(data_dir, profile, rows)
+    if not path.exists():
+        generate_csv(path, profile, rows)
+    return path
+
+
+def _generate_chunk(
+    rng: np.random.Generator,
+    profile: DatasetProfile,
+    start: int,
+    count: int,
+    cardinality: int,
+) -> pd.DataFrame:
+    """
+    Generates a block of consecutive rows.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        profile (DatasetProfile): The dataset shape.
+        start (int): The index of the first row.
+        count (int): The number of rows.
+        cardinality (int): The number of distinct categories.
+
+    Returns:
+        pd.DataFrame: The generated rows.
+    """
+    index = np.arange(start, start + count)
+    if profile.cardinality:
+        codes = rng.integers(0, cardinality, count)
+    else:
+        codes = index
+    columns: Dict[str, np.ndarray] = {
+        "category": np.char.add("cat_", codes.astype(str)),
+        "x": index,
+    }
+
+    for i in range(profile.numeric_columns):
+        values = rng.normal(100.0 * (i + 1), 25.0, count).round(3)
+        if profile.nan_density:
+            values[rng.random(count) < profile.nan_density] = np.nan
+        columns[f"value_{i}"] = values
+
+    for i in range(profile.text_columns - 1):
+        labels = rng.integers(0, 100, count).astype(str)
+        columns[f"label_{i}"] = np.char.add(f"label{i}_", labels)
+
+    return pd.DataFrame(columns)
@@ -0,0 +1,645 @@
+"""
+Simulates concurrent users going through login, upload, chart generation
+and download, and reports throughput, latency percentiles, error rates and
+peak memory. Several configurations can be compared side by side; each one
+runs in its own process so that memory figures are not shared.
+
+Usage:
+    python -m benchmarks.load_test --sessions 200 --concurrency 16 \\
+        --config default \\
+        --config no-frame-cache:DATAFRAME_CACHE_MAX_BYTES=0 \\
+        --config threads-4:CONCURRENCY=4
+"""
+
+import argparse
+import http.client
+import json
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from benchmarks.datagen import PROFILES, ensure_dataset
+
+DEFAULT_DATA_DIR = Path(__file__).parent / ".data"
+
+# Uploaded files as (profile, rows, weight)
+DEFAULT_FILE_MIX = "narrow@1000=6,wide@10000=3,sparse@100000=1"
+
+CHART_COLUMNS = {
+    "bar": ("category", "value_0"),
+    "line": ("x", "value_0"),
+    "scatter": ("value_1", "value_0"),
+}
+
+_CHART_SRC = re.compile(rb"/charts/([0-9a-f]+\.(?:png|svg|webp))\"")
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class HttpSession:
+    """
+    Minimal HTTP client that keeps cookies and does not follow redirects,
+    used against a local WSGI server.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        """
+        Opens a keep-alive connection.
+
+        Args:
+            host (str): The server host.
+            port (int): The server port.
+        """
+        self.connection = http.client.HTTPConnection(host, port, timeout=120)
+        self.cookies: Dict[str, str] = {}
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        data: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, Tuple[str, bytes]]] = None,
+    ) -> Response:
+        """
+        Sends a request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path and query string.
+            data (Optional[Dict[str, str]]): Form fields.
+            files (Optional[Dict[str, Tuple[str, bytes]]]): Files to upload
+                as multipart form data, by field name.
+
+        Returns:
+            Response: The status code, headers and body.
+        """
+        headers = {}
+        body: Optional[bytes] = None
+        if files:
+            body, content_type = _encode_multipart(data or {}, files)
+            headers["Content-Type"] = content_type
+        elif data is not None:
+            body = urlencode(data).encode("utf-8")
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                f"{name}={value}" for name, value in self.cookies.items()
+            )
+
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        content = response.read()
+        for header in response.msg.get_all("Set-Cookie") or []:
+            cookie: SimpleCookie = SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+        return response.status, dict(response.getheaders()), content
+
+    def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        self.connection.close()
+
+
+class ClientSession:
+    """
+    Same interface as HttpSession, backed by the Flask test client.
+    """
+
+    def __init__(self, app: Any) -> None:
+        """
+        Creates a test client.
+
+        Args:
+            app (Flask): The application under test.
+        """
+        self.client = app.test_client()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        data: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, Tuple[str, bytes]]] = None,
+    ) -> Response:
+        """
+        Sends a request through the test client.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path and query string.
+            data (Optional[Dict[str, str]]): Form fields.
+            files (Optional[Dict[str, Tuple[str, bytes]]]): Files to upload.
+
+        Returns:
+            Response: The status code, headers and body.
+        """
+        form: Dict[str, Any] = dict(data or {})
+        for name, (filename, content) in (files or {}).items():
+            form[name] = (BytesIO(content), filename)
+        response = self.client.open(
+            path,
+            method=method,
+            data=form or None,
+            content_type="multipart/form-data" if files else None,
+        )
+        return response.status_code, dict(response.headers), response.data
+
+    def close(self) -> None:
+        """
+        Releases nothing; present for interface parity.
+        """
+
+
+class Recorder:
+    """
+    Thread-safe collection of request latencies and failures by route.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes empty measurements.
+        """
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.completed_sessions = 0
+        self.failed_sessions = 0
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        """
+        Records one request.
+
+        Args:
+            route (str): The route name.
+            seconds (float): The request latency.
+            ok (bool): Whether the request succeeded.
+        """
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def finish_session(self, ok: bool) -> None:
+        """
+        Records the outcome of a simulated session.
+
+        Args:
+            ok (bool): Whether every step succeeded.
+        """
+        with self._lock:
+            if ok:
+                self.completed_sessions += 1
+            else:
+                self.failed_sessions += 1
+
+
+def run_user_session(
+    session: Any,
+    recorder: Recorder,
+    upload: Tuple[str, bytes],
+    chart_type: str,
+) -> None:
+    """
+    Goes through login, upload, chart generation, download and logout as a
+    browser would, following redirects to the dashboard.
+
+    Args:
+        session (Any): An HttpSession or ClientSession.
+        recorder (Recorder): Where measurements are recorded.
+        upload (Tuple[str, bytes]): The file name and contents to upload.
+        chart_type (str): The chart type to generate.
+    """
+
+    def step(
+        route: str, expected: int, method: str, path: str, **kwargs: Any
+    ) -> Response:
+        started = time.perf_counter()
+        try:
+            response = session.request(method, path, **kwargs)
+        except Exception:
+            recorder.record(route, time.perf_counter() - started, False)
+            raise
+        ok = response[0] == expected
+        recorder.record(route, time.perf_counter() - started, ok)
+        if not ok:
+            raise RuntimeError(f"{route} returned HTTP {response[0]}")
+        return response
+
+    try:
+        step(
+            "login",
+            302,
+            "POST",
+            "/login",
+            data={"username": "testuser", "password": "password123"},
+        )
+        _, headers, _ = step(
+            "upload", 302, "POST", "/upload", files={"csv_file": upload}
+        )
+        location = headers.get("Location", "")
+        file_id = parse_qs(urlparse(location).query).get("file_id", [""])[0]
+        if not file_id:
+            raise RuntimeError("upload did not redirect to the new file")
+        step("dashboard", 200, "GET", f"/dashboard?file_id={file_id}")
+
+        x_axis, y_axis = CHART_COLUMNS[chart_type]
+        step(
+            "generate_chart",
+            302,
+            "POST",
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": x_axis,
+                "y_axis": y_axis,
+                "chart_type": chart_type,
+            },
+        )
+        _, _, body = step(
+            "dashboard", 200, "GET", f"/dashboard?file_id={file_id}"
+        )
+        match = _CHART_SRC.search(body)
+        if match is None:
+            raise RuntimeError("no chart was generated")
+        step(
+            "download",
+            200,
+            "GET",
+            f"/charts/{match.group(1).decode()}?download=1",
+        )
+        step("logout", 302, "GET", "/logout")
+        recorder.finish_session(True)
+    except Exception:
+        recorder.finish_session(False)
+    finally:
+        session.close()
+
+
+def run_configuration(
+    name: str,
+    overrides: Dict[str, Any],
+    sessions: int,
+    concurrency: int,
+    file_mix: Sequence[Tuple[str, bytes, int]],
+    transport: str,
+    unique_uploads: bool,
+    seed: int,
+) -> Dict[str, Any]:
+    """
+    Runs the simulated sessions against one configuration in the current
+    process.
+
+    Args:
+        name (str): The configuration name.
+        overrides (Dict[str, Any]): Config values to override.
+        sessions (int): The number of simulated sessions.
+        concurrency (int): The number of sessions run at once.
+        file_mix (Sequence[Tuple[str, bytes, int]]): Files to upload with
+                                                     their weights.
+        transport (str): 'http' for a local WSGI server, 'client' for the
+                         Flask test client.
+        unique_uploads (bool): Whether each session uploads distinct
+                               contents, defeating deduplication and the
+                               chart cache.
+        seed (int): The random seed choosing files and chart types.
+
+    Returns:
+        Dict[str, Any]: The report of the run.
+    """
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from config import Config
+
+    instance_dir = Path(tempfile.mkdtemp(prefix="csvviz-load-"))
+    attributes = {
+        "TESTING": True,
+        "SECRET_KEY": "load-test-secret-key",
+        "CLEANUP_INTERVAL_SECONDS": 0,
+        **overrides,
+    }
+    app = create_app(
+        type("LoadTestConfig", (Config,), attributes), str(instance_dir)
+    )
+
+    server = None
+    if transport == "http":
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rng = random.Random(seed)
+    plans = []
+    for i in range(sessions):
+        filename, content, _ = rng.choices(
+            file_mix, weights=[w for _, _, w in file_mix]
+        )[0]
+        if unique_uploads:
+            # An extra row makes every upload distinct
+            content += f"session_{i},{i}\n".encode()
+        plans.append(((filename, content), rng.choice(list(CHART_COLUMNS))))
+
+    def new_session() -> Any:
+        if server is not None:
+            return HttpSession("127.0.0.1", server.server_port)
+        return ClientSession(app)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for upload, chart_type in plans:
+                executor.submit(
+                    run_user_session,
+                    new_session(),
+                    recorder,
+                    upload,
+                    chart_type,
+                )
+    finally:
+        elapsed = time.perf_counter() - started
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(instance_dir, ignore_errors=True)
+
+    routes = {}
+    total_requests = 0
+    for route, latencies in sorted(recorder.latencies.items()):
+        total_requests += len(latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": recorder.errors.get(route, 0),
+            "error_rate": recorder.errors.get(route, 0) / len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+
+    return {
+        "name": name,
+        "overrides": overrides,
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "transport": transport,
+        "elapsed_s": elapsed,
+        "completed_sessions": recorder.completed_sessions,
+        "failed_sessions": recorder.failed_sessions,
+        "sessions_per_s": recorder.completed_sessions / elapsed,
+        "requests_per_s": total_requests / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+        "routes": routes,
+    }
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    Computes a percentile with linear interpolation.
+
+    Args:
+        values (Sequence[float]): The measurements.
+        pct (float): The percentile, from 0 to 100.
+
+    Returns:
+        float: The percentile value, or 0 without measurements.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def parse_config(spec: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Parses a NAME[:KEY=VALUE,...] configuration. Values are read as JSON
+    when possible and as strings otherwise; CONCURRENCY overrides the
+    number of concurrent sessions.
+
+    Args:
+        spec (str): The configuration from the command line.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The name and config overrides.
+    """
+    name, _, assignments = spec.partition(":")
+    overrides: Dict[str, Any] = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, _, value = assignment.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return name, overrides
+
+
+def load_file_mix(spec: str, data_dir: Path) -> List[Tuple[str, bytes, int]]:
+    """
+    Loads the files to upload from a PROFILE@ROWS=WEIGHT,... mix.
+
+    Args:
+        spec (str): The file mix.
+        data_dir (Path): The directory holding generated datasets.
+
+    Returns:
+        List[Tuple[str, bytes, int]]: The file names, contents and weights.
+    """
+    mix = []
+    for item in spec.split(","):
+        dataset, _, weight = item.partition("=")
+        profile, _, rows = dataset.partition("@")
+        path = ensure_dataset(data_dir, PROFILES[profile], int(rows))
+        mix.append((path.name, path.read_bytes(), int(weight or 1)))
+    return mix
+
+
+def _encode_multipart(
+    fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]
+) -> Tuple[bytes, str]:
+    """
+    Encodes form fields and files as multipart form data.
+
+    Args:
+        fields (Dict[str, str]): The form fields.
+        files (Dict[str, Tuple[str, bytes]]): The files by field name.
+
+    Returns:
+        Tuple[bytes, str]: The body and its content type.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            f"\r\n\r\n{value}\r\n".encode()
+        )
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}";'
+            f' filename="{filename}"\r\n'
+            "Content-Type: text/csv\r\n\r\n".encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _peak_rss_mb() -> float:
+    """
+    Returns the peak resident memory of this process and its finished
+    children, such as render workers.
+
+    Returns:
+        float: The peak resident set size in megabytes.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (own + children) / scale
+
+
+def _print_comparison(reports: Sequence[Dict[str, Any]]) -> None:
+    """
+    Prints the main figures of each configuration side by side.
+
+    Args:
+        reports (Sequence[Dict[str, Any]]): The configuration reports.
+    """
+    names = [r["name"] for r in reports]
+    width = max(14, *(len(n) for n in names)) + 2
+    print("".ljust(24) + "".join(n.rjust(width) for n in names))
+
+    def row(label: str, values: Sequence[str]) -> None:
+        print(label.ljust(24) + "".join(v.rjust(width) for v in values))
+
+    row("sessions/s", [f"{r['sessions_per_s']:.2f}" for r in reports])
+    row("requests/s", [f"{r['requests_per_s']:.1f}" for r in reports])
+    row(
+        "failed sessions",
+        [f"{r['failed_sessions']}/{r['sessions']}" for r in reports],
+    )
+    row("peak RSS (MB)", [f"{r['peak_rss_mb']:.0f}" for r in reports])
+    routes = sorted({route for r in reports for route in r["routes"]})
+    for route in routes:
+        for key in ("p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            values = []
+            for report in reports:
+                stats = report["routes"].get(route)
+                if stats is None:
+                    values.append("-")
+                elif key == "error_rate":
+                    values.append(f"{stats[key]:.1%}")
+                else:
+                    values.append(f"{stats[key]:.1f}")
+            row(f"{route} {key}", values)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Runs the load test from the command line.
+
+    Args:
+        argv (Optional[Sequence[str]]): The command-line arguments.
+
+    Returns:
+        int: 1 if any session failed, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--config",
+        action="append",
+        dest="configs",
+        metavar="NAME[:KEY=VALUE,...]",
+        help="A configuration to compare; may be repeated.",
+    )
+    parser.add_argument("--files", default=DEFAULT_FILE_MIX)
+    parser.add_argument(
+        "--transport", choices=("http", "client"), default="http"
+    )
+    parser.add_argument(
+        "--shared-uploads",
+        action="store_true",
+        help="Upload identical files so deduplication and caches apply.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", type=Path)
+    # Internal: run a single configuration and print its report as JSON
+    parser.add_argument("--run-single", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_single is not None:
+        name, overrides = parse_config(args.run_single)
+        concurrency = int(overrides.pop("CONCURRENCY", args.concurrency))
+        report = run_configuration(
+            name,
+            overrides,
+            args.sessions,
+            concurrency,
+            load_file_mix(args.files, args.data_dir),
+            args.transport,
+            not args.shared_uploads,
+            args.seed,
+        )
+        print(json.dumps(report))
+        return 0
+
+    # Generate datasets once before the configurations run
+    load_file_mix(args.files, args.data_dir)
+
+    reports = []
+    for spec in args.configs or ["default"]:
+        print(f"Running configuration {spec}...", file=sys.stderr)
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.load_test",
+            "--run-single",
+            spec,
+            "--sessions",
+            str(args.sessions),
+            "--concurrency",
+            str(args.concurrency),
+            "--files",
+            args.files,
+            "--transport",
+            args.transport,
+            "--seed",
+            str(args.seed),
+            "--data-dir",
+            str(args.data_dir),
+        ]
+        if args.shared_uploads:
+            command.append("--shared-uploads")
+        completed = subprocess.run(
+            command, capture_output=True, text=True, check=True
+        )
+        reports.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    _print_comparison(reports)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"configurations": reports}, f, indent=2)
+    return 1 if any(r["failed_sessions"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+Times chart generation and the upload path on synthetic datasets and
+compares the results with a stored baseline.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 \\
+        --output baseline.json
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 \\
+        --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from benchmarks.datagen import (
+    ALL_SIZES,
+    DEFAULT_SIZES,
+    PROFILES,
+    DatasetProfile,
+    ensure_dataset,
+)
+
+DEFAULT_DATA_DIR = Path(__file__).parent / ".data"
+DEFAULT_THRESHOLD = 0.25
+# Differences below this many seconds are treated as noise
+DEFAULT_MIN_DELTA = 0.005
+
+# X and Y columns used for each chart type
+CHART_COLUMNS = {
+    "bar": ("category", "value_0"),
+    "line": ("x", "value_0"),
+    "scatter": ("value_1", "value_0"),
+}
+
+
+def create_benchmark_app(instance_dir: Path, render_workers: int) -> Any:
+    """
+    Creates the application with limits raised for large datasets.
+
+    Args:
+        instance_dir (Path): The instance folder to use.
+        render_workers (int): The size of the chart render pool.
+
+    Returns:
+        Flask: The configured application.
+    """
+    from app import create_app
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        TESTING = True
+        SECRET_KEY = "benchmark-secret-key"
+        MAX_FILE_SIZE_MB = 4096
+        MAX_CONTENT_LENGTH = MAX_FILE_SIZE_MB * 1024 * 1024 + 64 * 1024
+        CHART_RENDER_WORKERS = render_workers
+        CLEANUP_INTERVAL_SECONDS = 0
+
+    return create_app(BenchmarkConfig, str(instance_dir))
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> List[float]:
+    """
+    Times repeated calls of a function.
+
+    Args:
+        func (Callable[[], Any]): The function to call.
+        repeat (int): The number of calls.
+
+    Returns:
+        List[float]: The duration of each call in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def benchmark_dataset(
+    app: Any, csv_path: Path, profile: DatasetProfile, rows: int, repeat: int
+) -> List[Dict[str, Any]]:
+    """
+    Runs every benchmark on one dataset.
+
+    Args:
+        app (Flask): The application under test.
+        csv_path (Path): The dataset file.
+        profile (DatasetProfile): The dataset shape.
+        rows (int): The number of rows.
+        repeat (int): The number of timed runs per benchmark.
+
+    Returns:
+        List[Dict[str, Any]]: One result per benchmark.
+    """
+    from app.services.cache_service import get_dataframe_cache
+    from app.services.chart_service import create_chart
+    from app.services.file_service import get_csv_headers, is_valid_csv
+
+    dataset = csv_path.stem
+    results = []
+
+    def record(name: str, times: List[float], error: Optional[str] = None):
+        results.append(
+            {
+                "dataset": dataset,
+                "profile": profile.name,
+                "rows": rows,
+                "benchmark": name,
+                "repeats": len(times),
+                "times_s": times,
+                "median_s": statistics.median(times),
+                "min_s": min(times),
+                "error": error,
+            }
+        )
+
+    def validate() -> None:
+        with open(csv_path, "rb") as f:
+            is_valid_csv(f)
+
+    record("is_valid_csv", time_call(validate, repeat))
+    record(
+        "get_csv_headers.raw",
+        time_call(lambda: get_csv_headers(str(csv_path)), repeat),
+    )
+
+    # Each upload is timed from a fresh login so that it is stored and
+    # profiled rather than deduplicated against the previous run
+    client = app.test_client()
+    upload_times = []
+    upload_error = None
+    for i in range(repeat):
+        client.post(
+            "/login", data={"username": "testuser", "password": "password123"}
+        )
+        with open(csv_path, "rb") as f:
+            started = time.perf_counter()
+            response = client.post(
+                "/upload",
+                data={"csv_file": (f, csv_path.name)},
+                content_type="multipart/form-data",
+            )
+            upload_times.append(time.perf_counter() - started)
+        if response.status_code != 302:
+            upload_error = f"HTTP {response.status_code}"
+        if i < repeat - 1:
+            client.get("/logout")
+    record("upload", upload_times, upload_error)
+
+    with client.session_transaction() as sess:
+        files = list((sess.get("files") or {}).values())
+    if not files:
+        return results
+    server_path = files[0]["server_path"]
+
+    with app.test_request_context():
+        record(
+            "get_csv_headers",
+            time_call(lambda: get_csv_headers(server_path), repeat),
+        )
+
+        charts_dir = Path(app.instance_path) / "charts"
+        for chart_type, (x_axis, y_axis) in CHART_COLUMNS.items():
+            times = []
+            error = None
+            for _ in range(repeat):
+                # Measure cold renders, without cached charts or frames
+                shutil.rmtree(charts_dir, ignore_errors=True)
+                get_dataframe_cache().clear()
+                started = time.perf_counter()
+                _, error = create_chart(
+                    server_path, x_axis, y_axis, chart_type, csv_path.name
+                )
+                times.append(time.perf_counter() - started)
+            record(f"create_chart.{chart_type}", times, error)
+
+    client.get("/logout")
+    return results
+
+
+def compare_results(
+    results: Sequence[Dict[str, Any]],
+    baseline: Sequence[Dict[str, Any]],
+    default_threshold: float = DEFAULT_THRESHOLD,
+    thresholds: Optional[Dict[str, float]] = None,
+    min_delta: float = DEFAULT_MIN_DELTA,
+) -> List[Dict[str, Any]]:
+    """
+    Finds benchmarks whose median time grew beyond their threshold.
+
+    Args:
+        results (Sequence[Dict[str, Any]]): The current results.
+        baseline (Sequence[Dict[str, Any]]): The baseline results.
+        default_threshold (float): The allowed relative slowdown, e.g. 0.25
+                                   for 25%.
+        thresholds (Optional[Dict[str, float]]): Allowed slowdowns by
+            benchmark name or name prefix, e.g. {'create_chart': 0.5}.
+        min_delta (float): Slowdowns smaller than this many seconds are
+                           ignored as noise.
+
+    Returns:
+        List[Dict[str, Any]]: The regressions with their baseline and
+                              current medians and ratio.
+    """
+    thresholds = thresholds or {}
+    baseline_medians = {
+        (r["dataset"], r["benchmark"]): r["median_s"] for r in baseline
+    }
+
+    regressions = []
+    for result in results:
+        key = (result["dataset"], result["benchmark"])
+        previous = baseline_medians.get(key)
+        if previous is None or result.get("error"):
+            continue
+        threshold = _threshold_for(
+            result["benchmark"], default_threshold, thresholds
+        )
+        current = result["median_s"]
+        if (
+            current > previous * (1 + threshold)
+            and current - previous > min_delta
+        ):
+            regressions.append(
+                {
+                    "dataset": result["dataset"],
+                    "benchmark": result["benchmark"],
+                    "baseline_s": previous,
+                    "current_s": current,
+                    "ratio": current / previous if previous else None,
+                    "threshold": threshold,
+                }
+            )
+    return regressions
+
+
+def _threshold_for(
+    benchmark: str, default: float, thresholds: Dict[str, float]
+) -> float:
+    """
+    Picks the threshold of the longest name prefix matching a benchmark.
+
+    Args:
+        benchmark (str): The benchmark name.
+        default (float): The threshold used when nothing matches.
+        thresholds (Dict[str, float]): Thresholds by name prefix.
+
+    Returns:
+        float: The allowed relative slowdown.
+    """
+    matches = [name for name in thresholds if benchmark.startswith(name)]
+    if not matches:
+        return default
+    return thresholds[max(matches, key=len)]
+
+
+def _parse_thresholds(values: Sequence[str]) -> Dict[str, float]:
+    """
+    Parses NAME=RATIO threshold overrides from the command line.
+
+    Args:
+        values (Sequence[str]): The overrides.
+
+    Returns:
+        Dict[str, float]: The thresholds by benchmark name prefix.
+    """
+    thresholds = {}
+    for value in values:
+        name, _, ratio = value.partition("=")
+        thresholds[name] = float(ratio)
+    return thresholds
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Runs the benchmarks from the command line.
+
+    Args:
+        argv (Optional[Sequence[str]]): The command-line arguments.
+
+    Returns:
+        int: 1 if a regression was found, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SIZES),
+        help=f"Row counts to test (all: {' '.join(map(str, ALL_SIZES))}).",
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=sorted(PROFILES),
+        default=sorted(PROFILES),
+        help="Dataset shapes to test.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=0,
+        help="Chart render pool size; 0 renders in-process.",
+    )
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmark-results.json")
+    )
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed relative slowdown against the baseline.",
+    )
+    parser.add_argument(
+        "--threshold-for",
+        nargs="*",
+        default=[],
+        metavar="NAME=RATIO",
+        help="Per-benchmark thresholds, e.g. create_chart.bar=0.5.",
+    )
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA)
+    args = parser.parse_args(argv)
+
+    instance_dir = Path(tempfile.mkdtemp(prefix="csvviz-bench-"))
+    try:
+        app = create_benchmark_app(instance_dir, args.render_workers)
+        results: List[Dict[str, Any]] = []
+        for rows in args.sizes:
+            for name in args.profiles:
+                profile = PROFILES[name]
+                csv_path = ensure_dataset(args.data_dir, profile, rows)
+                print(f"Benchmarking {csv_path.name}...", file=sys.stderr)
+                results.extend(
+                    benchmark_dataset(
+                        app, csv_path, profile, rows, args.repeat
+                    )
+                )
+    finally:
+        shutil.rmtree(instance_dir, ignore_errors=True)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "render_workers": args.render_workers,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(
+            results,
+            baseline,
+            args.threshold,
+            _parse_thresholds(args.threshold_for),
+            args.min_delta,
+        )
+        report["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for result in results:
+        status = f"  ERROR: {result['error']}" if result["error"] else ""
+        print(
+            f"{result['dataset']:<28} {result['benchmark']:<22} "
+            f"median {result['median_s'] * 1000:10.1f} ms{status}"
+        )
+    for regression in report.get("regressions", []):
+        print(
+            f"REGRESSION {regression['dataset']} {regression['benchmark']}: "
+            f"{regression['baseline_s'] * 1000:.1f} ms -> "
+            f"{regression['current_s'] * 1000:.1f} ms",
+            file=sys.stderr,
+        )
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Measures cold-start costs in fresh processes: importing the application,
+creating it, and serving the first page, login and chart.
+
+Usage:
+    python -m benchmarks.startup --repeat 5 --output startup.json
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmarks.datagen import PROFILES, ensure_dataset
+
+DEFAULT_DATA_DIR = Path(__file__).parent / ".data"
+
+STAGES = (
+    "import",
+    "create_app",
+    "first_page",
+    "first_login",
+    "first_upload",
+    "first_chart",
+)
+
+
+def measure_startup(
+    csv_path: Path, prewarm: bool, idle_seconds: float
+) -> Dict[str, float]:
+    """
+    Times startup in the current process, which must not have imported the
+    application yet.
+
+    Args:
+        csv_path (Path): The file uploaded for the first chart.
+        prewarm (bool): Whether background warm-up is enabled.
+        idle_seconds (float): How long the application idles between its
+                              first page and first login, as a server
+                              usually does before traffic arrives.
+
+    Returns:
+        Dict[str, float]: The duration of each stage in seconds.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    from app import create_app
+    from config import Config
+
+    timings["import"] = time.perf_counter() - started
+
+    instance_dir = Path(tempfile.mkdtemp(prefix="csvviz-startup-"))
+    attributes = {
+        "TESTING": True,
+        "SECRET_KEY": "startup-secret-key",
+        "CLEANUP_INTERVAL_SECONDS": 0,
+        "STARTUP_PREWARM": prewarm,
+    }
+    try:
+        started = time.perf_counter()
+        app = create_app(
+            type("StartupConfig", (Config,), attributes), str(instance_dir)
+        )
+        timings["create_app"] = time.perf_counter() - started
+
+        client = app.test_client()
+        steps = [
+            ("first_page", lambda: client.get("/login")),
+            (
+                "first_login",
+                lambda: client.post(
+                    "/login",
+                    data={"username": "testuser", "password": "password123"},
+                ),
+            ),
+            (
+                "first_upload",
+                lambda: client.post(
+                    "/upload",
+                    data={
+                        "csv_file": (BytesIO(csv_path.read_bytes()), "a.csv")
+                    },
+                    content_type="multipart/form-data",
+                ),
+            ),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            step()
+            timings[name] = time.perf_counter() - started
+            if name == "first_page":
+                time.sleep(idle_seconds)
+
+        with client.session_transaction() as sess:
+            file_id = next(iter(sess["files"]))
+        started = time.perf_counter()
+        client.post(
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": "x",
+                "y_axis": "value_0",
+                "chart_type": "line",
+            },
+        )
+        timings["first_chart"] = time.perf_counter() - started
+    finally:
+        shutil.rmtree(instance_dir, ignore_errors=True)
+    return timings
+
+
+def summarize(runs: Sequence[Dict[str, float]]) -> Dict[str, float]:
+    """
+    Computes the median of each stage over several runs.
+
+    Args:
+        runs (Sequence[Dict[str, float]]): The timings of each run.
+
+    Returns:
+        Dict[str, float]: The median duration of each stage in seconds.
+    """
+    return {
+        stage: statistics.median(run[stage] for run in runs)
+        for stage in STAGES
+        if all(stage in run for run in runs)
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Runs the startup measurements from the command line.
+
+    Args:
+        argv (Optional[Sequence[str]]): The command-line arguments.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--idle",
+        type=float,
+        default=2.0,
+        help="Seconds between the first page and the first login.",
+    )
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", type=Path)
+    # Internal: measure one cold start and print the timings as JSON
+    parser.add_argument(
+        "--run-single", choices=("prewarm", "lazy"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args(argv)
+
+    csv_path = ensure_dataset(args.data_dir, PROFILES["narrow"], 1000)
+    if args.run_single is not None:
+        timings = measure_startup(
+            csv_path, args.run_single == "prewarm", args.idle
+        )
+        print(json.dumps(timings))
+        return 0
+
+    report: Dict[str, Any] = {}
+    for mode in ("lazy", "prewarm"):
+        runs: List[Dict[str, float]] = []
+        for _ in range(args.repeat):
+            completed = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.startup",
+                    "--run-single",
+                    mode,
+                    "--idle",
+                    str(args.idle),
+                    "--data-dir",
+                    str(args.data_dir),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        report[mode] = {"runs": runs, "median_s": summarize(runs)}
+
+    print(f"{'':<14}{'lazy':>12}{'prewarm':>12}")
+    for stage in STAGES:
+        lazy = report["lazy"]["median_s"].get(stage, 0.0)
+        prewarm = report["prewarm"]["median_s"].get(stage, 0.0)
+        print(f"{stage:<14}{lazy * 1000:>9.1f} ms{prewarm * 1000:>9.1f} ms")
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
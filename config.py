@@ -16,3 +16,96 @@ class Config:
     """
 
     SECRET_KEY = os.environ.get("SECRET_KEY") or "you-will-never-guess"
+
+    # Maximum size of an uploaded CSV file. Request bodies are capped a
+    # little higher to leave room for the multipart envelope, so oversized
+    # uploads are refused before they are read.
+    MAX_FILE_SIZE_MB = int(os.environ.get("MAX_FILE_SIZE_MB") or 10)
+    MAX_CONTENT_LENGTH = MAX_FILE_SIZE_MB * 1024 * 1024 + 64 * 1024
+
+    # Memory budget for parsed CSV files shared across requests
+    DATAFRAME_CACHE_MAX_BYTES = int(
+        os.environ.get("DATAFRAME_CACHE_MAX_BYTES") or 64 * 1024 * 1024
+    )
+
+    # Maximum number of points drawn on line and scatter charts, and of bars
+    # (including the "Other" bar) drawn on bar charts
+    CHART_POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET") or 2000)
+    CHART_BAR_LIMIT = int(os.environ.get("CHART_BAR_LIMIT") or 50)
+
+    # Size and age limits of the shared cache of rendered charts
+    CHART_CACHE_MAX_BYTES = int(
+        os.environ.get("CHART_CACHE_MAX_BYTES") or 256 * 1024 * 1024
+    )
+    CHART_CACHE_MAX_AGE_HOURS = int(
+        os.environ.get("CHART_CACHE_MAX_AGE_HOURS") or 24
+    )
+
+    # Default and maximum resolution of chart images, in dots per inch
+    CHART_DEFAULT_DPI = int(os.environ.get("CHART_DEFAULT_DPI") or 100)
+    CHART_MAX_DPI = int(os.environ.get("CHART_MAX_DPI") or 300)
+
+    # How long browsers may reuse a chart image without revalidating it.
+    # Chart URLs change whenever their contents do.
+    CHART_HTTP_MAX_AGE = int(
+        os.environ.get("CHART_HTTP_MAX_AGE") or 365 * 24 * 3600
+    )
+
+    # Charts are rendered in a pool of worker processes; 0 renders them in
+    # the request thread instead
+    CHART_RENDER_WORKERS = int(os.environ.get("CHART_RENDER_WORKERS") or 2)
+    CHART_RENDER_TIMEOUT = float(os.environ.get("CHART_RENDER_TIMEOUT") or 30)
+    CHART_RENDER_MAX_TASKS_PER_WORKER = int(
+        os.environ.get("CHART_RENDER_MAX_TASKS_PER_WORKER") or 100
+    )
+
+    # Background chart jobs: worker threads and how long finished jobs are
+    # kept for status polling
+    CHART_JOB_WORKERS = int(os.environ.get("CHART_JOB_WORKERS") or 4)
+    CHART_JOB_TTL_SECONDS = int(os.environ.get("CHART_JOB_TTL_SECONDS") or 600)
+
+    # Chart batches: the most charts one batch may request, and the worker
+    # threads that generate them in parallel
+    CHART_BATCH_MAX_CHARTS = int(
+        os.environ.get("CHART_BATCH_MAX_CHARTS") or 50
+    )
+    CHART_BATCH_WORKERS = int(os.environ.get("CHART_BATCH_WORKERS") or 4)
+
+    # Where session data is kept: "sqlite" or "filesystem" store it in the
+    # instance folder with only a session id in the cookie, "cookie" keeps
+    # Flask's signed-cookie sessions
+    SESSION_STORE = os.environ.get("SESSION_STORE") or "sqlite"
+
+    # Idle sessions and their uploads expire after this many hours. Expired
+    # sessions and charts are deleted in batches by a background pass that
+    # runs every CLEANUP_INTERVAL_SECONDS; 0 disables it.
+    SESSION_MAX_AGE_HOURS = int(os.environ.get("SESSION_MAX_AGE_HOURS") or 24)
+    CLEANUP_INTERVAL_SECONDS = int(
+        os.environ.get("CLEANUP_INTERVAL_SECONDS") or 300
+    )
+    CLEANUP_BATCH_SIZE = int(os.environ.get("CLEANUP_BATCH_SIZE") or 100)
+
+    # Business events are queued and written to events.log in batches of up
+    # to EVENT_LOG_BATCH_SIZE, at least every EVENT_LOG_FLUSH_SECONDS
+    EVENT_LOG_BATCH_SIZE = int(os.environ.get("EVENT_LOG_BATCH_SIZE") or 100)
+    EVENT_LOG_FLUSH_SECONDS = float(
+        os.environ.get("EVENT_LOG_FLUSH_SECONDS") or 1.0
+    )
+
+    # werkzeug method used to hash new passwords, e.g. "scrypt" or
+    # "pbkdf2:sha256:600000". Cheaper settings raise login throughput at
+    # the expense of brute-force resistance; stored hashes are updated to
+    # the configured method when their users next log in.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD") or "scrypt"
+
+    # Users loaded for each request are cached in-process for this long
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE") or 256)
+    USER_CACHE_SECONDS = int(os.environ.get("USER_CACHE_SECONDS") or 60)
+
+    # Import pandas and Matplotlib, build the font cache and start the
+    # render pool in a background thread after startup instead of on the
+    # first requests that need them
+    STARTUP_PREWARM = os.environ.get("STARTUP_PREWARM", "1") != "0"
+
+    # Bearer token accepted by the /metrics endpoint in addition to a login
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
@@ -20,6 +20,9 @@ class TestConfig(Config):
     TESTING = True
     SECRET_KEY = "test-secret-key-for-testing-only"
     WTF_CSRF_ENABLED = False  # Disable CSRF for testing
+    CHART_RENDER_WORKERS = 0  # Render charts in the test process
+    CLEANUP_INTERVAL_SECONDS = 0  # Tests run cleanup passes directly
+    STARTUP_PREWARM = False  # Keep background threads out of tests
 
 
 @pytest.fixture
@@ -34,8 +37,7 @@ def app():
     temp_instance = tempfile.mkdtemp()
 
     # Create app with test config and custom instance path
-    test_app = create_app(TestConfig)
-    test_app.instance_path = temp_instance
+    test_app = create_app(TestConfig, temp_instance)
 
     yield test_app
 
@@ -124,9 +126,9 @@ def get_file_id_from_session(client):
         str: The file ID of the first uploaded file, or None if no files exist.
     """
     with client.session_transaction() as sess:
-        files = sess.get("files", [])
+        files = sess.get("files", {})
         if files:
-            return files[0]["id"]
+            return next(iter(files.values()))["id"]
         return None
 
 
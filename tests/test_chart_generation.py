@@ -2,9 +2,16 @@
 Tests for chart generation, display, and download functionality.
 """
 
+from io import BytesIO
+from unittest.mock import patch
+
 import pytest
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
 
+from app import create_app
 from conftest import (
+    TestConfig,
     get_chart_filename_from_dashboard,
     get_file_id_from_session,
 )
@@ -161,3 +168,177 @@ def test_TCG_003_download_chart_as_png(auth_client, sample_csv):
     assert "attachment" in download_response.headers.get(
         "Content-Disposition", ""
     )
+
+
+@pytest.mark.chart
+def test_TCG_004_charts_are_content_addressed(auth_client, sample_csv):
+    """
+    Test Case: TCG-004
+    Description: Charts with different axes get distinct cached images.
+
+    Verifies that charts built from different columns no longer overwrite
+    each other and that repeating a request reuses the cached image.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    file_id = get_file_id_from_session(auth_client)
+
+    filenames = []
+    for y_axis in ("Revenue", "Units", "Revenue"):
+        auth_client.post(
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": "Month",
+                "y_axis": y_axis,
+                "chart_type": "bar",
+            },
+            follow_redirects=True,
+        )
+        filenames.append(get_chart_filename_from_dashboard(auth_client))
+
+    assert filenames[0] != filenames[1]
+    assert filenames[0] == filenames[2]
+
+    download_response = auth_client.get(
+        f"/charts/{filenames[0]}?download=true"
+    )
+    assert "sales_data_bar.png" in download_response.headers.get(
+        "Content-Disposition", ""
+    )
+
+
+@pytest.mark.chart
+def test_TCG_005_generate_chart_as_background_job(auth_client, sample_csv):
+    """
+    Test Case: TCG-005
+    Description: Chart jobs return immediately and report their progress.
+
+    Verifies that a chart job is accepted with a job id, that its event
+    stream reports completion, and that the finished chart is shown on the
+    dashboard.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    file_id = get_file_id_from_session(auth_client)
+
+    submit_response = auth_client.post(
+        "/chart_jobs",
+        data={
+            "file_id": file_id,
+            "x_axis": "Month",
+            "y_axis": "Revenue",
+            "chart_type": "line",
+        },
+    )
+    assert submit_response.status_code == 202
+    job = submit_response.get_json()
+    assert job["job_id"]
+
+    # The event stream ends once the job has finished
+    events = auth_client.get(job["events_url"]).get_data(as_text=True)
+    assert '"status": "done"' in events
+
+    status = auth_client.get(job["status_url"]).get_json()
+    assert status["status"] == "done"
+    assert get_chart_filename_from_dashboard(auth_client) == (
+        status["chart_filename"]
+    )
+
+
+@pytest.mark.chart
+def test_TCG_006_only_true_maximum_is_highlighted(auth_client):
+    """
+    Test Case: TCG-006
+    Description: The max-value highlight marks a single bar.
+
+    Verifies that when the X-axis label of the maximum also appears on
+    other rows, only the row holding the maximum is drawn in red.
+    """
+    csv = b"Region,Sales\nNorth,5\nSouth,2\nNorth,9\nEast,3\nNorth,1\n"
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (BytesIO(csv), "regions.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    file_id = get_file_id_from_session(auth_client)
+
+    figures = []
+    original_tight_layout = Figure.tight_layout
+
+    def record_figure(fig, *args, **kwargs):
+        figures.append(fig)
+        return original_tight_layout(fig, *args, **kwargs)
+
+    with patch.object(
+        Figure, "tight_layout", autospec=True, side_effect=record_figure
+    ):
+        auth_client.post(
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": "Region",
+                "y_axis": "Sales",
+                "chart_type": "bar",
+            },
+            follow_redirects=True,
+        )
+
+    assert len(figures) == 1
+    bars = figures[0].axes[0].patches
+    red = [bar for bar in bars if bar.get_facecolor() == to_rgba("red")]
+    assert len(bars) == 6
+    assert [bar.get_height() for bar in red] == [9]
+
+
+@pytest.mark.chart
+def test_TCG_007_chart_job_is_shared_across_processes(
+    app, auth_client, sample_csv
+):
+    """
+    Test Case: TCG-007
+    Description: Chart jobs are visible to every worker process.
+
+    Verifies that an application sharing the instance folder, as another
+    worker process would, can follow and report a job submitted to the
+    first one.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    file_id = get_file_id_from_session(auth_client)
+    job = auth_client.post(
+        "/chart_jobs",
+        data={
+            "file_id": file_id,
+            "x_axis": "Month",
+            "y_axis": "Revenue",
+            "chart_type": "line",
+        },
+    ).get_json()
+
+    other_app = create_app(TestConfig, app.instance_path)
+    other_client = other_app.test_client()
+    session_cookie = auth_client.get_cookie(app.config["SESSION_COOKIE_NAME"])
+    other_client.set_cookie(session_cookie.key, session_cookie.value)
+
+    events = other_client.get(job["events_url"]).get_data(as_text=True)
+    assert '"status": "done"' in events
+
+    status = other_client.get(job["status_url"]).get_json()
+    assert status["status"] == "done"
+    assert get_chart_filename_from_dashboard(other_client) == (
+        status["chart_filename"]
+    )
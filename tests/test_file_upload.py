@@ -2,6 +2,9 @@
 Tests for file upload validation and handling.
 """
 
+from io import BytesIO
+from pathlib import Path
+
 import pytest
 
 
@@ -53,3 +56,65 @@ def test_TFU_002_reject_non_csv_file(auth_client, non_csv_file):
     assert b"Invalid file type" in response.data or b"CSV" in response.data
     # File should NOT appear in the uploaded files list
     assert b"document.txt" not in response.data
+
+
+@pytest.mark.file_ops
+def test_TFU_003_reject_oversized_csv_while_streaming(app, auth_client):
+    """
+    Test Case: TFU-003
+    Description: Reject a CSV file larger than the configured size limit.
+    PRD/US Ref: US-002
+
+    Verifies that an oversized upload is refused while it is streamed to
+    disk, that no partial file is left behind, and that script requests
+    are refused with a JSON error instead of a redirect.
+    """
+    app.config["MAX_FILE_SIZE_MB"] = 0.01
+    # Let the body through so the streaming limit is exercised
+    app.config["MAX_CONTENT_LENGTH"] = None
+
+    rows = b"".join(b"%d,%d\n" % (i, i * 2) for i in range(5000))
+    response = auth_client.post(
+        "/upload",
+        data={"csv_file": (BytesIO(b"x,y\n" + rows), "large.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+
+    assert response.status_code == 200
+    assert b"File size exceeds" in response.data
+    assert b"large.csv" not in response.data
+
+    incoming_dir = Path(app.instance_path) / "uploads" / ".incoming"
+    assert not incoming_dir.exists() or not any(incoming_dir.iterdir())
+
+    app.config["MAX_CONTENT_LENGTH"] = 1024
+    response = auth_client.post(
+        "/chart_batches", json={"charts": [{"x_axis": "x" * 2048}]}
+    )
+    assert response.status_code == 413
+    assert "File size exceeds" in response.get_json()["error"]
+
+
+@pytest.mark.file_ops
+def test_TFU_004_reject_non_utf8_csv(auth_client):
+    """
+    Test Case: TFU-004
+    Description: Reject a CSV file that is not UTF-8 encoded.
+    PRD/US Ref: US-003
+
+    Verifies that invalid UTF-8 anywhere in the upload is detected while
+    the file is streamed.
+    """
+    content = b"City,Population\n" + b"Berlin,3600000\n" * 2000
+    content += "Kraków,800000\n".encode("latin-1")
+    response = auth_client.post(
+        "/upload",
+        data={"csv_file": (BytesIO(content), "cities.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+
+    assert response.status_code == 200
+    assert b"Invalid CSV file" in response.data
+    assert b"cities.csv" not in response.data
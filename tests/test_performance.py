@@ -0,0 +1,1372 @@
+"""
+Tests for caching and other performance-related behavior.
+"""
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from io import BytesIO
+from logging.handlers import QueueHandler
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.auth.models import create_user, get_user_by_username
+from app.services.aggregation_service import aggregate
+from app.services.blob_service import count_references, get_blob_path
+from app.services import batch_service, chart_service
+from app.services.cache_service import DataFrameCache, get_dataframe_cache
+from app.services.chart_service import (
+    get_chart_info,
+    get_chart_key,
+    remove_chart,
+)
+from app.services.cleanup_service import CleanupScheduler
+from app.services.columnar_service import (
+    get_columnar_dir,
+    read_columns,
+    write_columnar_sidecar,
+)
+from app.services.datetime_service import bucket_times
+from app.services.downsampling_service import downsample
+from app.services.logging_service import (
+    BatchingQueueListener,
+    JsonEventFormatter,
+)
+from app.services.profile_service import estimate_distinct, read_profile
+from app.services.render_service import (
+    RenderCancelledError,
+    RenderPool,
+    RenderTimeoutError,
+)
+from app.services.session_store import ServerSideSessionInterface
+from app.services.startup_service import get_startup_timings
+from benchmarks.datagen import PROFILES, generate_csv
+from benchmarks.load_test import (
+    ClientSession,
+    Recorder,
+    parse_config,
+    percentile,
+    run_user_session,
+)
+from benchmarks.run_benchmarks import compare_results
+from conftest import (
+    get_chart_filename_from_dashboard,
+    get_file_id_from_session,
+)
+
+
+@pytest.mark.performance
+def test_TPF_001_repeated_charts_parse_file_once(auth_client, sample_csv):
+    """
+    Test Case: TPF-001
+    Description: Generating several charts from one file parses it once.
+
+    Verifies that the shared DataFrame cache serves repeated chart requests
+    for an unchanged file without parsing it again.
+    """
+    cache = get_dataframe_cache()
+    cache.clear()
+
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    file_id = get_file_id_from_session(auth_client)
+
+    for chart_type in ("bar", "line"):
+        auth_client.post(
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": "Month",
+                "y_axis": "Revenue",
+                "chart_type": chart_type,
+            },
+            follow_redirects=True,
+        )
+
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] >= 1
+
+    # Deleting the file drops it from the cache
+    auth_client.post(f"/delete_file/{file_id}", follow_redirects=True)
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.performance
+def test_TPF_002_cache_evicts_least_recently_used(tmp_path):
+    """
+    Test Case: TPF-002
+    Description: The DataFrame cache respects its memory budget.
+
+    Verifies that the least recently used frame is evicted once the
+    configured byte budget is exceeded.
+    """
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.csv"
+        path.write_text("x,y\n" + "".join(f"{i},{i}\n" for i in range(100)))
+        paths.append(str(path))
+
+    frame_size = int(pd.read_csv(paths[0]).memory_usage(deep=True).sum())
+    cache = DataFrameCache(max_bytes=frame_size * 2)
+
+    def loader(path, columns):
+        return pd.read_csv(path, usecols=columns)
+
+    cache.get(paths[0], loader)
+    cache.get(paths[1], loader)
+    cache.get(paths[0], loader)
+    cache.get(paths[2], loader)
+
+    assert cache.peek(paths[0]) is not None
+    assert cache.peek(paths[1]) is None
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.performance
+def test_TPF_003_upload_writes_columnar_sidecar(
+    auth_client, sample_csv, tmp_path
+):
+    """
+    Test Case: TPF-003
+    Description: Uploaded files are converted to a columnar sidecar.
+
+    Verifies that selected columns can be read back from the sidecar
+    without parsing the CSV file, that text columns keep non-ASCII and
+    missing values while taking only the space of their text, and that the
+    sidecar is removed together with the file.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    with auth_client.session_transaction() as sess:
+        file_meta = next(iter(sess["files"].values()))
+
+    server_path = file_meta["server_path"]
+    assert get_columnar_dir(server_path).is_dir()
+
+    df = read_columns(server_path, ["Month", "Units"])
+    assert df is not None
+    assert df.columns.tolist() == ["Month", "Units"]
+    assert df["Month"].tolist() == ["January", "February", "March"]
+    assert df["Units"].tolist() == [150, 180, 200]
+
+    auth_client.post(f"/delete_file/{file_meta['id']}", follow_redirects=True)
+    assert not get_columnar_dir(server_path).exists()
+
+    text_path = tmp_path / "text.csv"
+    names = ["Zoë", None, "x" * 500] + ["a"] * 97
+    pd.DataFrame({"Name": names}).to_csv(text_path, index=False)
+    assert write_columnar_sidecar(str(text_path))
+    df = read_columns(str(text_path), ["Name"])
+    assert df is not None
+    assert df["Name"].iloc[0] == "Zoë"
+    assert pd.isna(df["Name"].iloc[1])
+    assert df["Name"].iloc[2] == "x" * 500
+    assert df["Name"].iloc[3] == "a"
+    buffer = get_columnar_dir(str(text_path)) / "col_0.npy"
+    assert buffer.stat().st_size < 1_000
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("chart_type", ["line", "scatter", "bar"])
+def test_TPF_004_downsampling_keeps_maximum(chart_type):
+    """
+    Test Case: TPF-004
+    Description: Downsampling bounds the plotted points and keeps the max.
+
+    Verifies that every chart type is reduced to its point budget and that
+    the highlighted maximum survives downsampling.
+    """
+    rng = np.random.default_rng(0)
+    x = np.arange(100_000)
+    y = rng.normal(size=100_000)
+    y[54_321] = 100.0
+
+    series = downsample(x, y, chart_type, point_budget=500, bar_limit=20)
+
+    assert series.decimated
+    assert series.original_points == 100_000
+    limit = 20 if chart_type == "bar" else 501
+    assert len(series.y) <= limit
+    assert series.y[series.max_pos] == 100.0
+
+
+@pytest.mark.performance
+def test_TPF_005_render_pool_renders_and_times_out(tmp_path):
+    """
+    Test Case: TPF-005
+    Description: Charts render in worker processes with a timeout.
+
+    Verifies that the render pool writes the chart image, that a render
+    exceeding its timeout is abandoned with an error, and that stopping a
+    render leaves the renders running in other workers alone.
+    """
+    pool = RenderPool(processes=2, max_tasks_per_worker=2)
+    spec = {
+        "x": np.array(["a", "b", "c"]),
+        "y": np.array([1.0, 3.0, 2.0]),
+        "max_pos": 1,
+        "chart_type": "bar",
+        "x_label": "x",
+        "y_label": "y",
+        "title": "Chart from test.csv",
+        "output_path": str(tmp_path / "chart.png"),
+    }
+    try:
+        pool.render(spec, timeout=60)
+        assert (tmp_path / "chart.png").stat().st_size > 0
+
+        with pytest.raises(RenderTimeoutError):
+            pool.render(spec, timeout=0.001)
+
+        n = 200_000
+        slow_spec = {
+            **spec,
+            "x": np.arange(n, dtype=float),
+            "y": np.sin(np.arange(n) / 50.0),
+            "max_pos": 0,
+            "chart_type": "scatter",
+            "output_path": str(tmp_path / "slow.png"),
+        }
+        outcome = {}
+        slow = threading.Thread(
+            target=lambda: outcome.update(
+                timings=pool.render(slow_spec, timeout=120)
+            )
+        )
+        slow.start()
+        time.sleep(0.5)
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with pytest.raises(RenderCancelledError):
+            pool.render(slow_spec, timeout=60, cancel_event=cancel_event)
+        with pytest.raises(RenderTimeoutError):
+            pool.render(slow_spec, timeout=0.3)
+        slow.join()
+        assert "encode" in outcome["timings"]
+        assert (tmp_path / "slow.png").stat().st_size > 0
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.performance
+def test_TPF_006_upload_profile_drives_column_choices(auth_client, sample_csv):
+    """
+    Test Case: TPF-006
+    Description: Uploads are profiled once and the profile is reused.
+
+    Verifies that the profile sidecar records per-column statistics, that
+    only numeric columns are offered for the Y-axis and that invalid chart
+    requests are rejected from the profile.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    with auth_client.session_transaction() as sess:
+        file_meta = next(iter(sess["files"].values()))
+
+    profile = read_profile(file_meta["server_path"])
+    assert profile["row_count"] == 3
+    revenue = profile["columns"][1]
+    assert revenue["numeric"] is True
+    assert (revenue["min"], revenue["max"]) == (10000, 15000)
+    assert profile["columns"][0]["distinct_estimate"] == 3
+
+    dashboard = auth_client.get("/dashboard").data.decode("utf-8")
+    y_select = dashboard.split('id="y_axis"')[1].split("</select>")[0]
+    assert "Month" not in y_select
+    assert "Revenue" in y_select
+
+    response = auth_client.post(
+        "/generate_chart",
+        data={
+            "file_id": file_meta["id"],
+            "x_axis": "Revenue",
+            "y_axis": "Month",
+            "chart_type": "bar",
+        },
+        follow_redirects=True,
+    )
+    assert b"must contain numeric data" in response.data
+
+
+@pytest.mark.performance
+def test_TPF_007_distinct_estimate_is_close():
+    """
+    Test Case: TPF-007
+    Description: The distinct-count estimate is accurate on large columns.
+
+    Verifies that the sketch-based estimate stays within a few percent of
+    the exact number of distinct values.
+    """
+    values = pd.Series(np.arange(200_000) % 50_000)
+
+    estimate = estimate_distinct(values)
+
+    assert abs(estimate - 50_000) / 50_000 < 0.1
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("backend", ["sqlite", "filesystem"])
+def test_TPF_008_session_data_stays_server_side(app, sample_csv, backend):
+    """
+    Test Case: TPF-008
+    Description: The session cookie carries only a signed session id.
+
+    Verifies that file metadata is kept in the server-side store, indexed by
+    file id, and survives across requests with either storage backend, and
+    that logging in and out moves the session to a new id. Unknown backend
+    names are rejected.
+    """
+    with pytest.raises(ValueError):
+        ServerSideSessionInterface("file")
+
+    app.session_interface = ServerSideSessionInterface(backend)
+    store = app.session_interface.get_store(app)
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+    client = app.test_client()
+    client.post("/login", data={"username": "testuser", "password": "wrong"})
+    anonymous_cookie = client.get_cookie(cookie_name)
+    assert anonymous_cookie is not None
+    anonymous_sid = anonymous_cookie.value.rsplit(".", 1)[0]
+    assert store.load(anonymous_sid) is not None
+
+    client.post(
+        "/login",
+        data={"username": "testuser", "password": "password123"},
+    )
+    login_cookie = client.get_cookie(cookie_name)
+    assert login_cookie is not None
+    assert login_cookie.value != anonymous_cookie.value
+    assert store.load(anonymous_sid) is None
+    client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+
+    cookie = client.get_cookie(app.config["SESSION_COOKIE_NAME"])
+    assert cookie is not None
+    assert len(cookie.value) < 100
+    assert b"server_path" not in cookie.value.encode()
+
+    file_id = get_file_id_from_session(client)
+    with client.session_transaction() as sess:
+        assert sess["files"][file_id]["original_filename"] == "sales_data.csv"
+
+    response = client.get("/dashboard")
+    assert b"sales_data.csv" in response.data
+    assert "Cookie" in response.headers.get("Vary", "")
+
+    login_sid = login_cookie.value.rsplit(".", 1)[0]
+    client.get("/logout")
+    assert store.load(login_sid) is None
+    logout_cookie = client.get_cookie(cookie_name)
+    assert logout_cookie is not None
+    assert logout_cookie.value != login_cookie.value
+
+
+@pytest.mark.performance
+def test_TPF_009_uploads_are_deduplicated_and_reference_counted(
+    app, auth_client, sample_csv
+):
+    """
+    Test Case: TPF-009
+    Description: Identical uploads share one stored copy.
+
+    Verifies that the same contents uploaded by two sessions are stored
+    once, that a session may hold two files of the same name, and that the
+    stored copy is deleted only when the last session releases it.
+    """
+    csv_bytes = sample_csv.getvalue()
+    other_client = app.test_client()
+    other_client.post(
+        "/login",
+        data={"username": "testuser", "password": "password123"},
+    )
+    for client in (auth_client, other_client):
+        client.post(
+            "/upload",
+            data={"csv_file": (BytesIO(csv_bytes), "sales_data.csv")},
+            content_type="multipart/form-data",
+        )
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (BytesIO(b"a,b\n1,2\n"), "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+
+    with auth_client.session_transaction() as sess:
+        files = sorted(sess["files"].values(), key=lambda f: f["uploaded_at"])
+    assert len(files) == 2
+    assert files[0]["server_path"] != files[1]["server_path"]
+
+    with app.test_request_context():
+        shared_hash = files[0]["sha256"]
+        shared_path = get_blob_path(shared_hash)
+        assert shared_path.is_file()
+        assert count_references(shared_hash) == 2
+
+    auth_client.post(f"/delete_file/{files[0]['id']}")
+    assert shared_path.is_file()
+
+    other_client.get("/logout")
+    assert not shared_path.exists()
+    assert not Path(str(shared_path) + ".profile.json").exists()
+
+
+@pytest.mark.performance
+def test_TPF_010_cleanup_pass_expires_idle_sessions_and_charts(
+    app, auth_client, sample_csv
+):
+    """
+    Test Case: TPF-010
+    Description: A cleanup pass reclaims expired sessions and charts.
+
+    Verifies that the scheduler evicts the least recently used charts
+    beyond the cache size budget, deletes the uploads and charts of idle
+    sessions in batches along with abandoned temporary uploads, and reports
+    what it reclaimed in its statistics and on the metrics endpoint.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+    file_id = get_file_id_from_session(auth_client)
+    chart_paths = []
+    for chart_type in ("line", "bar"):
+        auth_client.post(
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": "Month",
+                "y_axis": "Revenue",
+                "chart_type": chart_type,
+            },
+        )
+        with auth_client.session_transaction() as sess:
+            blob_path = Path(sess["files"][file_id]["server_path"])
+            chart_paths.append(
+                Path(app.instance_path) / "charts" / sess["chart_filename"]
+            )
+    evicted_path, chart_path = chart_paths
+    assert blob_path.is_file() and evicted_path.is_file()
+
+    with app.test_request_context():
+        info = get_chart_info(chart_path.name)
+    assert info is not None
+    app.config["CHART_CACHE_MAX_BYTES"] = (
+        info["bytes"] + info["thumbnail_bytes"]
+    )
+    reclaimed = CleanupScheduler(app, interval=60).run_pass()
+    assert (reclaimed["session"], reclaimed["chart"]) == (0, 1)
+    assert not evicted_path.exists() and chart_path.is_file()
+
+    incoming_dir = Path(app.instance_path) / "uploads" / ".incoming"
+    incoming_dir.mkdir(parents=True, exist_ok=True)
+    leftover = incoming_dir / "interrupted"
+    leftover.write_bytes(b"x,y\n")
+    os.utime(leftover, (0, 0))
+
+    app.config["SESSION_MAX_AGE_HOURS"] = 0
+    app.config["CHART_CACHE_MAX_AGE_HOURS"] = 0
+    scheduler = CleanupScheduler(app, interval=60, batch_size=1)
+    reclaimed = scheduler.run_pass()
+
+    assert reclaimed["session"] == 1
+    assert reclaimed["chart"] == 1
+    assert reclaimed["stored_sessions"] >= 1
+    assert reclaimed["incoming_uploads"] == 1
+    assert not blob_path.exists() and not chart_path.exists()
+    assert not leftover.exists()
+    stats = scheduler.stats()
+    assert stats["passes"] == 1
+    assert stats["last_pass_seconds"] > 0
+
+    # The pass expired the logged-in session
+    app.config["METRICS_TOKEN"] = "scrape-token"
+    body = auth_client.get(
+        "/metrics", headers={"Authorization": "Bearer scrape-token"}
+    ).get_data(as_text=True)
+    assert "csvviz_cleanup_passes_total " in body
+    assert 'csvviz_cleanup_reclaimed_total{kind="incoming_uploads"} 1' in body
+    assert (
+        f'csvviz_cleanup_last_pass_reclaimed{{kind="session",'
+        f'pid="{os.getpid()}"}} 1'
+    ) in body
+    assert f'csvviz_cleanup_last_pass_seconds{{pid="{os.getpid()}"}}' in body
+
+
+@pytest.mark.performance
+def test_TPF_011_events_are_written_as_json_lines_in_batches(tmp_path):
+    """
+    Test Case: TPF-011
+    Description: Queued events are written as valid JSON lines.
+
+    Verifies that the batching listener writes every queued event, with
+    messages that need escaping and extra fields, as one JSON object per
+    line, and that extra fields cannot replace the reserved keys.
+    """
+    # The file is opened by the first write
+    handler = logging.FileHandler(tmp_path / "events.log", delay=True)
+    handler.setFormatter(JsonEventFormatter())
+    event_queue = queue.Queue()
+    listener = BatchingQueueListener(
+        event_queue, handler, batch_size=3, flush_interval=0.05
+    )
+    logger = logging.getLogger("test_event_logger")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(QueueHandler(event_queue))
+    listener.start()
+    try:
+        for i in range(10):
+            logger.info(
+                'chart "generated"\n',
+                extra={
+                    "event_fields": {
+                        "seq": i,
+                        "render_seconds": 0.5,
+                        "event_type": "spoofed",
+                        "level": "CRITICAL",
+                    }
+                },
+            )
+    finally:
+        logger.handlers.clear()
+        listener.stop()
+
+    lines = (tmp_path / "events.log").read_text().splitlines()
+    events = [json.loads(line) for line in lines]
+    assert [e["seq"] for e in events] == list(range(10))
+    assert events[0]["event_type"] == 'chart "generated"\n'
+    assert events[0]["render_seconds"] == 0.5
+    assert events[0]["level"] == "INFO"
+    assert "timestamp" in events[0]
+
+
+@pytest.mark.performance
+def test_TPF_012_metrics_endpoint_reports_stage_timings(
+    app, auth_client, sample_csv
+):
+    """
+    Test Case: TPF-012
+    Description: The metrics endpoint exposes stage timings and counters.
+
+    Verifies that chart generation and uploads are timed per stage, that
+    the Prometheus output requires a login or the metrics token, that it
+    includes the render and DataFrame cache counters and per-process
+    gauges, and that snapshots left by exited processes are dropped.
+    """
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    metrics_dir = Path(app.instance_path) / "metrics"
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    stale = metrics_dir / f"{exited.pid}-deadbeef.json"
+    stale.write_text(
+        json.dumps(
+            {
+                "buckets": [],
+                "counters": [
+                    ["csvviz_chart_renders_total", [["chart_type", "old"]], 1]
+                ],
+                "histograms": [],
+            }
+        )
+    )
+
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+    auth_client.post(
+        "/generate_chart",
+        data={
+            "file_id": get_file_id_from_session(auth_client),
+            "x_axis": "Month",
+            "y_axis": "Units",
+            "chart_type": "scatter",
+        },
+    )
+
+    response = auth_client.get("/metrics")
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    for stage in ("parse", "clean", "layout", "encode", "upload_store"):
+        assert f'csvviz_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'csvviz_chart_renders_total{chart_type="scatter"}' in body
+    assert "# TYPE csvviz_upload_bytes_total counter" in body
+    assert "csvviz_dataframe_cache_misses_total " in body
+    assert "# TYPE csvviz_dataframe_cache_bytes gauge" in body
+    assert f'csvviz_dataframe_cache_entries{{pid="{os.getpid()}"}}' in body
+    assert 'chart_type="old"' not in body
+    assert not stale.exists()
+
+    anonymous = app.test_client()
+    assert anonymous.get("/metrics").status_code == 401
+    app.config["METRICS_TOKEN"] = "scrape-token"
+    response = anonymous.get(
+        "/metrics", headers={"Authorization": "Bearer scrape-token"}
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.performance
+def test_TPF_013_benchmark_data_and_regression_check(tmp_path):
+    """
+    Test Case: TPF-013
+    Description: Benchmark datasets and baseline comparison behave.
+
+    Verifies that synthetic datasets have the requested shape and NaN
+    density, and that only slowdowns beyond their threshold are reported
+    as regressions.
+    """
+    profile = PROFILES["sparse"]
+    df = pd.read_csv(generate_csv(tmp_path / "data.csv", profile, 5_000))
+    assert len(df) == 5_000
+    assert {"category", "x", "value_0", "value_3"} <= set(df.columns)
+    assert 0.25 < df["value_0"].isna().mean() < 0.35
+    assert df["category"].nunique() == profile.cardinality
+
+    def result(benchmark, median):
+        return {"dataset": "d", "benchmark": benchmark, "median_s": median}
+
+    baseline = [result("upload", 1.0), result("create_chart.bar", 1.0)]
+    current = [result("upload", 1.2), result("create_chart.bar", 1.4)]
+    regressions = compare_results(
+        current, baseline, 0.25, {"create_chart": 0.5}
+    )
+    assert regressions == []
+    regressions = compare_results(current, baseline, 0.1)
+    assert [r["benchmark"] for r in regressions] == [
+        "upload",
+        "create_chart.bar",
+    ]
+
+
+@pytest.mark.performance
+def test_TPF_014_load_test_session_flow(app, tmp_path):
+    """
+    Test Case: TPF-014
+    Description: The load test drives complete user sessions.
+
+    Verifies that a simulated session logs in, uploads, generates and
+    downloads a chart without errors, and that configurations and
+    percentiles are parsed and computed as expected.
+    """
+    csv_path = generate_csv(tmp_path / "data.csv", PROFILES["narrow"], 500)
+    recorder = Recorder()
+    for chart_type in ("bar", "line"):
+        run_user_session(
+            ClientSession(app),
+            recorder,
+            ("data.csv", csv_path.read_bytes()),
+            chart_type,
+        )
+
+    assert recorder.completed_sessions == 2
+    assert recorder.failed_sessions == 0
+    assert recorder.errors == {}
+    assert len(recorder.latencies["dashboard"]) == 4
+    assert len(recorder.latencies["download"]) == 2
+
+    assert parse_config("small:CONCURRENCY=4,SESSION_STORE=file") == (
+        "small",
+        {"CONCURRENCY": 4, "SESSION_STORE": "file"},
+    )
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0], 100) == 2.0
+
+
+@pytest.mark.performance
+def test_TPF_015_startup_defers_heavy_work(app, client, tmp_path):
+    """
+    Test Case: TPF-015
+    Description: Heavy imports stay off the startup path.
+
+    Verifies that creating the application imports neither pandas nor
+    Matplotlib, and that the time to the first
+    response is recorded.
+    """
+    code = (
+        "import sys\n"
+        "from app import create_app\n"
+        f"create_app(instance_path={str(tmp_path)!r})\n"
+        "heavy = {'pandas', 'matplotlib'} & set(sys.modules)\n"
+        "assert not heavy, heavy\n"
+    )
+    env = {**os.environ, "STARTUP_PREWARM": "0"}
+    env["CLEANUP_INTERVAL_SECONDS"] = "0"
+    subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        env=env,
+        check=True,
+    )
+
+    client.get("/login")
+    timings = get_startup_timings()
+    assert timings["startup_first_response"] >= timings["startup_create_app"]
+
+
+@pytest.mark.performance
+def test_TPF_016_user_store_caching_and_rehash(app, client):
+    """
+    Test Case: TPF-016
+    Description: Users are stored with their hashes and cached per request.
+
+    Verifies that users added to the store can log in, that loading the
+    logged-in user is served from the in-process cache, and that a changed
+    hash method is applied to a user's stored hash at their next login.
+    """
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    with app.app_context():
+        user = create_user("alice", "secret")
+        assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+        with pytest.raises(ValueError):
+            create_user("alice", "other")
+
+    client.post("/login", data={"username": "alice", "password": "secret"})
+    client.get("/dashboard")
+    with patch(
+        "app.auth.models._fetch_user", side_effect=AssertionError
+    ) as fetch:
+        assert client.get("/dashboard").status_code == 200
+        assert fetch.call_count == 0
+
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:2000"
+    client.get("/logout")
+    client.post("/login", data={"username": "alice", "password": "secret"})
+    with app.app_context():
+        stored = get_user_by_username("alice")
+    assert stored.password_hash.startswith("pbkdf2:sha256:2000$")
+    assert stored.check_password("secret")
+
+
+@pytest.mark.performance
+def test_TPF_017_chart_formats_dpi_and_thumbnails(
+    app, auth_client, sample_csv
+):
+    """
+    Test Case: TPF-017
+    Description: Charts are rendered in the requested format with a
+    thumbnail.
+
+    Verifies that each output format and DPI yields its own cached chart
+    with its size and encoding time recorded, that the dashboard previews
+    the small thumbnail, and that removing a chart removes all its files.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+    file_id = get_file_id_from_session(auth_client)
+
+    signatures = {
+        "png": b"\x89PNG",
+        "png8": b"\x89PNG",
+        "webp": b"RIFF",
+        "svg": b"<?xml",
+    }
+    charts = {}
+    for output_format, signature in signatures.items():
+        auth_client.post(
+            "/generate_chart",
+            data={
+                "file_id": file_id,
+                "x_axis": "Month",
+                "y_axis": "Revenue",
+                "chart_type": "bar",
+                "output_format": output_format,
+                "dpi": "150",
+            },
+        )
+        with auth_client.session_transaction() as sess:
+            chart_filename = sess["chart_filename"]
+        response = auth_client.get(f"/charts/{chart_filename}")
+        assert response.data.startswith(signature)
+        charts[output_format] = chart_filename
+
+    assert len(set(charts.values())) == len(charts)
+    dashboard = auth_client.get("/dashboard").get_data(as_text=True)
+    with app.test_request_context():
+        info = get_chart_info(charts["svg"])
+        assert info["format"] == "svg"
+        assert info["dpi"] == 150
+        assert info["encode_seconds"] >= 0
+        assert info["download_name"] == "sales_data_bar.svg"
+        assert f'src="/charts/{info["thumbnail"]}"' in dashboard
+
+        png_info = get_chart_info(charts["png"])
+        png8_info = get_chart_info(charts["png8"])
+        assert png8_info["bytes"] < png_info["bytes"]
+        assert png_info["thumbnail_bytes"] < png_info["bytes"] / 4
+
+        charts_dir = Path(app.instance_path) / "charts"
+        remove_chart(charts["png"])
+        assert not list(charts_dir.glob(f"{get_chart_key(charts['png'])}*"))
+
+    with auth_client.session_transaction() as sess:
+        previous_chart = sess["chart_filename"]
+    auth_client.post(
+        "/generate_chart",
+        data={
+            "file_id": file_id,
+            "x_axis": "Month",
+            "y_axis": "Revenue",
+            "chart_type": "bar",
+            "dpi": "5000",
+        },
+    )
+    with auth_client.session_transaction() as sess:
+        assert sess["chart_filename"] == previous_chart
+
+
+@pytest.mark.performance
+def test_TPF_018_chart_responses_are_cacheable(auth_client, sample_csv):
+    """
+    Test Case: TPF-018
+    Description: Chart images support HTTP caching and range requests.
+
+    Verifies that charts are served as immutable with a strong ETag, that
+    a matching If-None-Match is answered with an empty 304, and that range
+    requests return partial content.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+    auth_client.post(
+        "/generate_chart",
+        data={
+            "file_id": get_file_id_from_session(auth_client),
+            "x_axis": "Month",
+            "y_axis": "Revenue",
+            "chart_type": "line",
+        },
+    )
+    with auth_client.session_transaction() as sess:
+        chart_url = f"/charts/{sess['chart_filename']}"
+
+    response = auth_client.get(chart_url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+    cache_control = response.headers["Cache-Control"]
+    assert "immutable" in cache_control
+    assert "private" in cache_control
+    assert "max-age=31536000" in cache_control
+
+    response = auth_client.get(chart_url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    response = auth_client.get(chart_url, headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.data == b"\x89PNG\r\n\x1a\n"
+    assert response.headers["Content-Range"].startswith("bytes 0-7/")
+
+
+@pytest.mark.performance
+def test_TPF_019_series_endpoint_for_browser_rendering(
+    auth_client, sample_csv
+):
+    """
+    Test Case: TPF-019
+    Description: Chart series are served for drawing in the browser.
+
+    Verifies that the series endpoint returns the same cleaned points as
+    JSON and as binary typed arrays without rendering an image, answers
+    repeat requests with 304, and validates like chart generation.
+    """
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (sample_csv, "sales_data.csv")},
+        content_type="multipart/form-data",
+    )
+    query = {
+        "file_id": get_file_id_from_session(auth_client),
+        "x_axis": "Units",
+        "y_axis": "Revenue",
+        "chart_type": "line",
+    }
+
+    with patch(
+        "app.services.chart_service.render_chart", side_effect=AssertionError
+    ):
+        as_json = auth_client.get("/series", query_string=query).get_json()
+        response = auth_client.get(
+            "/series", query_string={**query, "format": "binary"}
+        )
+    assert as_json["x"] == [150.0, 180.0, 200.0]
+    assert as_json["y"] == [10000.0, 12000.0, 15000.0]
+    assert as_json["max_index"] == 2
+
+    payload = response.data
+    assert payload[:4] == b"CSVS"
+    header_length = int.from_bytes(payload[4:8], "little")
+    data_start = 8 + header_length
+    assert data_start % 8 == 0
+    header = json.loads(payload[8:data_start])
+    arrays = np.frombuffer(payload[data_start:], dtype="<f8")
+    assert header["x_type"] == "number"
+    assert arrays.tolist() == as_json["y"] + as_json["x"]
+
+    etag = response.headers["ETag"]
+    response = auth_client.get(
+        "/series",
+        query_string={**query, "format": "binary"},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+    categories = auth_client.get(
+        "/series", query_string={**query, "x_axis": "Month"}
+    ).get_json()
+    assert categories["categories"] == ["January", "February", "March"]
+    assert categories["x"] is None
+
+    response = auth_client.get(
+        "/series", query_string={**query, "y_axis": "Month"}
+    )
+    assert response.status_code == 400
+    assert "numeric" in response.get_json()["error"]
+
+
+@pytest.mark.performance
+def test_TPF_020_bar_chart_aggregates_repeated_categories(app, auth_client):
+    """
+    Test Case: TPF-020
+    Description: Repeated categories are aggregated before plotting.
+
+    Verifies that each aggregation matches pandas groupby, that a bar chart
+    of many rows over few categories plots one bar per category, and that
+    unknown aggregations are rejected.
+    """
+    rng = np.random.default_rng(7)
+    regions = np.array(["North", "South", "East", "West"])
+    x = regions[rng.integers(0, len(regions), 5000)]
+    y = rng.normal(100, 25, 5000)
+    grouped = pd.Series(y).groupby(x, sort=False)
+    for how in ("sum", "mean", "count", "min", "max"):
+        keys, values = aggregate(x, y, how)
+        expected = getattr(grouped, how)()
+        assert keys.tolist() == expected.index.tolist()
+        assert np.allclose(values, expected.to_numpy())
+
+    frame = pd.DataFrame({"Region": x, "Sales": y.round(2)})
+    auth_client.post(
+        "/upload",
+        data={
+            "csv_file": (
+                BytesIO(frame.to_csv(index=False).encode()),
+                "sales.csv",
+            )
+        },
+        content_type="multipart/form-data",
+    )
+    query = {
+        "file_id": get_file_id_from_session(auth_client),
+        "x_axis": "Region",
+        "y_axis": "Sales",
+        "chart_type": "bar",
+        "aggregation": "sum",
+    }
+    series = auth_client.get("/series", query_string=query).get_json()
+    assert series["length"] == len(regions)
+    assert series["categories"] == expected.index.tolist()
+    assert series["y_label"] == "sum(Sales)"
+    assert np.allclose(
+        series["y"], frame.groupby("Region", sort=False)["Sales"].sum()
+    )
+
+    auth_client.post("/generate_chart", data=query)
+    chart_filename = get_chart_filename_from_dashboard(auth_client)
+    with app.test_request_context():
+        info = get_chart_info(chart_filename)
+    assert info["plotted_points"] == len(regions)
+    assert info["aggregation"] == "sum"
+
+    response = auth_client.get(
+        "/series", query_string={**query, "aggregation": "median"}
+    )
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid aggregation: median"
+
+
+@pytest.mark.performance
+def test_TPF_021_datetime_x_axis_is_bucketed(app, auth_client):
+    """
+    Test Case: TPF-021
+    Description: Timestamp columns are parsed and grouped into periods.
+
+    Verifies that the upload profile records the format of a timestamp
+    column, that charts parse it into dates instead of text labels, that
+    rows are bucketed by period with the chosen aggregation in time order,
+    and that bucketing a column without dates is rejected.
+    """
+    rng = np.random.default_rng(3)
+    times = pd.Timestamp("2024-03-04") + pd.to_timedelta(
+        np.sort(rng.integers(0, 14 * 86400, 20000)), unit="s"
+    )
+    frame = pd.DataFrame(
+        {
+            "Timestamp": times.strftime("%Y-%m-%d %H:%M:%S"),
+            "Latency": rng.gamma(2.0, 50.0, len(times)).round(3),
+        }
+    )
+    auth_client.post(
+        "/upload",
+        data={
+            "csv_file": (
+                BytesIO(frame.to_csv(index=False).encode()),
+                "events.csv",
+            )
+        },
+        content_type="multipart/form-data",
+    )
+    file_id = get_file_id_from_session(auth_client)
+    with auth_client.session_transaction() as sess:
+        server_path = sess["files"][file_id]["server_path"]
+    profile = read_profile(server_path)
+    assert profile["columns"][0]["datetime_format"] == "%Y-%m-%d %H:%M:%S"
+    assert profile["columns"][1]["datetime_format"] is None
+
+    query = {
+        "file_id": file_id,
+        "x_axis": "Timestamp",
+        "y_axis": "Latency",
+        "chart_type": "line",
+    }
+    series = auth_client.get("/series", query_string=query).get_json()
+    assert series["x_type"] == "datetime"
+
+    weeks = bucket_times(times.to_numpy(), "week")
+    assert set(pd.DatetimeIndex(weeks).dayofweek) == {0}
+    for bucket, frequency, how, chart_type in (
+        ("day", "D", "max", "bar"),
+        ("hour", "h", None, "line"),
+    ):
+        series = auth_client.get(
+            "/series",
+            query_string={
+                **query,
+                "chart_type": chart_type,
+                "time_bucket": bucket,
+                "aggregation": how,
+            },
+        ).get_json()
+        expected = frame.groupby(times.floor(frequency))["Latency"].agg(
+            how or "mean"
+        )
+        assert series["x_type"] == "datetime"
+        assert series["x"] == [t.value / 1e6 for t in expected.index]
+        assert np.allclose(series["y"], expected.to_numpy())
+    assert series["y_label"] == "mean(Latency)"
+    assert series["x_label"] == "Timestamp (per hour)"
+
+    auth_client.post(
+        "/generate_chart",
+        data={**query, "chart_type": "bar", "time_bucket": "day"},
+    )
+    chart_filename = get_chart_filename_from_dashboard(auth_client)
+    with app.test_request_context():
+        info = get_chart_info(chart_filename)
+    assert info["plotted_points"] == 14
+    assert info["time_bucket"] == "day"
+
+    response = auth_client.get(
+        "/series",
+        query_string={**query, "x_axis": "Latency", "time_bucket": "day"},
+    )
+    assert response.status_code == 400
+    assert "must contain dates" in response.get_json()["error"]
+
+
+@pytest.mark.performance
+def test_TPF_022_chart_with_several_y_columns_parses_once(app, auth_client):
+    """
+    Test Case: TPF-022
+    Description: Several Y columns are drawn from one parse.
+
+    Verifies that a chart of several Y columns loads the file once, keeps
+    the series aligned through aggregation and downsampling, labels each
+    series, and reports a non-numeric column by name.
+    """
+    rng = np.random.default_rng(11)
+    frame = pd.DataFrame(
+        {
+            "Day": np.arange(10000),
+            "Revenue": rng.normal(100, 10, 10000).round(2),
+            "Cost": rng.normal(60, 5, 10000).round(2),
+            "Note": "ok",
+        }
+    )
+    auth_client.post(
+        "/upload",
+        data={
+            "csv_file": (
+                BytesIO(frame.to_csv(index=False).encode()),
+                "finance.csv",
+            )
+        },
+        content_type="multipart/form-data",
+    )
+    file_id = get_file_id_from_session(auth_client)
+    form = {
+        "file_id": file_id,
+        "x_axis": "Day",
+        "y_axis": ["Revenue", "Cost"],
+        "chart_type": "line",
+    }
+
+    with patch(
+        "app.services.chart_service.load_columns",
+        wraps=chart_service.load_columns,
+    ) as load:
+        auth_client.post("/generate_chart", data=form)
+    load.assert_called_once()
+    assert load.call_args.args[1] == ["Day", "Revenue", "Cost"]
+    chart_filename = get_chart_filename_from_dashboard(auth_client)
+    with app.test_request_context():
+        info = get_chart_info(chart_filename)
+    assert info["decimated"]
+    assert info["plotted_points"] <= app.config["CHART_POINT_BUDGET"] + 2
+
+    series = auth_client.get("/series", query_string=form).get_json()
+    assert series["y_labels"] == ["Revenue", "Cost"]
+    revenue, cost = series["y"]
+    assert len(revenue) == len(cost) == series["length"]
+    rows = frame.set_index("Day").loc[series["x"]]
+    assert revenue == rows["Revenue"].tolist()
+    assert cost == rows["Cost"].tolist()
+
+    response = auth_client.get(
+        "/series",
+        query_string={**form, "chart_type": "bar", "aggregation": "mean"},
+    )
+    assert response.status_code == 200
+    response = auth_client.get(
+        "/series", query_string={**form, "y_axis": ["Revenue", "Note"]}
+    )
+    assert response.status_code == 400
+    assert "'Note'" in response.get_json()["error"]
+
+
+@pytest.mark.performance
+def test_TPF_023_chart_batch_renders_specs_and_packages_archive(auth_client):
+    """
+    Test Case: TPF-023
+    Description: Chart batches parse each file once and download as a ZIP.
+
+    Verifies that a batch loads each file once for all of its charts,
+    reports invalid specs without failing the others, that its manifest is
+    stored server-side with only its id in the session, that its archive
+    holds every generated image along with the manifest, and that batches
+    are counted in the exported metrics.
+    """
+    for name, frame in (
+        (
+            "sales.csv",
+            pd.DataFrame({"Month": ["Jan", "Feb"], "Revenue": [1, 2]}),
+        ),
+        ("costs.csv", pd.DataFrame({"Month": ["Jan", "Feb"], "Cost": [3, 4]})),
+    ):
+        auth_client.post(
+            "/upload",
+            data={
+                "csv_file": (BytesIO(frame.to_csv(index=False).encode()), name)
+            },
+            content_type="multipart/form-data",
+        )
+    with auth_client.session_transaction() as sess:
+        file_ids = {
+            file["original_filename"]: file_id
+            for file_id, file in sess["files"].items()
+        }
+    sales, costs = file_ids["sales.csv"], file_ids["costs.csv"]
+    specs = [
+        {
+            "file_id": sales,
+            "x_axis": "Month",
+            "y_axis": "Revenue",
+            "chart_type": "bar",
+        },
+        {
+            "file_id": sales,
+            "x_axis": "Month",
+            "y_axis": ["Revenue"],
+            "chart_type": "line",
+            "output_format": "svg",
+        },
+        {
+            "file_id": costs,
+            "x_axis": "Month",
+            "y_axis": "Cost",
+            "chart_type": "scatter",
+            "output_format": "webp",
+        },
+        {
+            "file_id": costs,
+            "x_axis": "Month",
+            "y_axis": "Missing",
+            "chart_type": "bar",
+        },
+        {
+            "file_id": "unknown",
+            "x_axis": "Month",
+            "y_axis": "Cost",
+            "chart_type": "bar",
+        },
+        {"file_id": sales, "x_axis": "Month"},
+    ]
+
+    with patch(
+        "app.services.batch_service.load_columns",
+        wraps=batch_service.load_columns,
+    ) as load, patch(
+        "app.services.chart_service.load_columns", side_effect=AssertionError
+    ):
+        response = auth_client.post("/chart_batches", json={"charts": specs})
+    assert response.status_code == 200
+    assert load.call_count == 2
+    manifest = response.get_json()
+    assert (manifest["succeeded"], manifest["failed"]) == (3, 3)
+    errors = [entry["error"] for entry in manifest["charts"]]
+    assert errors[:3] == [None, None, None]
+    assert "'Missing' not found" in errors[3]
+    assert errors[4] == "Selected file not found."
+    assert errors[5] == "Missing required parameters for chart generation."
+    assert auth_client.get(manifest["charts"][1]["url"]).status_code == 200
+    with auth_client.session_transaction() as sess:
+        assert sess["chart_batches"] == [manifest["batch_id"]]
+    response = auth_client.get(f"/chart_batches/{manifest['batch_id']}")
+    assert response.get_json()["charts"] == manifest["charts"]
+
+    response = auth_client.get(manifest["archive_url"])
+    assert response.mimetype == "application/zip"
+    with zipfile.ZipFile(BytesIO(response.data)) as archive:
+        names = archive.namelist()
+        archived = json.loads(archive.read("manifest.json"))
+        assert archive.read(names[0]).startswith(b"\x89PNG")
+    assert names == [
+        "01_sales_bar.png",
+        "02_sales_line.svg",
+        "03_costs_scatter.webp",
+        "manifest.json",
+    ]
+    assert [entry.get("archive_name") for entry in archived["charts"]] == [
+        *names[:3],
+        None,
+        None,
+        None,
+    ]
+
+    response = auth_client.post("/chart_batches", json={"charts": []})
+    assert response.status_code == 400
+
+    body = auth_client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE csvviz_chart_batches_total counter" in body
+    assert "# HELP csvviz_chart_batch_charts_total " in body
+    assert "csvviz_chart_batches_total " in body
+    assert 'csvviz_chart_batch_charts_total{status="done"}' in body
+    assert 'csvviz_chart_batch_charts_total{status="failed"}' in body
+
+
+@pytest.mark.performance
+def test_TPF_024_infinite_values_are_dropped_like_missing_ones(auth_client):
+    """
+    Test Case: TPF-024
+    Description: Infinite values are removed while cleaning.
+
+    Verifies that rows holding infinite X or Y values are dropped like rows
+    with missing values, so that the series endpoint returns valid JSON.
+    """
+    csv = b"Units,Revenue\n1,10\n2,inf\n3,\n-inf,40\n5,-inf\n6,60\n"
+    auth_client.post(
+        "/upload",
+        data={"csv_file": (BytesIO(csv), "inf.csv")},
+        content_type="multipart/form-data",
+    )
+    response = auth_client.get(
+        "/series",
+        query_string={
+            "file_id": get_file_id_from_session(auth_client),
+            "x_axis": "Units",
+            "y_axis": "Revenue",
+            "chart_type": "line",
+        },
+    )
+
+    assert response.status_code == 200
+    assert "Infinity" not in response.get_data(as_text=True)
+    series = json.loads(response.get_data(as_text=True))
+    assert series["x"] == [1.0, 6.0]
+    assert series["y"] == [10.0, 60.0]
+
+
+@pytest.mark.performance
+def test_TPF_025_cache_keeps_one_entry_per_file(tmp_path):
+    """
+    Test Case: TPF-025
+    Description: New column selections of a cached file are not re-parsed.
+
+    Verifies that columns requested from a file are added to its single
+    cache entry, and that a file whose columns cannot be read on their own
+    is parsed whole once and serves every later selection.
+    """
+    path = tmp_path / "data.csv"
+    path.write_text("x,y,z\n1,2,3\n4,5,6\n")
+    calls = []
+
+    def column_loader(file_path, columns):
+        calls.append(columns)
+        return pd.read_csv(file_path, usecols=columns)
+
+    cache = DataFrameCache()
+    cache.get(str(path), column_loader, ["x", "y"])
+    frame = cache.get(str(path), column_loader, ["x", "z"])
+    cache.get(str(path), column_loader, ["y", "z"])
+
+    assert calls == [["x", "y"], ["z"]]
+    assert frame[["x", "z"]].values.tolist() == [[1, 3], [4, 6]]
+    assert cache.stats()["entries"] == 1
+    assert cache.peek(str(path)) is None
+
+    calls.clear()
+
+    def csv_loader(file_path, columns):
+        calls.append(columns)
+        return pd.read_csv(file_path) if columns is None else None
+
+    cache.clear()
+    cache.get(str(path), csv_loader, ["x", "y"])
+    cache.get(str(path), csv_loader, ["z"])
+
+    assert calls == [["x", "y"], None]
+    assert cache.stats()["misses"] == 1
+    assert cache.peek(str(path)) is not None